@@ -1,43 +1,209 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Response, Query
 from sqlalchemy.orm import Session
-from typing import List, Dict, Annotated
+from starlette.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from typing import List, Dict, Annotated, Optional, Set, Union
+import asyncio
 import json
+import logging
 from datetime import datetime
 
-from .. import schemas, dependencies
-from ..database import get_db
+from .. import schemas, dependencies, pagination
+from ..broker import Broker, create_broker
+from ..chat_writer import chat_writer, message_payload
+from ..database import get_db, SessionLoacl
 from ..crud import chats as chats_crud
 
+logger = logging.getLogger(__name__)
+
 # 创建路由实例
 router = APIRouter()
 
+# 广播频道（所有进程都订阅）
+BROADCAST_CHANNEL = "chat:broadcast"
+# 每个 WebSocket 连接最多同时等待保存的消息数，超过后暂停读取该连接
+MAX_IN_FLIGHT_MESSAGES = 32
+# 每个 WebSocket 连接的发送队列长度，队列满说明客户端接收太慢
+SEND_QUEUE_SIZE = 256
+# 关闭码：同一用户建立了新连接，旧连接被取代（应用自定义关闭码，客户端收到后不应自动重连）
+CLOSE_SUPERSEDED = 4000
+# 关闭码：发送队列已满（1013 稍后重试）
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def user_channel(user_id: int) -> str:
+    return f"chat:user:{user_id}"
+
+
+class _Connection:
+    """一个 WebSocket 连接及其发送队列，由独立的任务按顺序发送"""
+
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
 # 用于管理WebSocket连接
 class ConnectionManager:
-    def __init__(self):
-        # 存储活动连接: {user_id: WebSocket}
-        self.active_connections: Dict[int, WebSocket] = {}
+    """
+        管理本进程的 WebSocket 连接，消息经发布/订阅代理投递
+
+        - 用户连接到本进程时订阅该用户的频道，断开时取消订阅
+        - 发送消息只发布到频道，由持有该用户连接的进程（可能是其他 worker 或其他机器）推送
+        - 未配置跨进程代理时使用进程内代理，行为与单进程部署相同
+        - 每个连接有一个有界的发送队列和独立的发送任务，推送只是放入队列，
+          一个慢客户端不会拖慢其他连接；队列满时断开该连接（客户端重连后可以重新拉取消息）
+        - 每个用户在本进程只保留一个连接，新连接建立后以 CLOSE_SUPERSEDED 关闭旧连接
+        - 消息在发布时编码一次，所有接收者共用同一份文本
+    """
+
+    def __init__(self, broker: Broker, queue_size: int = SEND_QUEUE_SIZE):
+        self.broker = broker
+        self.queue_size = queue_size
+        # 存储本进程的活动连接: {user_id: _Connection}
+        self.active_connections: Dict[int, _Connection] = {}
+        self.sent_messages = 0
+        self.dropped_messages = 0
+        self.dropped_connections = 0
+        self.send_errors = 0
+        # 后台任务（取消订阅、关闭连接）的引用，防止任务执行完之前被垃圾回收
+        self._pending_tasks: Set[asyncio.Task] = set()
 
-    async def connect(self, user_id: int, websocket: WebSocket):
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def start(self):
+        await self.broker.start(self._deliver)
+        await self.broker.subscribe(BROADCAST_CHANNEL)
+
+    async def stop(self):
+        for connection in list(self.active_connections.values()):
+            self._stop_writer(connection)
+        await self.broker.stop()
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> _Connection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        connection = _Connection(user_id, websocket, self.queue_size)
+        connection.task = asyncio.create_task(self._write(connection))
+        previous = self.active_connections.get(user_id)
+        self.active_connections[user_id] = connection
+        if previous is not None:
+            # 同一用户的新连接取代旧连接：停止旧连接的发送任务并关闭旧连接，
+            # 旧连接上尚未确认的消息仍会保存，客户端可以在新连接上重新拉取
+            self._stop_writer(previous)
+            self._spawn(self._close(previous.websocket, CLOSE_SUPERSEDED))
+        await self.broker.subscribe(user_channel(user_id))
+        return connection
+
+    async def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        connection = self.active_connections.get(user_id)
+        # 同一用户重新连接后，旧连接的断开不影响新连接
+        if connection is None or (websocket is not None and connection.websocket is not websocket):
+            return
+        del self.active_connections[user_id]
+        self._stop_writer(connection)
+        await self.broker.unsubscribe(user_channel(user_id))
+
+    @staticmethod
+    def _stop_writer(connection: _Connection):
+        if connection.task is not None and not connection.task.done():
+            connection.task.cancel()
+
+    async def _write(self, connection: _Connection):
+        # 连接的发送任务：按顺序发送队列中的消息
+        while True:
+            data = await connection.queue.get()
+            try:
+                await connection.websocket.send_text(data)
+            except Exception:
+                self.send_errors += 1
+                await self.disconnect(connection.user_id, connection.websocket)
+                return
+            self.sent_messages += 1
+
+    def enqueue(self, connection: _Connection, data: str):
+        """把已编码的消息放入连接的发送队列，队列满时断开该连接"""
+        try:
+            connection.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self._drop(connection)
+
+    def _drop(self, connection: _Connection):
+        # 慢客户端：丢弃队列中的消息并关闭连接
+        self.dropped_messages += connection.queue.qsize() + 1
+        self.dropped_connections += 1
+        logger.warning("用户 %s 的连接发送队列已满，断开连接", connection.user_id)
+        if self.active_connections.get(connection.user_id) is connection:
+            del self.active_connections[connection.user_id]
+            self._spawn(self.broker.unsubscribe(user_channel(connection.user_id)))
+        self._stop_writer(connection)
+        self._spawn(self._close(connection.websocket, CLOSE_TRY_AGAIN_LATER))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    async def _publish(self, channel: str, message: dict):
+        try:
+            await self.broker.publish(channel, json.dumps(message))
+        except Exception:
+            # 消息已保存到数据库，实时推送失败时客户端可以重新拉取
+            logger.exception("发布消息到频道 %s 失败", channel)
 
     async def send_personal_message(self, message: dict, user_id: int):
         """向指定用户发送消息"""
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(json.dumps(message))
+        await self._publish(user_channel(user_id), message)
 
     async def broadcast(self, message: dict):
         """向所有连接的用户广播消息"""
-        for connection in self.active_connections.values():
-            await connection.send_text(json.dumps(message))
+        await self._publish(BROADCAST_CHANNEL, message)
+
+    async def _deliver(self, channel: str, data: str):
+        # 代理收到消息后放入本进程对应连接的发送队列
+        if channel == BROADCAST_CHANNEL:
+            for connection in list(self.active_connections.values()):
+                self.enqueue(connection, data)
+        else:
+            connection = self.active_connections.get(int(channel.rpartition(":")[2]))
+            if connection is not None:
+                self.enqueue(connection, data)
+
+    def stats(self):
+        depths = [connection.queue.qsize() for connection in self.active_connections.values()]
+        return {
+            "connections": len(depths),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "sent_messages": self.sent_messages,
+            "dropped_messages": self.dropped_messages,
+            "dropped_connections": self.dropped_connections,
+            "send_errors": self.send_errors,
+        }
 
 # 创建连接管理器实例
-manager = ConnectionManager()
+manager = ConnectionManager(create_broker())
+
+
+# 发送者信息（随消息推送给接收者）
+def _sender_info(user) -> dict:
+    return {"id": user.id, "username": user.username, "avatar": user.avatar}
+
+
+# 保存消息并生成响应（在线程池中执行，数据库查询和延迟加载都不占用事件循环）
+def _save_chat(db: Session, chat: schemas.ChatCreate, current_user):
+    # 提交后 current_user 会过期，先取出发送者信息
+    sender = _sender_info(current_user)
+    db_chat = chats_crud.create_chat(db=db, chat=chat, sender_id=sender["id"])
+    return schemas.ChatResponse.model_validate(db_chat), {"type": "message", **message_payload(db_chat), "sender": sender}
+
 
 # 发送聊天消息
 @router.post("/", response_model=schemas.ChatResponse)
@@ -55,36 +221,23 @@ async def create_chat(
         返回：
         - 发送的消息详情
     """
-    # 创建消息
-    db_chat = chats_crud.create_chat(db=db, chat=chat, sender_id=current_user.id)
-
-    # 准备要发送的消息数据
-    message_data = {
-        "id": db_chat.id,
-        "item_id": db_chat.item_id,
-        "sender_id": db_chat.sender_id,
-        "receiver_id": db_chat.receiver_id,
-        "message": db_chat.message,
-        "created_at": db_chat.created_at.isoformat(),
-        "sender": {
-            "id": current_user.id,
-            "username": current_user.username,
-            "avatar": current_user.avatar
-        }
-    }
+    # 创建消息（同步的数据库操作放到线程池，避免阻塞其他请求和 WebSocket 连接）
+    response, message_data = await run_in_threadpool(_save_chat, db, chat, current_user)
 
     # 通过WebSocket实时发送给接收者
-    await manager.send_personal_message(message_data, db_chat.receiver_id)
+    await manager.send_personal_message(message_data, response.receiver_id)
 
-    return db_chat
+    return response
 
 
 # 获取物品的聊天记录
 @router.get("/item/{item_id}", response_model=List[schemas.ChatResponse])
 def read_item_chats(
         item_id: int,
+        response: Response,
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
         db: Session = Depends(get_db),
         current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
@@ -95,32 +248,162 @@ def read_item_chats(
     - item_id: 物品ID
     - skip: 跳过前n条记录（分页）
     - limit: 最多返回n条记录
+    - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
     返回：
     - 聊天记录列表
     """
-    return chats_crud.get_item_chats(
+    chats = chats_crud.get_item_chats(
         db,
         item_id=item_id,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    pagination.set_next_cursor(response, pagination.next_cursor(chats, limit))
+    return chats
 
 
 # 获取用户的所有聊天会话
-@router.get("/conversations")
+@router.get("/conversations", response_model=List[schemas.ConversationResponse])
 def read_user_conversations(
+        response: Response,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
         db: Session = Depends(get_db),
         current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
     """
     获取用户参与的所有聊天会话（需要登录）
 
+    参数：
+    - skip: 跳过前n个会话（分页）
+    - limit: 最多返回n个会话
+    - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
+
+    返回：
+    - 聊天会话列表（按最后一条消息时间倒序），每个会话包含物品信息、最后一条消息、对方用户信息和未读消息数
+    """
+    conversations = chats_crud.get_user_chats(
+        db,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        cursor=cursor
+    )
+    pagination.set_next_cursor(response, chats_crud.next_conversations_cursor(conversations, limit))
+    return conversations
+
+
+# 将会话标记为已读
+@router.post("/conversations/{conversation_id}/read", response_model=schemas.ConversationResponse)
+def mark_conversation_read(
+        conversation_id: int,
+        db: Session = Depends(get_db),
+        current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+    将会话中的消息全部标记为已读（需要登录）
+
+    参数：
+    - conversation_id: 会话ID
+
     返回：
-    - 聊天会话列表，每个会话包含物品信息、最后一条消息和对方用户信息
+    - 更新后的会话
+    """
+    return chats_crud.mark_conversation_read(db, conversation_id=conversation_id, user_id=current_user.id)
+
+
+# 获取未读消息总数
+@router.get("/unread-count", response_model=schemas.UnreadCountResponse)
+def read_unread_count(
+        db: Session = Depends(get_db),
+        current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
     """
-    return chats_crud.get_user_chats(db, user_id=current_user.id)
+    获取当前用户所有会话的未读消息总数（需要登录），用于消息角标
+
+    返回：
+    - unread_count: 未读消息数
+    """
+    return {"unread_count": chats_crud.get_unread_count(db, user_id=current_user.id)}
+
+
+# 解析客户端通过 WebSocket 发送的消息帧
+def _parse_frame(data: str):
+    """
+        帧格式：{"type": "message", "client_id": "客户端生成的ID", "item_id": 1, "receiver_id": 2, "message": "..."}
+
+        返回：
+        - (client_id, ChatCreate, None)，解析失败时为 (client_id, None, 422 错误)
+    """
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        frame = None
+    if not isinstance(frame, dict):
+        return None, None, HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="消息格式不正确")
+
+    client_id = frame.get("client_id")
+    if not isinstance(client_id, (str, int)):
+        client_id = None
+    if frame.get("type", "message") != "message":
+        return client_id, None, HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="不支持的消息类型")
+    try:
+        return client_id, schemas.ChatCreate.model_validate(frame), None
+    except ValidationError:
+        return client_id, None, HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="消息内容不正确")
+
+
+def _send_frame(connection: _Connection, frame: dict):
+    # 确认、错误等回复与推送的消息使用同一个发送队列
+    manager.enqueue(connection, json.dumps(frame))
+
+
+def _error_frame(client_id: Optional[Union[str, int]], exc: Exception) -> dict:
+    if isinstance(exc, HTTPException):
+        status_code, detail = exc.status_code, exc.detail
+    else:
+        status_code, detail = status.HTTP_500_INTERNAL_SERVER_ERROR, "消息发送失败"
+    return {"type": "error", "client_id": client_id, "status_code": status_code, "detail": detail}
+
+
+# 等待消息保存后确认，并推送给接收者
+async def _acknowledge(connection: _Connection, client_id, future: asyncio.Future, sender: dict, in_flight: asyncio.Semaphore):
+    try:
+        try:
+            payload = await future
+        except Exception as exc:
+            _send_frame(connection, _error_frame(client_id, exc))
+            return
+        _send_frame(connection, {
+            "type": "ack",
+            "client_id": client_id,
+            "id": payload["id"],
+            "created_at": payload["created_at"]
+        })
+        await manager.send_personal_message({"type": "message", **payload, "sender": sender}, payload["receiver_id"])
+    finally:
+        in_flight.release()
+
+
+# 验证 WebSocket 连接的令牌，返回发送者信息；失败返回 None
+def _authenticate(token: str, user_id: int) -> Optional[dict]:
+    # 使用短期会话，验证后立即归还数据库连接，不在整个 WebSocket 连接期间占用连接池
+    db = SessionLoacl()
+    try:
+        # 使用已有的依赖项验证用户
+        current_user = dependencies.get_current_user(token=token, db=db)
+    except HTTPException:
+        return None
+    finally:
+        db.close()
+    # 确保用户ID与令牌中的一致
+    if current_user.id != user_id:
+        return None
+    return _sender_info(current_user)
 
 
 # WebSocket连接端点
@@ -128,37 +411,58 @@ def read_user_conversations(
 async def websocket_endpoint(
         websocket: WebSocket,
         user_id: int,
-        token: str = Depends(dependencies.oauth2_scheme),
-        db: Session = Depends(get_db)
+        token: Optional[str] = Query(None)
 ):
     """
-    WebSocket连接端点，用于实时接收消息
+    WebSocket连接端点，用于实时接收和发送消息
+
+    - 服务端推送：{"type": "message", ...}（新消息）
+    - 客户端发送：{"type": "message", "client_id": ..., "item_id": ..., "receiver_id": ..., "message": ...}，
+      消息与其他连接的消息合并批量保存，保存后回复 {"type": "ack", "client_id": ..., "id": ..., "created_at": ...}，
+      失败时回复 {"type": "error", "client_id": ..., "status_code": ..., "detail": ...}
+    - 同一用户建立新连接后，旧连接以关闭码 4000 关闭；发送队列已满时以 1013 关闭
 
     参数：
     - user_id: 用户ID
-    - token: 认证令牌
+    - token: 认证令牌（浏览器的 WebSocket 无法设置请求头，通过查询参数传入；也支持 Authorization 请求头）
     """
-    # 验证用户身份
-    try:
-        # 使用已有的依赖项验证用户
-        current_user = dependencies.get_current_user(token=token, db=db)
-
-        # 确保用户ID与令牌中的一致
-        if current_user.id != user_id:
-            await websocket.close(code=1008)  # 政策原因关闭
-            return
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        await websocket.close(code=1008)
+        return
 
-    except HTTPException:
-        await websocket.close(code=1008)  # 认证失败关闭
+    # 验证用户身份（在线程池中查询数据库）
+    sender = await run_in_threadpool(_authenticate, token, user_id)
+    if sender is None:
+        await websocket.close(code=1008)  # 认证失败或用户ID与令牌不一致
         return
 
     # 建立连接
-    await manager.connect(user_id, websocket)
+    connection = await manager.connect(user_id, websocket)
 
+    in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_MESSAGES)
+    acknowledgements = set()
     try:
         while True:
-            # 保持连接，等待可能的消息（我们这里只接收，不处理）
             data = await websocket.receive_text()
+            client_id, chat, error = _parse_frame(data)
+            if error is not None:
+                _send_frame(connection, _error_frame(client_id, error))
+                continue
+
+            # 按接收顺序放入写入队列，保存结果在后台任务中等待，不阻塞读取下一条消息
+            await in_flight.acquire()
+            future = chat_writer.submit(user_id, chat)
+            task = asyncio.create_task(_acknowledge(connection, client_id, future, sender, in_flight))
+            acknowledgements.add(task)
+            task.add_done_callback(acknowledgements.discard)
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        # 连接因发送队列溢出已被服务端关闭
+        pass
+    finally:
         # 断开连接时清理
-        manager.disconnect(user_id)
\ No newline at end of file
+        await manager.disconnect(user_id, websocket)
\ No newline at end of file
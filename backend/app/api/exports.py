@@ -0,0 +1,227 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from typing import Callable, Literal, Optional
+from datetime import datetime
+from decimal import Decimal
+import csv
+import enum
+import io
+import json
+import logging
+import os
+import time
+
+from .. import schemas, dependencies
+from ..database import SessionLoacl
+from ..crud import items as items_crud
+from ..crud import transactions as transactions_crud
+from ..crud import reviews as reviews_crud
+
+logger = logging.getLogger(__name__)
+
+# 创建路由实例
+router = APIRouter()
+
+# 服务端游标每次从数据库取回的行数
+EXPORT_BATCH_SIZE = 1000
+# 单次导出的最大行数（0 表示不限制），超出部分需缩小筛选范围后分批导出
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", 100000))
+# 单次导出的最长时间（秒，0 表示不限制），服务端游标占用数据库连接，超时后结束输出
+EXPORT_TIME_LIMIT = int(os.getenv("EXPORT_TIME_LIMIT", 300))
+# 以这些字符开头的 CSV 单元格会被电子表格当作公式执行
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# 导出格式
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class ExportTruncated(Exception):
+    """CSV 导出被截断：中断连接，客户端收到不完整的响应，而不是看似完整的文件"""
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _escape_csv_value(value):
+    # 前置单引号，电子表格按文本显示
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _export_rows(build_query: Callable, fmt: str):
+    """
+        逐批生成导出内容
+
+        - 使用独立的数据库会话，生命周期与响应流一致
+        - yield_per 开启服务端游标，每次只从数据库取回一批数据，内存占用与总行数无关
+        - 只查询列（不构造ORM对象），不会在会话中累积对象
+        - 超过 EXPORT_MAX_ROWS 行或 EXPORT_TIME_LIMIT 秒时结束输出并释放连接，并明确告知客户端导出不完整：
+          NDJSON 最后输出一条 {"error": "export_truncated", ...} 记录，CSV 中断连接（ExportTruncated）
+        - CSV 中以公式字符开头的文本前置单引号，防止在电子表格中被当作公式执行
+    """
+    db = SessionLoacl()
+    try:
+        started = time.monotonic()
+        query = build_query(db)
+        if EXPORT_MAX_ROWS:
+            # 多取一行，区分恰好 EXPORT_MAX_ROWS 行和超出上限
+            query = query.limit(EXPORT_MAX_ROWS + 1)
+        query = query.yield_per(EXPORT_BATCH_SIZE)
+        fields = [column["name"] for column in query.column_descriptions]
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+
+        exported = 0
+        truncated = None
+        for row in query:
+            if EXPORT_MAX_ROWS and exported >= EXPORT_MAX_ROWS:
+                truncated = f"超过最大行数 {EXPORT_MAX_ROWS}"
+                break
+            exported += 1
+            values = [_format_value(value) for value in row]
+            if writer:
+                writer.writerow([_escape_csv_value(value) for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values)), ensure_ascii=False))
+                buffer.write("\n")
+
+            # 每批输出一次，减少分块数量
+            if exported % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                if EXPORT_TIME_LIMIT and time.monotonic() - started > EXPORT_TIME_LIMIT:
+                    truncated = f"超过最长时间 {EXPORT_TIME_LIMIT} 秒"
+                    break
+
+        if truncated:
+            logger.warning("导出%s，已输出 %d 行后结束", truncated, exported)
+            if writer:
+                if buffer.tell():
+                    yield buffer.getvalue()
+                raise ExportTruncated(truncated)
+            buffer.write(json.dumps({
+                "error": "export_truncated",
+                "detail": f"导出{truncated}，请缩小筛选范围后分批导出",
+                "exported_rows": exported
+            }, ensure_ascii=False))
+            buffer.write("\n")
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def _export_response(build_query: Callable, fmt: str, name: str) -> StreamingResponse:
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    extension = "csv" if fmt == "csv" else "ndjson"
+    return StreamingResponse(
+        _export_rows(build_query, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}_{timestamp}.{extension}"'}
+    )
+
+# 导出物品
+@router.get("/items")
+def export_items(
+    format: ExportFormat = "ndjson",
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    status: Optional[schemas.ItemStatus] = None,
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+        流式导出物品（需要登录）
+
+        参数：
+        - format: 导出格式（ndjson 或 csv）
+        - 其余筛选条件与物品列表相同
+
+        返回：
+        - 按创建时间倒序的物品数据流（超出导出上限时以 export_truncated 记录结尾或中断连接）
+    """
+    return _export_response(
+        lambda db: items_crud.export_items_query(
+            db,
+            category_id=category_id,
+            search=search,
+            min_price=min_price,
+            max_price=max_price,
+            status=status
+        ),
+        format,
+        "items"
+    )
+
+# 导出当前用户的交易
+@router.get("/transactions")
+def export_my_transactions(
+    format: ExportFormat = "ndjson",
+    role: Literal["buy", "sell"] = "buy",
+    status: Optional[schemas.TransactionStatus] = None,
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+        流式导出当前用户的交易（需要登录）
+
+        参数：
+        - format: 导出格式（ndjson 或 csv）
+        - role: buy 导出买入的交易，sell 导出卖出的交易
+        - status: 按交易状态筛选
+
+        返回：
+        - 按创建时间倒序的交易数据流（超出导出上限时以 export_truncated 记录结尾或中断连接）
+    """
+    user_id = current_user.id
+    return _export_response(
+        lambda db: transactions_crud.export_user_transactions_query(
+            db,
+            user_id=user_id,
+            is_buyer=role == "buy",
+            status=status
+        ),
+        format,
+        f"transactions_{role}"
+    )
+
+# 导出用户收到的评价
+@router.get("/reviews/user/{user_id}")
+def export_user_reviews(
+    user_id: int,
+    format: ExportFormat = "ndjson",
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+        流式导出指定用户收到的评价（需要登录）
+
+        参数：
+        - user_id: 用户ID
+        - format: 导出格式（ndjson 或 csv）
+
+        返回：
+        - 按创建时间倒序的评价数据流（超出导出上限时以 export_truncated 记录结尾或中断连接）
+    """
+    return _export_response(
+        lambda db: reviews_crud.export_user_reviews_query(db, user_id=user_id),
+        format,
+        f"reviews_user_{user_id}"
+    )
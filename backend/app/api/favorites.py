@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from .. import schemas, dependencies
+from .. import schemas, dependencies, pagination
 from ..database import get_db
 from ..crud import favorites as favorites_crud
 
@@ -34,8 +34,10 @@ def create_favorite(
 # 获取用户的收藏列表
 @router.get("/", response_model=List[schemas.FavoriteResponse])
 def read_user_favorites(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
@@ -45,16 +47,20 @@ def read_user_favorites(
         参数：
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
         返回：
         - 收藏列表
     """
-    return favorites_crud.get_user_favorites(
+    favorites = favorites_crud.get_user_favorites(
         db=db,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    pagination.set_next_cursor(response, pagination.next_cursor(favorites, limit))
+    return favorites
 
 # 取消收藏
 @router.delete("/item/{item_id}")
@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, Body
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 
-from .. import  schemas, dependencies
+from .. import  schemas, dependencies, pagination, cache, loaders, images
+from ..counters import item_counters
+from ..popularity import hot_items
+from ..suggest import suggestions
+from ..static_images import image_url
 from ..database import get_db
 from ..crud import items as items_crud
-from pathlib import Path
-import uuid
 
 # 创建路由实例
 router = APIRouter()
 
+# 批量获取物品时一次最多请求的物品数
+MAX_BATCH_IDS = 100
+
 # 创建物品
 @router.post("/", response_model=schemas.ItemDetailResponse, status_code=status.HTTP_201_CREATED)
 def create_item(
@@ -30,16 +36,49 @@ def create_item(
     # 发布新物品（需要登录）
     return items_crud.create_item(db=db, item=item, user_id=current_user.id)
 
+# 批量创建物品
+@router.post("/bulk", response_model=schemas.ItemBulkCreateResponse, status_code=status.HTTP_201_CREATED)
+def create_items_bulk(
+    items: List[Dict[str, Any]] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+        批量发布物品（需要登录）
+
+        参数：
+        - items: 物品信息列表（每条格式与发布新物品相同），最多500条
+
+        返回：
+        - created / failed: 成功、失败的数量
+        - results: 每条数据的处理结果
+    """
+    if len(items) > items_crud.MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多发布{items_crud.MAX_BULK_ITEMS}个物品"
+        )
+
+    results = items_crud.create_items_bulk(db=db, rows=items, user_id=current_user.id)
+    created = sum(1 for result in results if result["success"])
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
 # 获取物品列表（支持筛选）
 @router.get("/", response_model=List[schemas.ItemBriefResponse])
 def read_items(
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     category_id: Optional[int] = None,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     status: Optional[schemas.ItemStatus] = None,
+    sort: Optional[schemas.ItemSort] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -48,15 +87,31 @@ def read_items(
         参数：
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
         - category_id: 按分类筛选
-        - search: 按关键词搜索
+        - search: 按关键词搜索（最多返回相关度最高的 1000 条，按其他方式排序时在其中排序；
+          关键词中没有可检索的字词，如只有标点符号时，返回空列表）
         - min_price: 最低价格
         - max_price: 最高价格
         - status: 物品状态
+        - sort: 排序方式（newest、price_asc、price_desc、most_favorited、relevance），
+          默认有搜索关键词时按相关度，否则按最新发布
 
         返回：
         - 物品列表
     """
+    sort = items_crud.resolve_item_sort(sort, search)
+
+    # 序列化后的分页缓存（关键词搜索的组合太多，不缓存）
+    cache_key = (category_id, min_price, max_price, status, sort, skip, limit, cursor)
+    if not search:
+        cached = cache.item_page_cache.get(cache_key)
+        if cached is not cache.MISSING:
+            content, next_cursor = cached
+            response = JSONResponse(content=content)
+            pagination.set_next_cursor(response, next_cursor)
+            return response
+
     # 获取物品列表（无需登录）
     items = items_crud.get_items(
         db=db,
@@ -66,16 +121,151 @@ def read_items(
         search=search,
         min_price=min_price,
         max_price=max_price,
+        status=status,
+        cursor=cursor,
+        sort=sort
+    )
+
+    # 下一页游标（按相关度排序时使用偏移量游标）
+    offset = pagination.cursor_offset(skip, cursor) if sort == schemas.ItemSort.relevance else 0
+    next_cursor = items_crud.next_items_cursor(items, limit, sort, offset)
+
+    content = [schemas.ItemBriefResponse.model_validate(item).model_dump(mode="json") for item in items]
+    if not search:
+        cache.item_page_cache.set(
+            cache_key,
+            (content, next_cursor),
+            tags=cache.item_listing_tags(
+                category_id,
+                [item.id for item in items],
+                sort.value,
+                owner_ids=[item.user_id for item in items]
+            )
+        )
+
+    response = JSONResponse(content=content)
+    pagination.set_next_cursor(response, next_cursor)
+    return response
+
+# 获取物品分面统计
+@router.get("/facets", response_model=schemas.ItemFacetsResponse)
+def read_item_facets(
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    status: Optional[schemas.ItemStatus] = None,
+    db: Session = Depends(get_db)
+):
+    """
+        获取物品分面统计（无需登录）
+
+        参数（与物品列表的筛选条件相同）：
+        - category_id: 按分类筛选
+        - search: 按关键词搜索
+        - min_price: 最低价格
+        - max_price: 最高价格
+        - status: 物品状态
+
+        返回：
+        - total: 符合条件的物品总数
+        - categories: 各分类的物品数量
+        - statuses: 各状态的物品数量
+        - price_buckets: 各价格区间的物品数量
+    """
+    return items_crud.get_item_facets(
+        db=db,
+        category_id=category_id,
+        search=search,
+        min_price=min_price,
+        max_price=max_price,
         status=status
     )
-    return items
+
+# 搜索联想
+@router.get("/suggest", response_model=List[schemas.SuggestionResponse])
+def read_suggestions(
+    q: str = Query(..., max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+        搜索框输入时的联想词（无需登录）
+
+        参数：
+        - q: 已输入的内容（按前缀匹配物品标题或其中的单词、分类名）
+        - limit: 返回的候选数，最多20个
+
+        返回：
+        - 按热度（浏览数、收藏数）降序排列的候选
+    """
+    # 联想索引常驻内存，服务刚启动尚未构建时先同步构建一次
+    if not suggestions.ready:
+        suggestions.rebuild(db)
+    return suggestions.suggest(q, limit)
+
+# 批量获取物品详情
+@router.get("/batch", response_model=schemas.ItemBatchResponse)
+def read_items_batch(
+    ids: str = Query(..., description="逗号分隔的物品ID，如 1,2,3"),
+    db: Session = Depends(get_db)
+):
+    """
+        批量获取物品详情（无需登录）
+
+        参数：
+        - ids: 逗号分隔的物品ID，最多100个
+
+        返回：
+        - items: 物品详情列表（按请求的ID顺序）
+        - missing: 不存在的物品ID
+    """
+    try:
+        item_ids = list(dict.fromkeys(int(item_id) for item_id in ids.split(",") if item_id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="物品ID格式不正确")
+
+    if not item_ids:
+        raise HTTPException(status_code=400, detail="请提供物品ID")
+    if len(item_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"一次最多获取{MAX_BATCH_IDS}个物品")
+
+    # 一次 IN 查询取回全部物品（图片、所有者、分类一并批量加载）
+    items = items_crud.get_items_by_ids(db, item_ids, options=loaders.ITEM_DETAIL)
+    found = {item.id for item in items}
+    return {
+        "items": items,
+        "missing": [item_id for item_id in item_ids if item_id not in found]
+    }
+
+# 热门物品榜
+@router.get("/hot", response_model=List[schemas.ItemBriefResponse])
+def read_hot_items(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+        获取热门物品（无需登录）
+
+        参数：
+        - limit: 返回的物品数，最多100个
+
+        返回：
+        - 按热度（浏览、收藏、聊天活跃度，随时间衰减）降序排列的在售物品
+    """
+    # 榜单由定时任务在内存中预先计算，服务刚启动尚未计算时先同步计算一次
+    if not hot_items.ready:
+        hot_items.refresh(db)
+    return JSONResponse(hot_items.top(limit))
 
 # 获取用户发布的物品
 @router.get("/my-items", response_model=List[schemas.ItemBriefResponse])
 def read_my_items(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
     """
@@ -84,12 +274,14 @@ def read_my_items(
         参数：
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
         返回：
         - 当前用户发布的物品列表
     """
     # 获取当前用户发布的物品（需要登录）
-    items = items_crud.get_user_items(db=db, skip=skip, limit=limit, user_id=current_user.id)
+    items = items_crud.get_user_items(db=db, skip=skip, limit=limit, user_id=current_user.id, cursor=cursor)
+    pagination.set_next_cursor(response, pagination.next_cursor(items, limit))
     return items
 
 # 获取物品详情
@@ -112,8 +304,29 @@ def read_item(
     if db_item is None:
         raise HTTPException(status_code=404, detail="物品不存在")
 
+    # 浏览数只在内存中累加，由定时任务批量写入数据库
+    item_counters.record_view(item_id)
     return db_item
 
+# 获取相似物品
+@router.get("/{item_id}/similar", response_model=List[schemas.ItemBriefResponse])
+def read_similar_items(
+    item_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """
+        获取与指定物品相似的物品（无需登录）
+
+        参数：
+        - item_id: 物品ID
+        - limit: 返回的物品数，最多50个
+
+        返回：
+        - 按相似度降序排列的可交易物品
+    """
+    return items_crud.get_similar_items(db, item_id=item_id, limit=limit)
+
 # 获取物品图片
 @router.get("/images/{item_id}", response_model=List[schemas.ItemImageResponse])
 def read_item_images(
@@ -180,19 +393,28 @@ def delete_item(
     return items_crud.delete_item(db=db, item_id=item_id, user_id=current_user.id)
 
 # 将本地图片上传到服务器
-@router.post("/upload-image")
-async def upload_image(file: UploadFile = File(...)):
-    # 校验文件类型
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="只允许上传图片文件")
-
-    # 生成唯一文件名
-    file_ext = file.filename.split(".")[-1]
-    file_name=f"item_{uuid.uuid4()}.{file_ext}"
-
-    # 保存文件到 static/images目录
-    file_path = dependencies.IMAGE_DIR / file_name
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    return {"file_name": file_name}
\ No newline at end of file
+@router.post("/upload-image", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+})
+async def upload_image(request: Request):
+    """
+        上传物品图片（multipart/form-data，文件字段名为 file）
+
+        返回：
+        - file_name: 保存后的文件名（发布、编辑物品时作为 image_url 提交）
+        - url: 图片的访问地址
+    """
+    # 流式写入磁盘：限制大小、按文件头校验类型、写完后原子重命名
+    file_name = await images.save_upload(request)
+    return {"file_name": file_name, "url": image_url(file_name)}
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from .. import schemas, dependencies
+from .. import schemas, dependencies, pagination
 from ..database import get_db
 from ..crud import reviews as reviews_crud
 
@@ -35,8 +35,10 @@ def create_review(
 @router.get("/user/{user_id}", response_model=List[schemas.ReviewResponse])
 def read_user_reviews(
     user_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -46,16 +48,20 @@ def read_user_reviews(
         - user_id: 用户ID
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
         返回：
         - 评价列表
     """
-    return reviews_crud.get_user_reviews(
+    reviews = reviews_crud.get_user_reviews(
         db=db,
         user_id=user_id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    pagination.set_next_cursor(response, pagination.next_cursor(reviews, limit))
+    return reviews
 
 # 获取交易的评价
 @router.get("/transaction/{transaction_id}", response_model=List[schemas.ReviewResponse])
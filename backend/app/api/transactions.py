@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from .. import schemas, dependencies
+from .. import schemas, dependencies, pagination
 from ..database import get_db
 from ..crud import transactions as transactions_crud
 
@@ -32,12 +32,40 @@ def create_transaction(
         buyer_id=current_user.id
     )
 
+# 获取用户的交易汇总
+@router.get("/mine", response_model=schemas.MyTransactionsResponse)
+def read_my_transactions(
+    status: Optional[schemas.TransactionStatus] = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
+):
+    """
+        获取当前用户的交易汇总（需要登录）
+
+        参数：
+        - status: 按交易状态筛选列表（不影响状态数量统计）
+        - limit: 买入、卖出列表各最多返回n条记录
+
+        返回：
+        - buy / sell: 买入、卖出交易列表（按创建时间倒序）
+        - buy_status_counts / sell_status_counts: 买入、卖出交易的各状态数量
+    """
+    return transactions_crud.get_user_transaction_summary(
+        db,
+        user_id=current_user.id,
+        status=status,
+        limit=limit
+    )
+
 # 获取用户作为买家的交易
 @router.get("/my-buy", response_model=List[schemas.TransactionResponse])
 def read_my_buy_transactions(
+    response: Response,
     status: Optional[schemas.TransactionStatus] = None,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
@@ -48,26 +76,32 @@ def read_my_buy_transactions(
         - status: 按交易状态筛选
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
         返回：
         - 交易列表
     """
     # 获取当前用户作为买家的交易（需要登录）
-    return transactions_crud.get_user_transactions(
+    transactions = transactions_crud.get_user_transactions(
         db,
         user_id=current_user.id,
         is_buyer=True,
         status=status,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    pagination.set_next_cursor(response, pagination.next_cursor(transactions, limit))
+    return transactions
 
 # 获取用户作为卖家的交易
 @router.get("/my-sell", response_model=List[schemas.TransactionResponse])
 def read_my_seller_transactions(
+    response: Response,
     status: Optional[schemas.TransactionStatus] = None,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
@@ -78,19 +112,23 @@ def read_my_seller_transactions(
         - status: 按交易状态筛选
         - skip: 跳过前n条记录（分页）
         - limit: 最多返回n条记录
+        - cursor: 分页游标（上一页响应头 X-Next-Cursor 的值，传入后忽略skip）
 
         返回：
         - 交易列表
     """
     # 获取当前用户作为卖家的交易（需要登录）
-    return transactions_crud.get_user_transactions(
+    transactions = transactions_crud.get_user_transactions(
         db,
         user_id=current_user.id,
         is_buyer=False,
         status=status,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    pagination.set_next_cursor(response, pagination.next_cursor(transactions, limit))
+    return transactions
 
 # 获取交易详情
 @router.get("/{transaction_id}", response_model=schemas.TransactionResponse)
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+from typing import Awaitable, Callable, List, Optional, Set
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# 消息代理地址：为空时使用进程内代理（单进程部署）；
+# 多个 worker / 多台机器部署时配置为 Redis 协议兼容的服务，如 redis://localhost:6379 或 unix:///run/redis/redis.sock
+BROKER_URL = os.getenv("CHAT_BROKER_URL", "")
+# 与代理服务断开后重连的最长等待时间（秒）
+MAX_RECONNECT_DELAY = 10
+
+# 收到消息的回调：(频道, 已编码的消息文本)
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+class Broker(ABC):
+    """
+        发布/订阅代理
+
+        - publish 把消息发到频道，所有订阅了该频道的进程（包括自己）都会收到
+        - subscribe / unsubscribe 管理当前进程订阅的频道
+        - 消息为已编码的文本，代理不关心内容
+    """
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str):
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        ...
+
+    async def _dispatch(self, channel: str, data: str):
+        if self._handler is None:
+            return
+        try:
+            await self._handler(channel, data)
+        except Exception:
+            logger.exception("处理频道 %s 的消息失败", channel)
+
+
+class InProcessBroker(Broker):
+    """进程内代理：直接调用本进程的回调，只适用于单进程部署"""
+
+    def __init__(self):
+        super().__init__()
+        self._channels: Set[str] = set()
+
+    async def publish(self, channel: str, data: str):
+        if channel in self._channels:
+            await self._dispatch(channel, data)
+
+    async def subscribe(self, channel: str):
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        self._channels.discard(channel)
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+def _encode_command(*args: str) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        value = arg.encode() if isinstance(arg, str) else arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("代理连接已关闭")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RedisProtocolError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode()
+    if kind in (b"*", b">"):
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisProtocolError(f"无法解析的响应：{line!r}")
+
+
+class RedisBroker(Broker):
+    """
+        基于 Redis 发布/订阅协议的跨进程代理
+
+        - 支持 redis://[:password@]host[:port] 和 unix:///path/to/socket（可带 ?password=）
+        - 发布和订阅各用一个连接；订阅连接在后台任务中接收消息
+        - 连接断开后按指数退避重连，并重新订阅当前的所有频道；断开期间发布的消息会丢失
+          （聊天消息已写入数据库，客户端重连后可以拉取）
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "unix"):
+            raise ValueError(f"不支持的消息代理地址：{url}")
+        self._unix_path = parsed.path if parsed.scheme == "unix" else None
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        query = dict(part.split("=", 1) for part in parsed.query.split("&") if "=" in part)
+        password = parsed.password or query.get("password")
+        self._password = unquote(password) if password else None
+
+        self._channels: Set[str] = set()
+        self._publish_lock = asyncio.Lock()
+        self._publisher: Optional[tuple] = None
+        self._subscriber_writer: Optional[asyncio.StreamWriter] = None
+        self._subscriber_task: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def _open(self):
+        if self._unix_path:
+            reader, writer = await asyncio.open_unix_connection(self._unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(self._host, self._port)
+        if self._password:
+            writer.write(_encode_command("AUTH", self._password))
+            await writer.drain()
+            await _read_reply(reader)
+        return reader, writer
+
+    async def start(self, handler: MessageHandler):
+        await super().start(handler)
+        self._subscriber_task = asyncio.create_task(self._run_subscriber())
+        # 等待订阅连接建立（失败时在后台继续重试，不阻止应用启动）
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=MAX_RECONNECT_DELAY)
+        except asyncio.TimeoutError:
+            logger.error("无法连接消息代理，将在后台继续重试")
+
+    async def stop(self):
+        if self._subscriber_task is not None:
+            self._subscriber_task.cancel()
+            try:
+                await self._subscriber_task
+            except asyncio.CancelledError:
+                pass
+            self._subscriber_task = None
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def publish(self, channel: str, data: str):
+        async with self._publish_lock:
+            # 连接失效时重连一次
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._open()
+                    reader, writer = self._publisher
+                    writer.write(_encode_command("PUBLISH", channel, data))
+                    await writer.drain()
+                    await _read_reply(reader)
+                    return
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    if self._publisher is not None:
+                        self._publisher[1].close()
+                        self._publisher = None
+                    if attempt:
+                        raise
+
+    async def subscribe(self, channel: str):
+        if channel in self._channels:
+            return
+        self._channels.add(channel)
+        await self._send_subscription("SUBSCRIBE", channel)
+
+    async def unsubscribe(self, channel: str):
+        if channel not in self._channels:
+            return
+        self._channels.discard(channel)
+        await self._send_subscription("UNSUBSCRIBE", channel)
+
+    async def _send_subscription(self, command: str, channel: str):
+        # 未连接时只记录频道，连接建立后统一订阅
+        writer = self._subscriber_writer
+        if writer is None:
+            return
+        try:
+            writer.write(_encode_command(command, channel))
+            await writer.drain()
+        except (ConnectionError, OSError):
+            # 订阅连接会自动重连并重新订阅
+            pass
+
+    async def _run_subscriber(self):
+        delay = 0.5
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                # 先登记连接再取频道快照（中间没有 await），之后新增的频道由 subscribe 直接发送
+                self._subscriber_writer = writer
+                channels: List[str] = sorted(self._channels)
+                # 空订阅会报错，始终订阅一个占位频道，保持连接处于订阅模式
+                writer.write(_encode_command("SUBSCRIBE", "__broker__", *channels))
+                await writer.drain()
+                self._subscribed.set()
+                delay = 0.5
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == "message":
+                        await self._dispatch(reply[1], reply[2])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("消息代理订阅连接断开（%s），%.1f 秒后重连", exc, delay)
+            finally:
+                self._subscriber_writer = None
+                self._subscribed.clear()
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def create_broker(url: str = BROKER_URL) -> Broker:
+    """根据地址创建代理，地址为空时使用进程内代理"""
+    if not url:
+        return InProcessBroker()
+    return RedisBroker(url)
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+# 缓存未命中标记（缓存值本身可能是 None 或空列表）
+MISSING = object()
+
+
+class TTLCache:
+    """
+        进程内缓存：TTL 过期 + LRU 容量限制 + 按标签失效
+
+        - 每个条目可以带若干标签（如 "item:3"、"category:1"），写操作按标签精确失效相关条目
+        - 记录命中、未命中、淘汰、过期、失效次数，便于观察缓存效果
+    """
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 30):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (过期时间, 值, 标签)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # 标签 -> 键集合
+        self._tags: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """获取缓存值，未命中或已过期时返回 MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_tags(self, *tags: str):
+        """使带有任一标签的条目失效"""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _remove(self, key: Hashable):
+        # 调用方需持有锁
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# 物品列表查询结果（有序的物品ID列表）
+item_list_cache = TTLCache("item_list", maxsize=512, ttl=30)
+# 物品列表序列化后的分页响应（ItemBriefResponse 列表）
+item_page_cache = TTLCache("item_page", maxsize=256, ttl=30)
+# 物品分面统计（各分类、状态、价格区间的数量）
+item_facets_cache = TTLCache("item_facets", maxsize=128, ttl=10)
+
+# 所有缓存实例（用于统计接口）
+CACHES = [item_list_cache, item_page_cache, item_facets_cache]
+
+
+# 按收藏数排序的列表的标签
+MOST_FAVORITED_TAG = "sort:most_favorited"
+
+
+# 物品列表缓存条目的标签
+def item_listing_tags(
+    category_id: Optional[int],
+    item_ids: Iterable[int],
+    sort: Optional[str] = None,
+    owner_ids: Iterable[int] = ()
+) -> set:
+    """
+        列表条目的标签：
+        - category:<id> / category:*：按分类（或不限分类）筛选的列表，物品新增或变更后可能出现在其中
+        - item:<id>：列表中包含的物品，物品变更或删除后需要失效
+        - sort:<排序方式>：按该方式排序的列表；按收藏数排序的列表在收藏、取消收藏后失效
+        - user:<id>：列表页中物品的所有者，序列化的列表页包含所有者信息，用户资料变化后需要失效
+    """
+    tags = {f"category:{category_id}" if category_id else "category:*"}
+    tags.update(f"item:{item_id}" for item_id in item_ids)
+    if sort:
+        tags.add(f"sort:{sort}")
+    tags.update(f"user:{owner_id}" for owner_id in owner_ids)
+    return tags
+
+
+# 物品写操作后失效相关的列表缓存
+def invalidate_item(item_id: int, *category_ids: Optional[int]):
+    """物品新增、更新、删除（包括交易导致的状态变化）后调用，传入变更前后的分类ID"""
+    tags = {f"item:{item_id}", "category:*"}
+    tags.update(f"category:{category_id}" for category_id in category_ids if category_id)
+    for cache in (item_list_cache, item_page_cache, item_facets_cache):
+        cache.invalidate_tags(*tags)
+
+
+def invalidate_item_content(item_id: int):
+    """物品只有展示内容（如图片）变化、不影响列表成员和排序时调用，只失效包含该物品的已序列化列表页"""
+    item_page_cache.invalidate_tags(f"item:{item_id}")
+
+
+def invalidate_favorites():
+    """收藏、取消收藏后调用：按收藏数排序的列表（及其已序列化的列表页）顺序可能变化"""
+    for cache in (item_list_cache, item_page_cache):
+        cache.invalidate_tags(MOST_FAVORITED_TAG)
+
+
+def invalidate_user(user_id: int):
+    """用户资料（用户名、头像、信用分等）变化后调用，失效包含其物品的已序列化列表页"""
+    item_page_cache.invalidate_tags(f"user:{user_id}")
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache.name: cache.stats() for cache in CACHES}
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from . import schemas
+
+logger = logging.getLogger(__name__)
+
+# 收到第一条消息后再等待多久，把这段时间内到达的消息合并为一批（秒）
+FLUSH_INTERVAL = 0.005
+# 每批最多写入的消息数
+MAX_BATCH_SIZE = 200
+
+
+def message_payload(chat) -> dict:
+    """已保存的消息推送给客户端时的内容（不含发送者信息）"""
+    return {
+        "id": chat.id,
+        "item_id": chat.item_id,
+        "sender_id": chat.sender_id,
+        "receiver_id": chat.receiver_id,
+        "message": chat.message,
+        "created_at": chat.created_at.isoformat(),
+    }
+
+
+def _write_batch(entries: List[Tuple[int, schemas.ChatCreate]]) -> list:
+    from .crud import chats as chats_crud
+    from .database import SessionLoacl
+
+    # 提交后不使对象过期，生成推送内容时无需再查询数据库
+    db = SessionLoacl(expire_on_commit=False)
+    try:
+        try:
+            # 提交是最后一步，异常时这一批消息都未保存，逐条重试不会重复保存
+            results = chats_crud.create_chats_batch(db, entries)
+        except Exception:
+            # 整批写入失败时逐条重试，避免一条异常的消息拖累同批的其他消息
+            db.rollback()
+            logger.exception("批量保存聊天消息失败，改为逐条保存")
+            results = []
+            for entry in entries:
+                try:
+                    results.extend(chats_crud.create_chats_batch(db, [entry]))
+                except Exception as exc:
+                    db.rollback()
+                    results.append(exc)
+        return [
+            result if isinstance(result, Exception) else message_payload(result)
+            for result in results
+        ]
+    finally:
+        db.close()
+
+
+class ChatBatchWriter:
+    """
+        聊天消息的批量写入器
+
+        - WebSocket 收到的消息放入队列，后台任务每隔 FLUSH_INTERVAL 把队列中的消息合并为一批，
+          在线程池中一次事务写入（一次提交代替每条消息一次提交）
+        - 队列按到达顺序写入，同一连接发送的消息顺序不变
+        - submit 返回的 Future 在写入后得到消息内容（含分配的ID），校验失败时得到 HTTPException
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_batch_size: int = MAX_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.messages = 0
+
+    def _ensure_started(self):
+        # 首次提交时启动后台任务（事件循环变化时重新启动，如测试中每个客户端各自的事件循环）
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            if self._queue is not None:
+                self._fail_pending(RuntimeError("消息写入任务已停止"))
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    def _fail_pending(self, exc: Exception):
+        # 旧的后台任务已退出，队列中等待写入的消息不会再被处理，通知等待方
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is None or entry[2].done():
+                continue
+            try:
+                entry[2].set_exception(exc)
+            except RuntimeError:
+                # Future 所属的事件循环已关闭
+                pass
+
+    def submit(self, sender_id: int, chat: schemas.ChatCreate) -> asyncio.Future:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sender_id, chat, future))
+        return future
+
+    async def stop(self):
+        """停止后台任务，队列中剩余的消息写入后再返回"""
+        if self._task is None or self._task.done() or self._loop is not asyncio.get_running_loop():
+            return
+        # 队列末尾放入结束标记，之前的消息都会被写入
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            # 等待同一时间窗口内的其他消息
+            await asyncio.sleep(self.flush_interval)
+            batch = [first]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        entries = [(sender_id, chat) for sender_id, chat, _ in batch]
+        try:
+            results = await asyncio.to_thread(_write_batch, entries)
+        except Exception as exc:
+            logger.exception("保存聊天消息失败")
+            results = [exc] * len(batch)
+        self.batches += 1
+        self.messages += len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+chat_writer = ChatBatchWriter()
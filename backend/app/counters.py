@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# 计数缓冲区写入数据库的间隔（秒）
+FLUSH_INTERVAL = 5
+
+
+class WriteBehindCounters:
+    """
+        物品浏览数的写回缓冲
+
+        - 每次浏览只在内存中累加增量，不直接 UPDATE items 表
+        - 定时（或关闭时）把累积的增量合并成一条批量 UPDATE 写入数据库，
+          同一物品在一个周期内的多次浏览只产生一次行更新
+        - 写入失败时增量会合并回缓冲区，下个周期重试
+        - 计数只保存在当前进程中，进程异常退出时最多丢失一个周期的增量，
+          只适用于允许少量误差的浏览数；收藏数是持久数据，在收藏的事务中直接更新
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Counter = Counter()
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+        self.last_flush_at = None
+
+    def record_view(self, item_id: int):
+        with self._lock:
+            self._views[item_id] += 1
+
+    def pending(self, item_id: int) -> Dict[str, int]:
+        """尚未写入数据库的增量"""
+        with self._lock:
+            return {"views": self._views.get(item_id, 0)}
+
+    def _drain(self):
+        with self._lock:
+            views, self._views = self._views, Counter()
+        return views
+
+    def _restore(self, views: Counter):
+        with self._lock:
+            self._views.update(views)
+
+    def flush(self, db: Session) -> int:
+        """把缓冲的增量批量写入 items 表，返回更新的物品数"""
+        views = self._drain()
+        rows = [{"b_item_id": item_id, "b_views": count} for item_id, count in views.items() if count]
+        if not rows:
+            return 0
+
+        items = models.Item.__table__
+        statement = (
+            update(items)
+            .where(items.c.id == bindparam("b_item_id"))
+            .values(view_count=items.c.view_count + bindparam("b_views"))
+        )
+        try:
+            db.connection().execute(statement, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._restore(views)
+            self.failures += 1
+            logger.exception("物品计数写入失败，%d 个物品的增量将在下个周期重试", len(rows))
+            raise
+
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        self.last_flush_at = time.time()
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending_items = len(self._views)
+        return {
+            "pending_items": pending_items,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failures": self.failures,
+            "last_flush_at": self.last_flush_at
+        }
+
+
+item_counters = WriteBehindCounters()
+
+
+# 定时任务：写入计数缓冲
+def flush_counters():
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        return item_counters.flush(db)
+    finally:
+        db.close()
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
 from .. import models, schemas
+from ..suggest import suggestions
 
 # 创建分类
 def create_category(db: Session, category: schemas.CategoryCreate):
@@ -23,6 +24,7 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    suggestions.index_category(db_category)
 
     return db_category
 
@@ -61,6 +63,7 @@ def update_category(db: Session, category_id: int, category_update: schemas.Cate
 
     db.commit()
     db.refresh(db_category)
+    suggestions.index_category(db_category)
 
     return db_category
 
@@ -84,5 +87,6 @@ def delete_category(db: Session, category_id: int):
 
     db.delete(db_category)
     db.commit()
+    suggestions.remove_category(category_id)
 
     return {"message": "分类已成功删除"}
\ No newline at end of file
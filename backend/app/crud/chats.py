@@ -1,13 +1,14 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import case, func, select, union_all, update
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
-from typing import List
+from typing import List, Optional, Tuple, Union
 
-from .. import models, schemas
+from .. import models, schemas, pagination, loaders
 
-# 创建聊天消息
-def create_chat(db: Session, chat: schemas.ChatCreate, sender_id: int):
+# 检查能否发送消息
+def _check_chat(item: Optional[models.Item], receiver: Optional[models.User], chat: schemas.ChatCreate, sender_id: int):
     # 检查物品是否存在
-    item = db.query(models.Item).filter(models.Item.id == chat.item_id).first()
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -15,7 +16,6 @@ def create_chat(db: Session, chat: schemas.ChatCreate, sender_id: int):
         )
 
     # 检查接收者是否存在
-    receiver = db.query(models.User).filter(models.User.id == chat.receiver_id).first()
     if not receiver:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -36,6 +36,12 @@ def create_chat(db: Session, chat: schemas.ChatCreate, sender_id: int):
             detail="没有权限发送此消息"
         )
 
+# 创建聊天消息
+def create_chat(db: Session, chat: schemas.ChatCreate, sender_id: int):
+    item = db.query(models.Item).filter(models.Item.id == chat.item_id).first()
+    receiver = db.query(models.User).filter(models.User.id == chat.receiver_id).first()
+    _check_chat(item, receiver, chat, sender_id)
+
     # 创建消息对象
     db_chat = models.Chat(
         item_id=chat.item_id,
@@ -44,15 +50,116 @@ def create_chat(db: Session, chat: schemas.ChatCreate, sender_id: int):
         message=chat.message
     )
 
-    # 保存消息
+    # 保存消息，并在同一事务中更新会话
     db.add(db_chat)
+    db.flush()
+    # 取回数据库生成的时间，用于更新会话
+    db.refresh(db_chat, ["created_at"])
+    _record_message(db, item, db_chat)
     db.commit()
     db.refresh(db_chat)
 
     return db_chat
 
+# 批量创建聊天消息（多个发送者的消息在一个事务中提交）
+def create_chats_batch(db: Session, chats: List[Tuple[int, schemas.ChatCreate]]) -> List[Union[models.Chat, HTTPException]]:
+    """
+        参数：
+        - chats: (发送者ID, 消息) 列表
+
+        返回：
+        - 与 chats 一一对应：保存成功的消息，或校验失败的 HTTPException
+    """
+    # 一次查询取回所有涉及的物品和接收者
+    item_ids = {chat.item_id for _, chat in chats}
+    receiver_ids = {chat.receiver_id for _, chat in chats}
+    items = {item.id: item for item in db.query(models.Item).filter(models.Item.id.in_(item_ids))}
+    receivers = {user.id: user for user in db.query(models.User).filter(models.User.id.in_(receiver_ids))}
+
+    results: List[Union[models.Chat, HTTPException]] = []
+    for sender_id, chat in chats:
+        try:
+            _check_chat(items.get(chat.item_id), receivers.get(chat.receiver_id), chat, sender_id)
+        except HTTPException as exc:
+            results.append(exc)
+            continue
+        results.append(models.Chat(
+            item_id=chat.item_id,
+            sender_id=sender_id,
+            receiver_id=chat.receiver_id,
+            message=chat.message
+        ))
+
+    db_chats = [result for result in results if isinstance(result, models.Chat)]
+    if not db_chats:
+        return results
+
+    # 批量插入后一次查询取回数据库生成的时间，按顺序更新会话
+    db.add_all(db_chats)
+    db.flush()
+    db.query(models.Chat).filter(models.Chat.id.in_([db_chat.id for db_chat in db_chats])).all()
+    for db_chat in db_chats:
+        _record_message(db, items[db_chat.item_id], db_chat)
+
+    # 提交放在最后：提交前的任何异常都会整体回滚，调用方可以安全地重试
+    db.commit()
+    return results
+
+# 发送消息后更新会话：最后一条消息、接收方未读数加一、发送方视为已读
+def _record_message(db: Session, item: models.Item, db_chat: models.Chat):
+    conversation = models.Conversation
+    seller_id = item.user_id
+    buyer_id = db_chat.receiver_id if db_chat.sender_id == seller_id else db_chat.sender_id
+    sender_side, receiver_side = ("seller", "buyer") if db_chat.sender_id == seller_id else ("buyer", "seller")
+
+    # 用 SQL 表达式累加，并发发送的消息不会丢失计数；最后一条消息只会前进。
+    # MySQL 按书写顺序执行 SET 并让后面的赋值看到前面赋值后的值，
+    # 因此 last_message_at 必须在 last_message_id 之前赋值（两者都要用旧的 last_message_id 判断）
+    is_newer = func.coalesce(conversation.last_message_id, 0) < db_chat.id
+    values = (
+        # 使用消息本身的时间，会话顺序、游标与消息顺序一致
+        (conversation.last_message_at, case((is_newer, db_chat.created_at), else_=conversation.last_message_at)),
+        (conversation.last_message_id, case((is_newer, db_chat.id), else_=conversation.last_message_id)),
+        (getattr(conversation, f"{receiver_side}_unread"), getattr(conversation, f"{receiver_side}_unread") + 1),
+        (getattr(conversation, f"{sender_side}_unread"), 0),
+        (getattr(conversation, f"{sender_side}_last_read_id"), db_chat.id),
+    )
+    statement = update(conversation).where(
+        conversation.item_id == item.id,
+        conversation.buyer_id == buyer_id,
+        conversation.seller_id == seller_id,
+    ).ordered_values(*values).execution_options(synchronize_session=False)
+    if db.execute(statement).rowcount:
+        return
+
+    # 会话的第一条消息
+    try:
+        with db.begin_nested():
+            db.add(models.Conversation(
+                item_id=item.id,
+                buyer_id=buyer_id,
+                seller_id=seller_id,
+                last_message_id=db_chat.id,
+                last_message_at=db_chat.created_at,
+                **{
+                    f"{receiver_side}_unread": 1,
+                    f"{sender_side}_unread": 0,
+                    f"{sender_side}_last_read_id": db_chat.id,
+                }
+            ))
+    except IntegrityError:
+        # 另一个请求同时创建了该会话
+        db.execute(statement)
+
 # 获取物品的聊天记录
-def get_item_chats(db: Session, item_id: int, user_id: int, skip: int = 0, limit: int = 100):
+def get_item_chats(
+    db: Session,
+    item_id: int,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
     # 获取指定物品的聊天记录（只能查看自己参与的）
     # 检查物品是否存在
     item = db.query(models.Item).filter(models.Item.id == item_id).first()
@@ -77,43 +184,111 @@ def get_item_chats(db: Session, item_id: int, user_id: int, skip: int = 0, limit
             )
 
     # 查询聊天记录（按时间升序，oldest first)
-    return db.query(models.Chat).filter(
-        models.Chat.item_id == item_id
-    ).order_by(models.Chat.created_at).offset(skip).limit(limit).all()
+    query = db.query(models.Chat).filter(models.Chat.item_id == item_id)
+    return pagination.paginate(
+        query, [models.Chat.created_at, models.Chat.id],
+        skip=skip, limit=limit, cursor=cursor, descending=False
+    )
+
+# 会话对当前用户的视图：对方用户、自己的未读数和已读位置
+def _conversation_view(conversation: models.Conversation, user_id: int) -> dict:
+    is_buyer = conversation.buyer_id == user_id
+    return {
+        "id": conversation.id,
+        "item": conversation.item,
+        "last_message": conversation.last_message,
+        "last_message_at": conversation.last_message_at,
+        "other_user": conversation.seller if is_buyer else conversation.buyer,
+        "unread_count": conversation.buyer_unread if is_buyer else conversation.seller_unread,
+        "last_read_message_id": conversation.buyer_last_read_id if is_buyer else conversation.seller_last_read_id,
+    }
 
 # 获取所有用户的聊天会话
-def get_user_chats(db: Session, user_id: int):
-    # 获取用户参与的所有聊天会话（按物品分组）
-    # 查询用户参与的所有物品ID
-    subquery = db.query(
-        models.Chat.item_id
-    ).filter(
-        (models.Chat.sender_id == user_id) | (models.Chat.receiver_id == user_id)
-    ).distinct()
-
-    # 获取这些物品的信息以及最后一条消息
-    conversations = []
-    for item_id in subquery:
-        item_id = item_id[0]
-        item = db.query(models.Item).filter(models.Item.id == item_id).first()
-
-        # 获取最后一条消息
-        last_message = db.query(models.Chat).filter(
-            models.Chat.item_id == item_id,
-            (models.Chat.sender_id == user_id) | (models.Chat.receiver_id == user_id)
-        ).order_by(models.Chat.created_at.desc()).first()
+def get_user_chats(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """
+        获取用户参与的聊天会话（每个物品的买家、卖家之间一个会话），按最后一条消息时间倒序
+
+        直接读取 conversations 表，按最后活动时间的 (last_message_at, id) 键集分页
+    """
+    conversation = models.Conversation
+    columns = [conversation.last_message_at, conversation.id]
+    values = pagination.decode_cursor(cursor, len(columns)) if cursor else None
+
+    # 作为买家、作为卖家各取一段：每段是 (buyer_id|seller_id, last_message_at, id) 索引上的一次范围扫描，
+    # 各自最多取 skip + limit 条，合并后再排序截取（避免 OR 条件导致的索引合并和文件排序）
+    def side(user_column, name):
+        query = select(conversation.id, conversation.last_message_at).where(user_column == user_id)
+        if values is not None:
+            query = query.where(pagination.keyset_after(columns, values))
+        query = query.order_by(conversation.last_message_at.desc(), conversation.id.desc())
+        return select(query.limit(limit if values is not None else skip + limit).subquery(name))
+
+    merged = union_all(side(conversation.buyer_id, "as_buyer"), side(conversation.seller_id, "as_seller")).subquery("merged")
+    page = select(merged.c.id).order_by(merged.c.last_message_at.desc(), merged.c.id.desc()).limit(limit)
+    if values is None and skip:
+        page = page.offset(skip)
+    ids = db.execute(page).scalars().all()
+    if not ids:
+        return []
+
+    # 按主键取回本页的会话及其关联对象，保持合并后的顺序
+    by_id = {
+        row.id: row
+        for row in db.query(conversation).options(*loaders.CONVERSATION).filter(conversation.id.in_(ids))
+    }
+    return [_conversation_view(by_id[conversation_id], user_id) for conversation_id in ids]
+
+
+# 会话列表的下一页游标
+def next_conversations_cursor(conversations: list, limit: int) -> Optional[str]:
+    return pagination.next_cursor(
+        conversations, limit,
+        key=lambda conversation: (conversation["last_message_at"], conversation["id"])
+    )
 
-        # 获取对方用户信息
-        other_user_id = item.user_id if item.user_id != user_id else (
-            last_message.sender_id if last_message.sender_id != user_id else last_message.receiver_id
+
+# 将会话标记为已读
+def mark_conversation_read(db: Session, conversation_id: int, user_id: int):
+    conversation = db.query(models.Conversation).filter(models.Conversation.id == conversation_id).first()
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="会话不存在"
+        )
+
+    if user_id not in (conversation.buyer_id, conversation.seller_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有权限操作此会话"
         )
-        other_user = db.query(models.User).filter(models.User.id == other_user_id).first()
 
-        conversations.append({
-            "item": item,
-            "last_message": last_message,
-            "other_user": other_user
-        })
+    # 在一条语句中清零未读数并把已读位置移到最后一条消息，不会漏掉同时到达的消息
+    side = "buyer" if conversation.buyer_id == user_id else "seller"
+    db.query(models.Conversation).filter(models.Conversation.id == conversation_id).update({
+        getattr(models.Conversation, f"{side}_unread"): 0,
+        getattr(models.Conversation, f"{side}_last_read_id"): models.Conversation.last_message_id,
+    }, synchronize_session=False)
+    db.commit()
+
+    conversation = db.query(models.Conversation).options(*loaders.CONVERSATION).filter(
+        models.Conversation.id == conversation_id
+    ).populate_existing().one()
+    return _conversation_view(conversation, user_id)
+
 
-    # 按最后一条消息时间倒序排序
-    return sorted(conversations, key=lambda x:x["last_message"].created_at, reverse=True)
+# 获取用户的未读消息总数
+def get_unread_count(db: Session, user_id: int) -> int:
+    conversation = models.Conversation
+    as_buyer = select(func.coalesce(func.sum(conversation.buyer_unread), 0)).where(
+        conversation.buyer_id == user_id
+    ).scalar_subquery()
+    as_seller = select(func.coalesce(func.sum(conversation.seller_unread), 0)).where(
+        conversation.seller_id == user_id
+    ).scalar_subquery()
+    return int(db.query(as_buyer + as_seller).scalar())
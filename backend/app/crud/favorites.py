@@ -1,10 +1,17 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
 from fastapi import HTTPException, status
-from typing import List
+from typing import List, Optional
 
-from .. import models, schemas
+from .. import models, schemas, pagination, loaders, cache
 from .items import get_item  # 引入物品操作
 
+# 在收藏的事务中更新物品的收藏数（用 SQL 表达式累加，并发收藏不会丢失计数）
+def _adjust_favorite_count(db: Session, item_id: int, delta: int):
+    db.query(models.Item).filter(models.Item.id == item_id).update(
+        {models.Item.favorite_count: models.Item.favorite_count + delta}, synchronize_session=False
+    )
+
 # 创建收藏（收藏物品）
 def create_favorite(db: Session, favorite: schemas.FavoriteCreate, user_id: int):
     """收藏物品"""
@@ -34,19 +41,23 @@ def create_favorite(db: Session, favorite: schemas.FavoriteCreate, user_id: int)
         item_id=favorite.item_id
     )
 
-    # 保存收藏
+    # 保存收藏，收藏数在同一个事务中加一
     db.add(db_favorite)
+    db.flush()
+    _adjust_favorite_count(db, favorite.item_id, 1)
     db.commit()
     db.refresh(db_favorite)
+    cache.invalidate_favorites()
 
     return db_favorite
 
 # 获取用户的收藏列表
-def get_user_favorites(db: Session, user_id: int, skip: int = 0, limit: int = 20):
+def get_user_favorites(db: Session, user_id: int, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
     """获取指定用户的收藏列表"""
-    return db.query(models.Favorite).filter(
-        models.Favorite.user_id == user_id
-    ).order_by(models.Favorite.created_at.desc()).offset(skip).limit(limit).all()
+    query = db.query(models.Favorite).options(*loaders.FAVORITE).filter(models.Favorite.user_id == user_id)
+    return pagination.paginate(
+        query, [models.Favorite.created_at, models.Favorite.id], skip=skip, limit=limit, cursor=cursor
+    )
 
 # 取消收藏（删除收藏）
 def delete_favorite(db: Session, item_id: int, user_id: int):
@@ -63,8 +74,12 @@ def delete_favorite(db: Session, item_id: int, user_id: int):
             detail="未收藏该物品"
         )
 
-    db.delete(db_favorite)
+    # 按实际删除的行数减少收藏数（并发取消收藏时只有一个请求删除成功）
+    deleted = db.query(models.Favorite).filter(models.Favorite.id == db_favorite.id).delete(synchronize_session=False)
+    _adjust_favorite_count(db, item_id, -deleted)
     db.commit()
+    if deleted:
+        cache.invalidate_favorites()
 
     return {"message": "已取消收藏"}
 
@@ -76,4 +91,16 @@ def is_item_favorited(db: Session, item_id: int, user_id: int):
         models.Favorite.item_id == item_id
     ).first()
 
-    return favorite is not None
\ No newline at end of file
+    return favorite is not None
+
+# 按收藏记录重新统计物品的收藏数（修复历史数据中不一致的计数）
+def recount_favorite_counts(db: Session) -> int:
+    """返回修正的物品数"""
+    actual = select(func.count(models.Favorite.id)).where(
+        models.Favorite.item_id == models.Item.id
+    ).scalar_subquery()
+    fixed = db.execute(
+        update(models.Item).where(models.Item.favorite_count != actual).values(favorite_count=actual)
+    ).rowcount
+    db.commit()
+    return fixed
@@ -1,9 +1,35 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import case, false, func, or_, insert
 from fastapi import HTTPException, status
 from typing import List, Optional
+from pydantic import ValidationError
 
-from .. import models, schemas
+from .. import models, schemas, pagination, loaders, cache, storage
+from .. import search as search_index
+from ..recommend import similar_items
+from ..suggest import suggestions
+from ..static_images import image_url, image_file_name, has_renditions
+
+# 批量创建物品时一次最多提交的物品数
+MAX_BULK_ITEMS = 500
+
+# 标记缩放图时每批检查的图片记录数
+RENDITION_MARK_BATCH_SIZE = 500
+
+# 图片文件名对应的完整URL
+def _full_image_url(file_name: str):
+    return image_url(image_file_name(file_name))
+
+# 新的图片记录（是否已有缩放图在写入时判断一次）
+def _new_image(file_name: str, position: int, **kwargs) -> dict:
+    full_image_url = _full_image_url(file_name)
+    return dict(
+        image_url=full_image_url,
+        blob_hash=storage.parse_blob_hash(file_name),
+        has_renditions=has_renditions(full_image_url),
+        position=position,
+        **kwargs
+    )
 
 # 创建物品
 def create_item(db: Session, item: schemas.ItemCreate, user_id: int):
@@ -17,25 +43,201 @@ def create_item(db: Session, item: schemas.ItemCreate, user_id: int):
         user_id=user_id
     )
 
-    # 保存物品
+    # 增加图片文件的引用数（图片不存在时不创建物品）
+    storage.acquire(db, [storage.parse_blob_hash(image.image_url) for image in item.images])
+
+    # 保存物品（flush 取得ID，与引用数、图片、搜索索引在同一个事务中提交）
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    db.flush()
 
     # 添加物品图片
     if item.images:
-        for file_name in item.images:
-            full_image_url=f"http://localhost:8000/static/images/{file_name.image_url}"
+        for position, file_name in enumerate(item.images):
+            db_image = models.ItemImage(**_new_image(file_name.image_url, position, item_id=db_item.id))
+            db.add(db_image)
+
+    # 更新搜索索引
+    search_index.index_item(db, db_item)
+    db.commit()
+    # 刷新物品信息以包含图片
+    db.refresh(db_item)
+
+    # 失效可能包含该物品的列表缓存
+    cache.invalidate_item(db_item.id, db_item.category_id)
+    similar_items.upsert(db_item)
+    suggestions.index_item(db_item)
+    return db_item
 
-            db_image = models.ItemImage(
-                item_id=db_item.id,
-                image_url=full_image_url
+# 批量创建物品
+def create_items_bulk(db: Session, rows: List[dict], user_id: int):
+    """
+        批量创建物品（所有物品、图片和搜索索引在同一个事务中写入）
+
+        参数：
+        - rows: 待创建的物品数据，逐条按 ItemCreate 校验
+        - user_id: 发布者ID
+
+        返回：
+        - 每条数据的处理结果（成功时包含物品ID，失败时包含错误原因）
+    """
+    results = [None] * len(rows)
+    valid = []
+
+    # 逐条校验，校验失败的数据不影响其他数据
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, schemas.ItemCreate.model_validate(row)))
+        except ValidationError as e:
+            results[index] = {"index": index, "success": False, "error": _validation_message(e)}
+
+    # 一次查询校验所有分类是否存在
+    category_ids = {item.category_id for _, item in valid if item.category_id is not None}
+    existing_categories = set()
+    if category_ids:
+        existing_categories = {
+            category_id for (category_id,) in
+            db.query(models.Category.id).filter(models.Category.id.in_(category_ids))
+        }
+    # 一次查询检查所有图片文件是否仍存在（锁定到提交，期间不会被回收）
+    existing_blobs = storage.lock_existing(db, [
+        storage.parse_blob_hash(image.image_url)
+        for _, item in valid
+        for image in item.images
+    ])
+    checked = []
+    for index, item in valid:
+        blob_hashes = [storage.parse_blob_hash(image.image_url) for image in item.images]
+        if item.category_id is not None and item.category_id not in existing_categories:
+            results[index] = {"index": index, "success": False, "error": "分类不存在"}
+        elif any(blob_hash and blob_hash not in existing_blobs for blob_hash in blob_hashes):
+            results[index] = {"index": index, "success": False, "error": "图片不存在或已过期，请重新上传"}
+        else:
+            checked.append((index, item))
+
+    if checked:
+        # 只为通过检查的物品增加图片文件的引用数
+        storage.acquire(db, [
+            storage.parse_blob_hash(image.image_url)
+            for _, item in checked
+            for image in item.images
+        ])
+
+        db_items = [
+            models.Item(
+                title=item.title,
+                description=item.description,
+                price=item.price,
+                category_id=item.category_id,
+                location=item.location,
+                user_id=user_id
             )
-            db.add(db_image)
+            for _, item in checked
+        ]
+        # 批量插入物品并取回ID
+        db.add_all(db_items)
+        db.flush()
+
+        # 批量插入图片
+        images = [
+            _new_image(image.image_url, position, item_id=db_item.id)
+            for db_item, (_, item) in zip(db_items, checked)
+            for position, image in enumerate(item.images)
+        ]
+        if images:
+            db.execute(insert(models.ItemImage), images)
+
+        # 批量写入搜索索引
+        search_index.index_new_items(db, db_items)
+        item_ids = [db_item.id for db_item in db_items]
         db.commit()
-        # 刷新物品信息以包含图片
-        db.refresh(db_image)
-    return db_item
+        # 提交后对象已过期，用一次 IN 查询重新加载，避免逐个刷新
+        db.query(models.Item).filter(models.Item.id.in_(item_ids)).all()
+
+        for db_item, (index, _) in zip(db_items, checked):
+            results[index] = {"index": index, "success": True, "id": db_item.id}
+
+        # 失效相关的列表缓存，更新内存中的推荐、联想索引
+        for db_item in db_items:
+            cache.invalidate_item(db_item.id, db_item.category_id)
+            similar_items.upsert(db_item)
+            suggestions.index_item(db_item)
+
+    return results
+
+def _validation_message(error: ValidationError):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+# 物品列表的筛选条件
+def _item_filters(
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    status: Optional[schemas.ItemStatus] = None
+):
+    filters = []
+
+    # 按分类筛选
+    if category_id:
+        filters.append(models.Item.category_id == category_id)
+
+    # 按价格范围筛选
+    if min_price is not None:
+        filters.append(models.Item.price >= min_price)
+    if max_price is not None:
+        filters.append(models.Item.price <= max_price)
+
+    # 按状态筛选
+    if status:
+        filters.append(models.Item.status == status)
+
+    return filters
+
+# 物品列表的排序方式 -> (排序列, 是否倒序)
+# 每种排序都有对应的 (筛选列..., 排序列, id) 索引，见 models.Item 的 __table_args__
+ITEM_SORTS = {
+    schemas.ItemSort.newest: ((models.Item.created_at, models.Item.id), True),
+    schemas.ItemSort.price_asc: ((models.Item.price, models.Item.id), False),
+    schemas.ItemSort.price_desc: ((models.Item.price, models.Item.id), True),
+    schemas.ItemSort.most_favorited: ((models.Item.favorite_count, models.Item.id), True),
+}
+
+# 价格可为空（免费），分页时需要按 NULL 的排序位置比较
+ITEM_NULLABLE_SORT_COLUMNS = (models.Item.price,)
+
+# 实际使用的排序方式
+def resolve_item_sort(sort: Optional[schemas.ItemSort], search: Optional[str]) -> schemas.ItemSort:
+    """未指定时搜索按相关度、否则按最新发布；没有搜索关键词时相关度排序退化为最新发布"""
+    if sort is None or sort == schemas.ItemSort.relevance:
+        return schemas.ItemSort.relevance if search else schemas.ItemSort.newest
+    return sort
+
+# 生成物品列表下一页的游标
+def next_items_cursor(items: list, limit: int, sort: schemas.ItemSort, offset: int = 0) -> Optional[str]:
+    if sort == schemas.ItemSort.relevance:
+        return pagination.next_offset_cursor(items, limit, offset)
+    if sort == schemas.ItemSort.newest:
+        return pagination.next_cursor(items, limit)
+    # 其他排序的游标带上排序方式，防止与其他排序的游标混用
+    columns, _ = ITEM_SORTS[sort]
+    return pagination.next_cursor(
+        items, limit, key=lambda item: (sort.value, *(getattr(item, column.key) for column in columns))
+    )
+
+def _paginate_items(query, sort: schemas.ItemSort, skip: int, limit: int, cursor: Optional[str]):
+    columns, descending = ITEM_SORTS[sort]
+    return pagination.paginate(
+        query,
+        columns,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        descending=descending,
+        nullable=ITEM_NULLABLE_SORT_COLUMNS,
+        cursor_prefix=() if sort == schemas.ItemSort.newest else (sort.value,)
+    )
 
 # 获取物品列表（支持筛选）
 def get_items(
@@ -46,50 +248,244 @@ def get_items(
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    status: Optional[schemas.ItemStatus] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[schemas.ItemSort] = None
+):
+    filters = _item_filters(category_id=category_id, min_price=min_price, max_price=max_price, status=status)
+    sort = resolve_item_sort(sort, search)
+
+    # 按关键词搜索（倒排索引检索）
+    if search:
+        # 只取相关度最高的一部分：按其他方式排序时 IN 列表的长度有上限
+        matched_ids = search_index.search_item_ids(db, search, filters=filters, limit=search_index.MAX_SEARCH_RESULTS)
+        # 按相关度排序
+        if sort == schemas.ItemSort.relevance:
+            offset = pagination.cursor_offset(skip, cursor)
+            return get_items_by_ids(db, matched_ids[offset:offset + limit])
+        # 在命中的物品中按指定方式排序
+        if not matched_ids:
+            return []
+        query = db.query(models.Item).options(*loaders.ITEM_BRIEF).filter(models.Item.id.in_(matched_ids))
+        return _paginate_items(query, sort, skip, limit, cursor)
+
+    # 查询结果缓存（命中时只需按主键取回物品）
+    cache_key = (category_id, min_price, max_price, status, sort, skip, limit, cursor)
+    item_ids = cache.item_list_cache.get(cache_key)
+    if item_ids is not cache.MISSING:
+        return get_items_by_ids(db, item_ids)
+
+    # 执行查询（默认按创建时间倒序，最新的在前面）
+    query = db.query(models.Item).options(*loaders.ITEM_BRIEF).filter(*filters)
+    items = _paginate_items(query, sort, skip, limit, cursor)
+
+    item_ids = [item.id for item in items]
+    cache.item_list_cache.set(cache_key, item_ids, tags=cache.item_listing_tags(category_id, item_ids, sort.value))
+    return items
+
+# 价格区间的分界点（区间左闭右开，价格为空或为0视为免费）
+PRICE_BUCKET_BOUNDS = [10, 50, 100, 500, 1000]
+
+# 价格区间（key, 最低价, 最高价）
+PRICE_BUCKETS = [("free", None, None)] + [
+    (f"{low}-{high}", low, high)
+    for low, high in zip([0] + PRICE_BUCKET_BOUNDS[:-1], PRICE_BUCKET_BOUNDS)
+] + [(f"{PRICE_BUCKET_BOUNDS[-1]}+", PRICE_BUCKET_BOUNDS[-1], None)]
+
+# 价格区间的SQL表达式
+def _price_bucket_expression():
+    whens = [(or_(models.Item.price.is_(None), models.Item.price == 0), "free")]
+    whens += [
+        (models.Item.price < high, key)
+        for key, low, high in PRICE_BUCKETS[1:-1]
+    ]
+    return case(*whens, else_=PRICE_BUCKETS[-1][0])
+
+# 获取物品分面统计（各分类、状态、价格区间的物品数量）
+def get_item_facets(
+    db: Session,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
     status: Optional[schemas.ItemStatus] = None
 ):
-    query = db.query(models.Item)
+    # 短时缓存
+    cache_key = (category_id, search, min_price, max_price, status)
+    facets = cache.item_facets_cache.get(cache_key)
+    if facets is not cache.MISSING:
+        return facets
 
-    # 按分类筛选
-    if category_id:
-        query = query.filter(models.Item.category_id == category_id)
+    filters = _item_filters(category_id=category_id, min_price=min_price, max_price=max_price, status=status)
+    rows = []
+    # 搜索时按完整的匹配集合统计（不受搜索排序的候选数上限影响）；没有匹配时无需查询
+    match = search_index.match_condition(db, search) if search else None
+    if not search or match is not None:
+        if match is not None:
+            filters.append(match)
+
+        # 一次分组聚合同时得到三个维度的计数
+        price_bucket = _price_bucket_expression().label("price_bucket")
+        rows = db.query(
+            models.Item.category_id,
+            models.Category.name,
+            models.Item.status,
+            price_bucket,
+            func.count()
+        ).outerjoin(
+            models.Category, models.Category.id == models.Item.category_id
+        ).filter(*filters).group_by(
+            models.Item.category_id, models.Category.name, models.Item.status, price_bucket
+        ).all()
+
+    total = 0
+    categories = {}
+    statuses = {item_status.value: 0 for item_status in schemas.ItemStatus}
+    buckets = {key: 0 for key, _, _ in PRICE_BUCKETS}
+    for row_category_id, category_name, item_status, bucket, count in rows:
+        total += count
+        category = categories.setdefault(row_category_id, {
+            "category_id": row_category_id,
+            "name": category_name,
+            "count": 0
+        })
+        category["count"] += count
+        if item_status is not None:
+            statuses[schemas.ItemStatus(item_status).value] += count
+        buckets[bucket] += count
 
-    # 按关键词搜索（标题或描述）
+    facets = {
+        "total": total,
+        "categories": sorted(categories.values(), key=lambda category: -category["count"]),
+        "statuses": statuses,
+        "price_buckets": [
+            {"key": key, "min_price": low, "max_price": high, "count": buckets[key]}
+            for key, low, high in PRICE_BUCKETS
+        ]
+    }
+    cache.item_facets_cache.set(cache_key, facets, tags=cache.item_listing_tags(category_id, []))
+    return facets
+
+# 导出物品的字段
+EXPORT_ITEM_COLUMNS = [
+    models.Item.id,
+    models.Item.title,
+    models.Item.description,
+    models.Item.price,
+    models.Item.status,
+    models.Item.location,
+    models.Item.category_id,
+    models.Item.user_id,
+    models.Item.created_at,
+    models.Item.updated_at,
+]
+
+# 构造导出物品的查询（筛选条件与物品列表一致，只查询列，不构造ORM对象）
+def export_items_query(
+    db: Session,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    status: Optional[schemas.ItemStatus] = None
+):
+    filters = _item_filters(category_id=category_id, min_price=min_price, max_price=max_price, status=status)
     if search:
-        query = query.filter(
-            or_(
-                models.Item.title.contains(search),
-                models.Item.description.contains(search)
-            )
-        )
+        # 导出完整的匹配集合（不受搜索排序的候选数上限影响）
+        match = search_index.match_condition(db, search)
+        filters.append(match if match is not None else false())
+    return db.query(*EXPORT_ITEM_COLUMNS).filter(*filters).order_by(
+        models.Item.created_at.desc(), models.Item.id.desc()
+    )
 
-    # 按价格范围筛选
-    if min_price is not None:
-        query = query.filter(models.Item.price >= min_price)
-    if max_price is not None:
-        query = query.filter(models.Item.price <= max_price)
+# 按ID列表获取物品（保持传入的顺序）
+def get_items_by_ids(db: Session, item_ids: List[int], options=loaders.ITEM_BRIEF):
+    if not item_ids:
+        return []
+    items = db.query(models.Item).options(*options).filter(models.Item.id.in_(item_ids)).all()
+    position = {item_id: index for index, item_id in enumerate(item_ids)}
+    return sorted(items, key=lambda item: position[item.id])
 
-    # 按状态筛选
-    if status:
-        query = query.filter(models.Item.status == status)
+# 获取相似物品
+def get_similar_items(db: Session, item_id: int, limit: int = 10):
+    """按标题、描述、分类、价格段的相似度返回可交易的物品"""
+    # 服务刚启动、索引尚未构建时先同步构建一次
+    if not similar_items.ready:
+        similar_items.rebuild(db)
+
+    item_ids = similar_items.similar(item_id, limit)
+    if item_ids is None:
+        db_item = get_item(db, item_id)
+        if db_item is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="物品不存在"
+            )
+        # 其他进程新发布的物品尚未进入本进程的索引
+        similar_items.upsert(db_item)
+        item_ids = similar_items.similar(item_id, limit)
 
-    # 执行查询（按创建时间倒序，最新的在前面）
-    return query.order_by(models.Item.created_at.desc()).offset(skip).limit(limit).all()
+    # 索引中的状态可能略有滞后，返回前再按数据库中的状态过滤一次
+    return [
+        item for item in get_items_by_ids(db, item_ids)
+        if item.status == models.ItemStatus.available
+    ]
 
 # 获取用户发布的物品
-def get_user_items(db: Session, user_id: int, skip: int = 0, limit: int = 20):
-    return db.query(models.Item).filter(
-        models.Item.user_id == user_id
-    ).order_by(models.Item.created_at.desc()).offset(skip).limit(limit).all()
+def get_user_items(db: Session, user_id: int, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
+    query = db.query(models.Item).options(*loaders.ITEM_BRIEF).filter(models.Item.user_id == user_id)
+    return pagination.paginate(
+        query, [models.Item.created_at, models.Item.id], skip=skip, limit=limit, cursor=cursor
+    )
 
 # 获取物品 by ID
 def get_item(db: Session, item_id: int):
-    return db.query(models.Item).filter(models.Item.id == item_id).first()
+    return db.query(models.Item).options(*loaders.ITEM_DETAIL).filter(models.Item.id == item_id).first()
 
 # 获取物品图片 by ID
 def get_item_images(db: Session, item_id: int):
     return db.query(models.ItemImage).filter(models.ItemImage.item_id == item_id).all()
 
+# 按提交的图片列表同步物品图片
+def _sync_item_images(db: Session, db_item: models.Item, images: List[schemas.ItemImageCreate]) -> bool:
+    """
+        与已有图片比较：保留仍在列表中的图片记录（只在顺序变化时更新 position），
+        插入新增的图片，删除移除的图片，并相应调整图片文件的引用数
+
+        返回：
+        - 图片是否有变化
+    """
+    # 按文件名分组已有的图片（同一张图片可以出现多次）
+    existing = {}
+    for db_image in db_item.images:
+        existing.setdefault(image_file_name(db_image.image_url), []).append(db_image)
+
+    moved = []
+    added = []
+    for position, image_data in enumerate(images):
+        file_name = image_file_name(image_data.image_url)
+        matches = existing.get(file_name)
+        if matches:
+            db_image = matches.pop(0)
+            if db_image.position != position:
+                moved.append((db_image, position))
+        else:
+            added.append(models.ItemImage(**_new_image(file_name, position)))
+    removed = [db_image for matches in existing.values() for db_image in matches]
+    if not (moved or added or removed):
+        return False
+
+    # 先引用新图片（图片不存在时在修改前失败），再释放移除的图片
+    storage.acquire(db, [db_image.blob_hash for db_image in added])
+    storage.release(db, [db_image.blob_hash for db_image in removed])
+
+    for db_image, position in moved:
+        db_image.position = position
+    for db_image in removed:
+        db_item.images.remove(db_image)
+    db_item.images.extend(added)
+    return True
+
 # 更新物品
 def update_item(db: Session, item_id: int, item_update: schemas.ItemUpdate, user_id: int):
     db_item = get_item(db, item_id)
@@ -111,25 +507,36 @@ def update_item(db: Session, item_id: int, item_update: schemas.ItemUpdate, user
     update_data = item_update.model_dump(exclude_unset=True, exclude={"images"})
     images_list = update_data.pop("images", None)  # 提取图片URL列表
 
+    old_category_id = db_item.category_id
     for key, value in update_data.items():
         setattr(db_item, key, value)
 
-    # 处理图片更新
-    if item_update.images:
-        db.query(models.ItemImage).filter(models.ItemImage.item_id == item_id).delete()
-
-        for image_data in item_update.images:
-            full_image_url = f"http://127.0.0.1:8000/static/images/{image_data.image_url}"
+    # 标题或描述变化时更新搜索索引
+    if "title" in update_data or "description" in update_data:
+        search_index.index_item(db, db_item)
 
-            db_image = models.ItemImage(
-                item_id=item_id,
-                image_url=full_image_url
-            )
-            db.add(db_image)
+    # 处理图片更新：只增删有变化的图片，与其他字段在同一个事务中提交
+    images_changed = False
+    if item_update.images:
+        images_changed = _sync_item_images(db, db_item, item_update.images)
 
     db.commit()
     db.refresh(db_item)
 
+    # 失效相关的列表缓存（交易状态变化导致的物品状态变化也经过这里）；只改了图片时只失效包含该物品的列表页
+    if update_data:
+        cache.invalidate_item(item_id, old_category_id, db_item.category_id)
+    elif images_changed:
+        cache.invalidate_item_content(item_id)
+
+    # 更新相似物品索引：内容变化时重新计算向量，仅状态变化时只更新可推荐标记
+    if {"title", "description", "category_id", "price"} & update_data.keys():
+        similar_items.upsert(db_item)
+    elif "status" in update_data:
+        similar_items.set_status(item_id, db_item.status)
+    if {"title", "status"} & update_data.keys():
+        suggestions.index_item(db_item)
+
     return db_item
 
 # 删除物品
@@ -156,7 +563,37 @@ def delete_item(db: Session, item_id: int, user_id: int):
             detail="只有可交易状态的物品才能删除"
         )
 
+    search_index.remove_item(db, item_id)
+    storage.release(db, [image.blob_hash for image in db_item.images])
     db.delete(db_item)
     db.commit()
 
-    return {"message": "物品已成功删除"}
\ No newline at end of file
+    cache.invalidate_item(item_id, db_item.category_id)
+    similar_items.remove(item_id)
+    suggestions.remove_item(item_id)
+
+    return {"message": "物品已成功删除"}
+
+# 标记已生成缩放图的旧图片（执行 generate-renditions 后调用）
+def mark_image_renditions(db: Session, batch_size: int = RENDITION_MARK_BATCH_SIZE) -> int:
+    """逐批检查尚未标记的旧的本地图片，缩放图已存在的设置 has_renditions，返回标记的记录数"""
+    marked = 0
+    last_id = 0
+    while True:
+        rows = db.query(models.ItemImage.id, models.ItemImage.image_url).filter(
+            models.ItemImage.id > last_id,
+            models.ItemImage.blob_hash.is_(None),
+            models.ItemImage.has_renditions.is_(False)
+        ).order_by(models.ItemImage.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        ids = [image_id for image_id, url in rows if has_renditions(url)]
+        if ids:
+            db.query(models.ItemImage).filter(models.ItemImage.id.in_(ids)).update(
+                {models.ItemImage.has_renditions: True}, synchronize_session=False
+            )
+            db.commit()
+        marked += len(ids)
+        last_id = rows[-1][0]
+    return marked
@@ -1,8 +1,8 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from typing import List
+from typing import List, Optional
 
-from .. import models, schemas
+from .. import models, schemas, pagination
 from .transactions import get_transaction  # 引入交易操作
 from .users import update_credit_score  # 引入用户信用分操作
 
@@ -89,11 +89,30 @@ def create_review(db: Session, review: schemas.ReviewCreate, reviewer_id: int):
     return db_review
 
 # 获取用户收到的评价
-def get_user_reviews(db: Session, user_id: int, skip: int = 0, limit: int = 20):
+def get_user_reviews(db: Session, user_id: int, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
     """获取指定用户收到的评价"""
-    return db.query(models.Review).filter(
+    query = db.query(models.Review).filter(models.Review.reviewee_id == user_id)
+    return pagination.paginate(
+        query, [models.Review.created_at, models.Review.id], skip=skip, limit=limit, cursor=cursor
+    )
+
+# 导出评价的字段
+EXPORT_REVIEW_COLUMNS = [
+    models.Review.id,
+    models.Review.transaction_id,
+    models.Review.reviewer_id,
+    models.Review.reviewee_id,
+    models.Review.rating,
+    models.Review.comment,
+    models.Review.created_at,
+]
+
+# 构造导出用户收到的评价的查询
+def export_user_reviews_query(db: Session, user_id: int):
+    """导出指定用户收到的评价"""
+    return db.query(*EXPORT_REVIEW_COLUMNS).filter(
         models.Review.reviewee_id == user_id
-    ).order_by(models.Review.created_at.desc()).offset(skip).limit(limit).all()
+    ).order_by(models.Review.created_at.desc(), models.Review.id.desc())
 
 # 获取交易的评价
 def get_transaction_review(db: Session, transaction_id: int):
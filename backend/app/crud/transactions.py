@@ -1,8 +1,9 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import case, func, or_
 from fastapi import HTTPException, status
 from typing import List, Optional
 
-from .. import models, schemas
+from .. import models, schemas, pagination, loaders
 from .items import get_item, update_item  # 引入物品操作
 from .users import update_credit_score  # 引入用户信用分操作
 
@@ -75,9 +76,10 @@ def get_user_transactions(
     is_buyer: bool = True,
     status: Optional[schemas.TransactionStatus] = None,
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    cursor: Optional[str] = None
 ):
-    query = db.query(models.Transaction)
+    query = db.query(models.Transaction).options(*loaders.TRANSACTION)
 
     # 筛选买家或卖家
     if is_buyer:
@@ -90,12 +92,76 @@ def get_user_transactions(
         query = query.filter(models.Transaction.status == status)
 
     # 按创建时间排序
-    return query.order_by(models.Transaction.created_at.desc()).offset(skip).limit(limit).all()
+    return pagination.paginate(
+        query, [models.Transaction.created_at, models.Transaction.id], skip=skip, limit=limit, cursor=cursor
+    )
+
+# 导出交易的字段
+EXPORT_TRANSACTION_COLUMNS = [
+    models.Transaction.id,
+    models.Transaction.item_id,
+    models.Transaction.buyer_id,
+    models.Transaction.seller_id,
+    models.Transaction.status,
+    models.Transaction.meeting_time,
+    models.Transaction.meeting_location,
+    models.Transaction.created_at,
+    models.Transaction.updated_at,
+]
+
+# 构造导出用户交易的查询（筛选条件与买入/卖出交易列表一致）
+def export_user_transactions_query(
+    db: Session,
+    user_id: int,
+    is_buyer: bool = True,
+    status: Optional[schemas.TransactionStatus] = None
+):
+    query = db.query(*EXPORT_TRANSACTION_COLUMNS)
+    if is_buyer:
+        query = query.filter(models.Transaction.buyer_id == user_id)
+    else:
+        query = query.filter(models.Transaction.seller_id == user_id)
+    if status:
+        query = query.filter(models.Transaction.status == status)
+    return query.order_by(models.Transaction.created_at.desc(), models.Transaction.id.desc())
 
 # 获取交易详情
 def get_transaction(db: Session, transaction_id: int):
     # 根据ID获取交易详情
-    return db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
+    return db.query(models.Transaction).options(*loaders.TRANSACTION).filter(
+        models.Transaction.id == transaction_id
+    ).first()
+
+# 统计用户买入、卖出交易的各状态数量
+def count_user_transactions_by_status(db: Session, user_id: int):
+    """一次分组查询同时统计买入和卖出交易的各状态数量"""
+    role = case((models.Transaction.buyer_id == user_id, "buy"), else_="sell").label("role")
+    rows = db.query(role, models.Transaction.status, func.count()).filter(
+        or_(models.Transaction.buyer_id == user_id, models.Transaction.seller_id == user_id)
+    ).group_by(role, models.Transaction.status).all()
+
+    counts = {
+        "buy": {transaction_status.value: 0 for transaction_status in schemas.TransactionStatus},
+        "sell": {transaction_status.value: 0 for transaction_status in schemas.TransactionStatus}
+    }
+    for row_role, transaction_status, count in rows:
+        counts[row_role][schemas.TransactionStatus(transaction_status).value] = count
+    return counts
+
+# 获取用户的交易汇总（买入、卖出列表及各状态数量）
+def get_user_transaction_summary(
+    db: Session,
+    user_id: int,
+    status: Optional[schemas.TransactionStatus] = None,
+    limit: int = 20
+):
+    counts = count_user_transactions_by_status(db, user_id=user_id)
+    return {
+        "buy": get_user_transactions(db, user_id=user_id, is_buyer=True, status=status, limit=limit),
+        "sell": get_user_transactions(db, user_id=user_id, is_buyer=False, status=status, limit=limit),
+        "buy_status_counts": counts["buy"],
+        "sell_status_counts": counts["sell"]
+    }
 
 # 更新交易状态
 def update_transaction(
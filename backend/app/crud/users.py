@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
-from .. import models, schemas
+from .. import models, schemas, cache
 from ..utils import get_password_hash, verify_password
 
 # 创建用户
@@ -80,6 +80,8 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # 列表页中的所有者信息
+    cache.invalidate_user(user_id)
 
     return db_user
 
@@ -101,5 +103,6 @@ def update_credit_score(db: Session, user_id: int, score_change: int):
 
     db.commit()
     db.refresh(db_user)
+    cache.invalidate_user(user_id)
 
     return db_user
\ No newline at end of file
@@ -66,4 +66,6 @@ BASE_DIR = Path(__file__).parent.parent
 # 定义图片存储目录（绝对路径，避免相对路径混乱）
 IMAGE_DIR = BASE_DIR / "static" / "images"
 # 确保目录存在（不存在则自动创建，包括多级目录）
-IMAGE_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+# 图片的公开访问地址前缀，部署时可配置为反向代理或 CDN 的地址
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "http://localhost:8000/static/images").rstrip("/")
\ No newline at end of file
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from . import renditions, storage
+from .dependencies import IMAGE_DIR
+
+# 单张图片的大小上限（字节）
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+# multipart 表单除文件内容外的开销（分隔符、头部）上限
+MAX_FORM_OVERHEAD = 16 * 1024
+# 上传表单中文件字段的名称
+UPLOAD_FIELD = "file"
+# 判断文件类型需要的文件头长度
+SIGNATURE_SIZE = 12
+
+
+# 根据文件头（magic bytes）判断图片类型，返回扩展名
+def detect_image_type(header: bytes) -> Optional[str]:
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class _UploadReceiver:
+    """
+        增量解析 multipart 请求体，只收集文件字段的内容
+
+        解析器的回调是同步的，收到的文件数据先放在 pending 中，
+        由调用方在每个请求体分块解析完后写入磁盘，内存中最多保留一个分块的数据。
+    """
+
+    def __init__(self, boundary: bytes):
+        self.pending = bytearray()
+        self.size = 0
+        self.found = False
+        self.finished = False
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._in_file = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            _, options = parse_options_header(self._header_value)
+            name = options.get(b"name", b"").decode("latin-1")
+            # 只接收第一个文件字段，忽略其他字段
+            if name == UPLOAD_FIELD and b"filename" in options and not self.found:
+                self._in_file = True
+                self.found = True
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size += end - start
+            if self.size <= MAX_IMAGE_SIZE:
+                self.pending += data[start:end]
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.finished = True
+
+
+def _too_large():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"图片大小不能超过{MAX_IMAGE_SIZE // (1024 * 1024)}MB"
+    )
+
+
+def _write_chunk(file, hasher, data: bytes):
+    file.write(data)
+    hasher.update(data)
+
+
+def _remove(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# 流式保存上传的图片
+async def save_upload(request: Request) -> str:
+    """
+        将 multipart 请求中的图片流式写入图片目录，返回保存的文件名
+
+        - 边接收边写入临时文件，不把整个文件读入内存；文件写入在线程池中执行，不阻塞事件循环
+        - 接收过程中超过大小上限立即中止（413）
+        - 按文件头判断图片类型（JPEG、PNG、GIF、WebP），不信任客户端提供的 Content-Type 和扩展名
+        - 按内容的 SHA-256 存储到分片目录（见 storage 模块），相同内容的图片只保存一份
+        - 写完后重命名为正式文件名，其他请求不会读到写了一半的文件
+        - 在进程池中生成缩放图（缩略图、中图，WebP 及原格式）
+
+        异常：
+        - 400 Bad Request: 不是 multipart 请求、缺少文件、不是支持的图片格式或图片无法解析
+        - 413 Request Entity Too Large: 图片超过大小上限
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="请使用 multipart/form-data 上传图片")
+
+    # 声明的请求体长度已超出上限时直接拒绝，不接收请求体
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_SIZE + MAX_FORM_OVERHEAD:
+        raise _too_large()
+
+    receiver = _UploadReceiver(boundary)
+    temp_path = IMAGE_DIR / f".upload_{uuid.uuid4().hex}.part"
+    file = await run_in_threadpool(open, temp_path, "wb")
+    hasher = hashlib.sha256()
+    file_ext = None
+    try:
+        async for chunk in request.stream():
+            try:
+                receiver.parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=400, detail="上传内容格式不正确")
+            if receiver.size > MAX_IMAGE_SIZE:
+                raise _too_large()
+
+            # 收到足够的文件头后检查图片类型
+            if file_ext is None and (len(receiver.pending) >= SIGNATURE_SIZE or receiver.finished):
+                if receiver.size:
+                    file_ext = detect_image_type(bytes(receiver.pending[:SIGNATURE_SIZE]))
+                    if file_ext is None:
+                        raise HTTPException(status_code=400, detail="只允许上传 JPEG、PNG、GIF、WebP 格式的图片")
+
+            if file_ext is not None and receiver.pending:
+                await run_in_threadpool(_write_chunk, file, hasher, bytes(receiver.pending))
+                receiver.pending.clear()
+        receiver.parser.finalize()
+
+        if not receiver.found or not receiver.finished or file_ext is None:
+            raise HTTPException(status_code=400, detail="请选择要上传的图片")
+
+        await run_in_threadpool(file.close)
+        blob_hash = hasher.hexdigest()
+        file_name = storage.blob_name(blob_hash, file_ext)
+        path = IMAGE_DIR / file_name
+
+        # 先登记记录（已存在时刷新回收保留期，引用数在物品保存图片时增加），再检查文件：
+        # 与回收同时进行时，回收要么看到这里的记录而保留文件，要么已移走文件、这里重新写入
+        await run_in_threadpool(storage.register_blob, blob_hash, file_ext, receiver.size)
+        existed = await run_in_threadpool(path.exists)
+        if existed:
+            # 相同内容的图片已存在，丢弃本次上传的文件
+            await run_in_threadpool(_remove, temp_path)
+        else:
+            await run_in_threadpool(path.parent.mkdir, parents=True, exist_ok=True)
+            await run_in_threadpool(os.replace, temp_path, path)
+    except BaseException:
+        # 请求被取消时不能再等待线程池，直接在当前线程清理临时文件
+        file.close()
+        _remove(temp_path)
+        raise
+
+    # 文件头合法但内容无法解码的图片不保留（记录的引用数为 0，由回收任务删除）
+    if not existed or await run_in_threadpool(renditions.missing_renditions, path.parent, path.name):
+        try:
+            await renditions.render_async(path)
+        except Exception:
+            for name in [path.name] + renditions.rendition_files(path.name):
+                await run_in_threadpool(_remove, path.parent / name)
+            raise HTTPException(status_code=400, detail="图片已损坏或尺寸过大，无法处理")
+
+    return file_name
@@ -0,0 +1,42 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import models
+
+# 关联加载策略
+# 响应模型中嵌套的关联对象（所有者、图片、分类等）默认是懒加载的，
+# 序列化一页数据时会为每一行额外发出查询（N+1）。这里按响应模型预先定义加载方式：
+# - 多对一关联（所有者、分类）用 JOIN 随主查询一起取回
+# - 一对多关联（图片）用 SELECT ... WHERE id IN (...) 一次批量取回
+# 这样无论一页有多少条数据，查询次数都是固定的。
+
+# 物品简略信息（ItemBriefResponse）：所有者 + 图片
+ITEM_BRIEF = (
+    joinedload(models.Item.owner),
+    selectinload(models.Item.images),
+)
+
+# 物品详细信息（ItemDetailResponse）：在简略信息基础上加分类
+ITEM_DETAIL = ITEM_BRIEF + (
+    joinedload(models.Item.category),
+)
+
+# 收藏（FavoriteResponse）：收藏的物品及其简略信息
+FAVORITE = (
+    selectinload(models.Favorite.item).options(*ITEM_BRIEF),
+)
+
+# 聊天会话（ConversationResponse）：物品及其简略信息、买家、卖家、最后一条消息
+CONVERSATION = (
+    selectinload(models.Conversation.item).options(*ITEM_BRIEF),
+    joinedload(models.Conversation.buyer),
+    joinedload(models.Conversation.seller),
+    joinedload(models.Conversation.last_message),
+)
+
+# 交易（TransactionResponse）：物品及其简略信息、买家、卖家、评价及评价者
+TRANSACTION = (
+    selectinload(models.Transaction.item).options(*ITEM_BRIEF),
+    joinedload(models.Transaction.buyer),
+    joinedload(models.Transaction.seller),
+    selectinload(models.Transaction.reviews).joinedload(models.Review.reviewer),
+)
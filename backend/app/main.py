@@ -1,13 +1,22 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+import asyncio
+import logging
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from pathlib import Path
-from .database import engine, Base
-from .api import users, categories, items, chats, transactions, reviews, favorites
+from .database import engine
+from .migrations import run_migrations
+from .pagination import NEXT_CURSOR_HEADER
+from .dependencies import IMAGE_DIR, get_current_user
+from .static_images import ImageStaticFiles
+from .chat_writer import chat_writer
+from . import cache, counters, popularity, recommend, suggest, renditions, storage
+from .api import users, categories, items, chats, transactions, reviews, favorites, exports
 
-# 创建数据库
-Base.metadata.create_all(bind=engine)
+# 执行数据库迁移（创建数据表、索引等）
+run_migrations(engine)
 
 BASE_DIR = Path(__file__).parent.parent
 
@@ -18,6 +27,8 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 图片：ETag、长期缓存、Range 请求（需在 /static 之前挂载）
+app.mount("/static/images", ImageStaticFiles(directory=IMAGE_DIR), name="images")
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 
 # 配置CORS
@@ -26,7 +37,8 @@ app.add_middleware(
     allow_origins=["http://localhost:8173"],  # Vue前端默认地址
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER]  # 允许前端读取分页游标
 )
 
 # 注册路由
@@ -37,8 +49,66 @@ app.include_router(chats.router, prefix="/api/chats", tags=["聊天"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["交易"])
 app.include_router(reviews.router, prefix="/api/reviews", tags=["评价"])
 app.include_router(favorites.router, prefix="/api/favorites", tags=["收藏"])
+app.include_router(exports.router, prefix="/api/exports", tags=["导出"])
+
+logger = logging.getLogger(__name__)
+
+# 在线程中周期执行同步任务（数据库操作不阻塞事件循环）
+async def _run_periodically(interval: float, func, delay: Optional[float] = None):
+    await asyncio.sleep(interval if delay is None else delay)
+    while True:
+        try:
+            await asyncio.to_thread(func)
+        except Exception:
+            logger.exception("定时任务 %s 执行失败", func.__name__)
+        await asyncio.sleep(interval)
+
+_background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # 连接聊天消息代理
+    await chats.manager.start()
+    # 浏览数写回数据库；热门榜定时刷新；相似物品、搜索联想索引启动时构建并定时全量重建；定时回收无引用的图片
+    _background_tasks.append(asyncio.create_task(
+        _run_periodically(counters.FLUSH_INTERVAL, counters.flush_counters)
+    ))
+    _background_tasks.append(asyncio.create_task(
+        _run_periodically(popularity.REFRESH_INTERVAL, popularity.refresh_hot_items)
+    ))
+    _background_tasks.append(asyncio.create_task(
+        _run_periodically(recommend.REBUILD_INTERVAL, recommend.rebuild_similar_items, delay=0)
+    ))
+    _background_tasks.append(asyncio.create_task(
+        _run_periodically(suggest.REBUILD_INTERVAL, suggest.rebuild_suggestions, delay=0)
+    ))
+    _background_tasks.append(asyncio.create_task(
+        _run_periodically(storage.GC_INTERVAL, storage.run_garbage_collection)
+    ))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    # 关闭前写入剩余的计数
+    await asyncio.to_thread(counters.flush_counters)
+    await asyncio.to_thread(renditions.shutdown_pool)
+    # 写入队列中剩余的聊天消息
+    await chat_writer.stop()
+    await chats.manager.stop()
 
 # 根路径
 @app.get("/")
 def read_root():
-    return {"message": "欢迎使用校园闲置物品共享与置换平台API"}
\ No newline at end of file
+    return {"message": "欢迎使用校园闲置物品共享与置换平台API"}
+
+# 缓存统计（命中、未命中、淘汰等计数，需要登录）
+@app.get("/api/cache/stats", dependencies=[Depends(get_current_user)])
+def read_cache_stats():
+    stats = cache.get_stats()
+    stats["item_counters"] = counters.item_counters.stats()
+    stats["similar_items"] = recommend.similar_items.stats()
+    stats["chat_writer"] = chat_writer.stats()
+    stats["chat_connections"] = chats.manager.stats()
+    return stats
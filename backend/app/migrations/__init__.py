@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+from sqlalchemy.engine import Engine
+
+from . import v0001_baseline, v0002_hot_query_indexes, v0003_item_counters, v0004_item_sort_indexes, v0005_image_blobs, \
+    v0006_item_image_position, v0007_conversations, v0008_conversation_list_indexes, \
+    v0009_recount_favorites, v0010_item_image_renditions
+
+logger = logging.getLogger(__name__)
+
+# 按顺序排列的迁移脚本，新增迁移时追加到末尾
+# 每个迁移模块提供 VERSION、DESCRIPTION 和 upgrade(conn)
+MIGRATIONS = [
+    v0001_baseline,
+    v0002_hot_query_indexes,
+    v0003_item_counters,
+    v0004_item_sort_indexes,
+    v0005_image_blobs,
+    v0006_item_image_position,
+    v0007_conversations,
+    v0008_conversation_list_indexes,
+    v0009_recount_favorites,
+    v0010_item_image_renditions,
+]
+
+# 记录已执行迁移的版本表
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String(32), primary_key=True),
+    Column("description", String(200), nullable=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# MySQL 下用命名锁保证多个进程同时启动时只有一个在执行迁移
+_LOCK_NAME = "campus_sharing_migrations"
+_LOCK_TIMEOUT = 60
+
+
+# 执行所有未执行的迁移
+def run_migrations(engine: Engine) -> list:
+    """按版本顺序执行尚未执行的迁移，返回本次执行的版本列表"""
+    applied_now = []
+    with engine.connect() as lock_conn:
+        use_lock = engine.dialect.name == "mysql"
+        if use_lock:
+            # GET_LOCK 超时返回 0、出错返回 NULL，未取得锁时不能执行迁移
+            acquired = lock_conn.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"), {"name": _LOCK_NAME, "timeout": _LOCK_TIMEOUT}
+            ).scalar()
+            if acquired != 1:
+                raise RuntimeError(f"{_LOCK_TIMEOUT} 秒内未能取得数据库迁移锁 {_LOCK_NAME}，可能有其他进程正在执行迁移")
+        try:
+            with engine.begin() as conn:
+                schema_migrations.create(conn, checkfirst=True)
+                applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+            for migration in MIGRATIONS:
+                if migration.VERSION in applied:
+                    continue
+                logger.info("执行数据库迁移 %s: %s", migration.VERSION, migration.DESCRIPTION)
+                with engine.begin() as conn:
+                    migration.upgrade(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=migration.VERSION,
+                        description=migration.DESCRIPTION,
+                        applied_at=datetime.utcnow()
+                    ))
+                applied_now.append(migration.VERSION)
+        finally:
+            if use_lock:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _LOCK_NAME})
+    return applied_now
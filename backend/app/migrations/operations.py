@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Index, MetaData, Table, inspect
+from sqlalchemy.engine import Connection
+
+# 迁移操作
+# 所有操作都是幂等的：对象已存在时跳过。这样既能用于全新数据库，
+# 也能用于此前由 Base.metadata.create_all 创建的旧数据库。
+# 迁移中的表、列、索引定义都写在迁移模块内（不引用 models），之后修改模型不会改变已有迁移的行为。
+
+
+def index(table_name: str, name: str, *column_names: str, unique: bool = False) -> Index:
+    """定义一个索引（只需要表名和列名，不依赖 models 中的表定义）"""
+    table = Table(table_name, MetaData(), *(Column(column_name) for column_name in column_names))
+    return Index(name, *(table.c[column_name] for column_name in column_names), unique=unique)
+
+
+def create_table(conn: Connection, table: Table):
+    """创建数据表（已存在则跳过）"""
+    table.create(conn, checkfirst=True)
+
+
+def create_index(conn: Connection, index: Index):
+    """创建索引（已存在则跳过）"""
+    existing = {existing_index["name"] for existing_index in inspect(conn).get_indexes(index.table.name)}
+    if index.name not in existing:
+        index.create(conn)
+
+
+def add_column(conn: Connection, table_name: str, column: Column):
+    """为已有数据表添加列（已存在则跳过）"""
+    existing = {existing_column["name"] for existing_column in inspect(conn).get_columns(table_name)}
+    if column.name in existing:
+        return
+
+    preparer = conn.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if isinstance(default, str):
+            default = "'" + default.replace("'", "''") + "'"
+        else:
+            default = str(default.compile(dialect=conn.dialect))
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.exec_driver_sql(ddl)
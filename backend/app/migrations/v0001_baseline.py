@@ -0,0 +1,132 @@
+from sqlalchemy import Column, DateTime, DECIMAL, Enum, ForeignKey, Index, Integer, MetaData, String, Table, Text, func
+from sqlalchemy.engine import Connection
+
+from .operations import create_table
+
+VERSION = "0001"
+DESCRIPTION = "初始数据表（原 Base.metadata.create_all 创建的数据表）"
+
+# 引入迁移之前 create_all 创建的数据表（之后新增的列、索引由后续迁移添加）
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String(50), unique=True, index=True, nullable=False),
+    Column("email", String(100), unique=True, nullable=False, index=True),
+    Column("password", String(100), nullable=False),
+    Column("phone", String(20), nullable=True),
+    Column("avatar", String(255), nullable=True),
+    Column("credit_score", Integer),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+categories = Table(
+    "categories", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(50), nullable=False),
+    Column("description", String(200), nullable=True),
+)
+
+items = Table(
+    "items", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(100), nullable=False),
+    Column("description", Text, nullable=True),
+    Column("price", DECIMAL(10, 2), nullable=True),
+    Column("status", Enum("available", "trading", "sold", name="itemstatus")),
+    Column("location", String(100), nullable=True),
+    Column("category_id", Integer, ForeignKey("categories.id")),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_items_created_at_id", "created_at", "id"),
+    Index("ix_items_user_id_created_at_id", "user_id", "created_at", "id"),
+)
+
+item_images = Table(
+    "item_images", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("item_id", Integer, ForeignKey("items.id")),
+    Column("image_url", String(255), nullable=False),
+)
+
+chats = Table(
+    "chats", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("item_id", Integer, ForeignKey("items.id")),
+    Column("sender_id", Integer, ForeignKey("users.id")),
+    Column("receiver_id", Integer, ForeignKey("users.id")),
+    Column("message", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_chats_item_id_created_at_id", "item_id", "created_at", "id"),
+)
+
+transactions = Table(
+    "transactions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("item_id", Integer, ForeignKey("items.id")),
+    Column("buyer_id", Integer, ForeignKey("users.id")),
+    Column("seller_id", Integer, ForeignKey("users.id")),
+    Column("status", Enum("pending", "confirmed", "completed", "cancelled", name="transactionstatus")),
+    Column("meeting_time", DateTime, nullable=True),
+    Column("meeting_location", String(100), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_transactions_buyer_id_created_at_id", "buyer_id", "created_at", "id"),
+    Index("ix_transactions_seller_id_created_at_id", "seller_id", "created_at", "id"),
+)
+
+reviews = Table(
+    "reviews", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("transaction_id", Integer, ForeignKey("transactions.id")),
+    Column("reviewer_id", Integer, ForeignKey("users.id")),
+    Column("reviewee_id", Integer, ForeignKey("users.id")),
+    Column("rating", Integer, nullable=False),
+    Column("comment", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_reviews_reviewee_id_created_at_id", "reviewee_id", "created_at", "id"),
+)
+
+favorites = Table(
+    "favorites", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("item_id", Integer, ForeignKey("items.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_favorites_user_id_created_at_id", "user_id", "created_at", "id"),
+)
+
+item_search_tokens = Table(
+    "item_search_tokens", metadata,
+    Column("token", String(32), primary_key=True),
+    Column("item_id", Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True, index=True),
+    Column("tf", Integer, nullable=False),
+)
+
+item_search_docs = Table(
+    "item_search_docs", metadata,
+    Column("item_id", Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True),
+    Column("length", Integer, nullable=False),
+)
+
+# 按外键依赖顺序排列
+TABLES = [
+    users,
+    categories,
+    items,
+    item_images,
+    chats,
+    transactions,
+    reviews,
+    favorites,
+    item_search_tokens,
+    item_search_docs,
+]
+
+
+def upgrade(conn: Connection):
+    for table in TABLES:
+        create_table(conn, table)
@@ -0,0 +1,33 @@
+from sqlalchemy.engine import Connection
+
+from .operations import create_index, index
+
+VERSION = "0002"
+DESCRIPTION = "列表分页与常用筛选条件的组合索引"
+
+# 外键列的索引在 MySQL 中会自动创建，这里显式声明，保证其他数据库上同样可用
+INDEXES = [
+    index("item_images", "ix_item_images_item_id", "item_id"),
+    index("items", "ix_items_created_at_id", "created_at", "id"),
+    index("items", "ix_items_user_id_created_at_id", "user_id", "created_at", "id"),
+    index("items", "ix_items_status_category_id_created_at_id", "status", "category_id", "created_at", "id"),
+    index("items", "ix_items_status_created_at_id", "status", "created_at", "id"),
+    index("items", "ix_items_category_id_created_at_id", "category_id", "created_at", "id"),
+    index("chats", "ix_chats_item_id_created_at_id", "item_id", "created_at", "id"),
+    index("chats", "ix_chats_sender_id", "sender_id"),
+    index("chats", "ix_chats_receiver_id", "receiver_id"),
+    index("transactions", "ix_transactions_buyer_id_created_at_id", "buyer_id", "created_at", "id"),
+    index("transactions", "ix_transactions_seller_id_created_at_id", "seller_id", "created_at", "id"),
+    index("transactions", "ix_transactions_buyer_id_status_created_at_id", "buyer_id", "status", "created_at", "id"),
+    index("transactions", "ix_transactions_seller_id_status_created_at_id", "seller_id", "status", "created_at", "id"),
+    index("transactions", "ix_transactions_item_id", "item_id"),
+    index("favorites", "ix_favorites_user_id_created_at_id", "user_id", "created_at", "id"),
+    index("favorites", "ix_favorites_user_id_item_id", "user_id", "item_id"),
+    index("reviews", "ix_reviews_reviewee_id_created_at_id", "reviewee_id", "created_at", "id"),
+    index("reviews", "ix_reviews_transaction_id", "transaction_id"),
+]
+
+
+def upgrade(conn: Connection):
+    for definition in INDEXES:
+        create_index(conn, definition)
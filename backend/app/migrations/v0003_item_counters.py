@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, text
+from sqlalchemy.engine import Connection
+
+from .operations import add_column, create_index, index
+
+VERSION = "0003"
+DESCRIPTION = "物品浏览数、收藏数计数列及热门榜统计索引"
+
+
+def upgrade(conn: Connection):
+    add_column(conn, "items", Column("view_count", Integer, nullable=False, server_default="0"))
+    add_column(conn, "items", Column("favorite_count", Integer, nullable=False, server_default="0"))
+
+    # 用已有的收藏记录回填收藏数
+    conn.execute(text(
+        "UPDATE items SET favorite_count = "
+        "(SELECT COUNT(*) FROM favorites WHERE favorites.item_id = items.id)"
+    ))
+
+    # 热门榜按时间窗口统计收藏和聊天
+    create_index(conn, index("favorites", "ix_favorites_created_at", "created_at"))
+    create_index(conn, index("chats", "ix_chats_created_at", "created_at"))
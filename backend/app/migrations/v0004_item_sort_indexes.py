@@ -0,0 +1,22 @@
+from sqlalchemy.engine import Connection
+
+from .operations import create_index, index
+
+VERSION = "0004"
+DESCRIPTION = "物品按价格、收藏数排序的索引"
+
+INDEXES = [
+    index("items", "ix_items_price_id", "price", "id"),
+    index("items", "ix_items_status_category_id_price_id", "status", "category_id", "price", "id"),
+    index("items", "ix_items_status_price_id", "status", "price", "id"),
+    index("items", "ix_items_category_id_price_id", "category_id", "price", "id"),
+    index("items", "ix_items_favorite_count_id", "favorite_count", "id"),
+    index("items", "ix_items_status_category_id_favorite_count_id", "status", "category_id", "favorite_count", "id"),
+    index("items", "ix_items_status_favorite_count_id", "status", "favorite_count", "id"),
+    index("items", "ix_items_category_id_favorite_count_id", "category_id", "favorite_count", "id"),
+]
+
+
+def upgrade(conn: Connection):
+    for definition in INDEXES:
+        create_index(conn, definition)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+from .operations import add_column, create_index, create_table, index
+
+VERSION = "0005"
+DESCRIPTION = "按内容哈希去重的图片存储及引用计数"
+
+metadata = MetaData()
+
+image_blobs = Table(
+    "image_blobs", metadata,
+    Column("hash", String(64), primary_key=True),
+    Column("ext", String(10), nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("ref_count", Integer, nullable=False, server_default="0"),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_image_blobs_ref_count_updated_at", "ref_count", "updated_at"),
+)
+
+
+def upgrade(conn: Connection):
+    create_table(conn, image_blobs)
+
+    add_column(conn, "item_images", Column("blob_hash", String(64), nullable=True))
+    create_index(conn, index("item_images", "ix_item_images_blob_hash", "blob_hash"))
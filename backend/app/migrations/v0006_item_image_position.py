@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer
+from sqlalchemy.engine import Connection
+
+from .operations import add_column, create_index, index
+
+VERSION = "0006"
+DESCRIPTION = "物品图片的展示顺序"
+
+
+def upgrade(conn: Connection):
+    # 已有的图片 position 均为 0，读取时按 (position, id) 排序，与原来的顺序一致
+    add_column(conn, "item_images", Column("position", Integer, nullable=False, server_default="0"))
+    create_index(conn, index("item_images", "ix_item_images_item_id_position", "item_id", "position"))
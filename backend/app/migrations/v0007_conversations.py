@@ -0,0 +1,65 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, Table, case, column, func, select, table
+from sqlalchemy.engine import Connection
+
+from .operations import create_table
+
+VERSION = "0007"
+DESCRIPTION = "聊天会话冗余表（最后一条消息、未读数）"
+
+metadata = MetaData()
+
+# 外键引用的表（只声明主键，create_all 不会创建它们）
+Table("items", metadata, Column("id", Integer, primary_key=True))
+Table("users", metadata, Column("id", Integer, primary_key=True))
+Table("chats", metadata, Column("id", Integer, primary_key=True))
+
+conversations = Table(
+    "conversations", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("item_id", Integer, ForeignKey("items.id"), nullable=False),
+    Column("buyer_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("seller_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("last_message_id", Integer, ForeignKey("chats.id"), nullable=True),
+    Column("last_message_at", DateTime(timezone=True), nullable=True),
+    Column("buyer_unread", Integer, nullable=False, server_default="0"),
+    Column("seller_unread", Integer, nullable=False, server_default="0"),
+    Column("buyer_last_read_id", Integer, nullable=True),
+    Column("seller_last_read_id", Integer, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_conversations_item_id_buyer_id_seller_id", "item_id", "buyer_id", "seller_id", unique=True),
+    Index("ix_conversations_buyer_id_last_message_at_id", "buyer_id", "last_message_at", "id"),
+    Index("ix_conversations_seller_id_last_message_at_id", "seller_id", "last_message_at", "id"),
+    Index("ix_conversations_buyer_id_buyer_unread", "buyer_id", "buyer_unread"),
+    Index("ix_conversations_seller_id_seller_unread", "seller_id", "seller_unread"),
+)
+
+# 回填时读取的列
+chats = table("chats", column("id"), column("item_id"), column("sender_id"), column("receiver_id"), column("created_at"))
+items = table("items", column("id"), column("user_id"))
+
+
+def upgrade(conn: Connection):
+    create_table(conn, conversations)
+
+    # 用已有的聊天记录回填会话：物品所有者为卖家，另一方为买家；历史消息视为已读
+    if conn.execute(select(conversations.c.id).limit(1)).first() is not None:
+        return
+    buyer_id = case((chats.c.sender_id == items.c.user_id, chats.c.receiver_id), else_=chats.c.sender_id)
+    last_id = func.max(chats.c.id)
+    grouped = select(
+        chats.c.item_id,
+        buyer_id.label("buyer_id"),
+        items.c.user_id.label("seller_id"),
+        last_id.label("last_message_id"),
+        func.max(chats.c.created_at).label("last_message_at"),
+        last_id.label("buyer_last_read_id"),
+        last_id.label("seller_last_read_id"),
+    ).select_from(
+        chats.join(items, items.c.id == chats.c.item_id)
+    ).group_by(chats.c.item_id, buyer_id, items.c.user_id)
+
+    conn.execute(conversations.insert().from_select(
+        ["item_id", "buyer_id", "seller_id", "last_message_id", "last_message_at",
+         "buyer_last_read_id", "seller_last_read_id"],
+        grouped
+    ))
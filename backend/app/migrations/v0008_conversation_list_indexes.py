@@ -0,0 +1,13 @@
+from sqlalchemy.engine import Connection
+
+from .operations import create_index, index
+
+VERSION = "0008"
+DESCRIPTION = "会话列表按买家、卖家分别键集分页的索引"
+
+
+def upgrade(conn: Connection):
+    # 会话列表拆分为“作为买家”“作为卖家”两段范围扫描，各自依赖一个索引
+    # （新建的 conversations 表已包含，这里为在此之前创建的表补建）
+    create_index(conn, index("conversations", "ix_conversations_buyer_id_last_message_at_id", "buyer_id", "last_message_at", "id"))
+    create_index(conn, index("conversations", "ix_conversations_seller_id_last_message_at_id", "seller_id", "last_message_at", "id"))
@@ -0,0 +1,12 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = "0009"
+DESCRIPTION = "按收藏记录重新统计物品收藏数（此前由进程内缓冲写回，可能存在偏差）"
+
+
+def upgrade(conn: Connection):
+    conn.execute(text(
+        "UPDATE items SET favorite_count = "
+        "(SELECT COUNT(*) FROM favorites WHERE favorites.item_id = items.id)"
+    ))
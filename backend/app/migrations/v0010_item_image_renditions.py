@@ -0,0 +1,13 @@
+from sqlalchemy import Boolean, Column, text
+from sqlalchemy.engine import Connection
+
+from .operations import add_column
+
+VERSION = "0010"
+DESCRIPTION = "物品图片是否已生成缩放图（旧的非去重图片由 generate-renditions 回填）"
+
+
+def upgrade(conn: Connection):
+    add_column(conn, "item_images", Column("has_renditions", Boolean, nullable=False, server_default="0"))
+    # 按内容寻址的图片在上传、导入时已生成缩放图
+    conn.execute(text("UPDATE item_images SET has_renditions = 1 WHERE blob_hash IS NOT NULL"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, Enum, DateTime, DECIMAL
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, Enum, DateTime, DECIMAL, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -61,6 +61,24 @@ class Category(Base):
 # 物品模型
 class Item(Base):
     __tablename__="items"
+    __table_args__ = (
+        # 分页索引：按 (created_at, id) 键集分页
+        Index("ix_items_created_at_id", "created_at", "id"),
+        Index("ix_items_user_id_created_at_id", "user_id", "created_at", "id"),
+        # 列表筛选索引：按状态、分类筛选后按时间倒序
+        Index("ix_items_status_category_id_created_at_id", "status", "category_id", "created_at", "id"),
+        Index("ix_items_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_items_category_id_created_at_id", "category_id", "created_at", "id"),
+        # 排序索引：按价格、收藏数排序（与上面按时间排序的筛选组合一一对应）
+        Index("ix_items_price_id", "price", "id"),
+        Index("ix_items_status_category_id_price_id", "status", "category_id", "price", "id"),
+        Index("ix_items_status_price_id", "status", "price", "id"),
+        Index("ix_items_category_id_price_id", "category_id", "price", "id"),
+        Index("ix_items_favorite_count_id", "favorite_count", "id"),
+        Index("ix_items_status_category_id_favorite_count_id", "status", "category_id", "favorite_count", "id"),
+        Index("ix_items_status_favorite_count_id", "status", "favorite_count", "id"),
+        Index("ix_items_category_id_favorite_count_id", "category_id", "favorite_count", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(100), nullable=False)
@@ -70,6 +88,9 @@ class Item(Base):
     location = Column(String(100), nullable=True)
     category_id = Column(Integer, ForeignKey("categories.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
+    # 浏览数由 counters 模块在内存中累积后定时批量写入；收藏数在收藏、取消收藏的事务中更新
+    view_count = Column(Integer, nullable=False, default=0, server_default="0")
+    favorite_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
@@ -77,10 +98,15 @@ class Item(Base):
     category = relationship("Category", back_populates="items")
     # 关系：物品的所有者
     owner = relationship("User", back_populates="items")
-    # 关系：物品的图片
-    images = relationship("ItemImage", back_populates="item", cascade="all, delete-orphan")
+    # 关系：物品的图片（按展示顺序）
+    images = relationship(
+        "ItemImage", back_populates="item", cascade="all, delete-orphan",
+        order_by="(ItemImage.position, ItemImage.id)"
+    )
     # 关系：关于该物品的聊天
     chats = relationship("Chat", back_populates="item")
+    # 关系：关于该物品的聊天会话
+    conversations = relationship("Conversation", back_populates="item", cascade="all, delete-orphan")
     # 关系：该物品的交易
     transactions = relationship("Transaction", back_populates="item")
     # 关系：收藏该物品的用户
@@ -89,17 +115,51 @@ class Item(Base):
 # 物品图片模型
 class ItemImage(Base):
     __tablename__ = "item_images"
+    __table_args__ = (
+        # 按展示顺序读取物品的图片
+        Index("ix_item_images_item_id_position", "item_id", "position"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("items.id"))
+    item_id = Column(Integer, ForeignKey("items.id"), index=True)
     image_url = Column(String(255), nullable=False)
+    # 引用的图片文件（image_blobs.hash），旧的非去重存储的图片为空
+    blob_hash = Column(String(64), nullable=True, index=True)
+    # 展示顺序（从 0 开始）；旧数据均为 0，按 id 排序
+    position = Column(Integer, nullable=False, default=0, server_default="0")
+    # 是否已生成缩放图（生成时写入，序列化时不再检查磁盘）
+    has_renditions = Column(Boolean, nullable=False, default=False, server_default="0")
 
     # 关系：图片所属物品
     item = relationship("Item", back_populates="images")
 
+# 图片文件模型（按内容哈希去重存储，记录被 item_images 引用的次数）
+class ImageBlob(Base):
+    __tablename__ = "image_blobs"
+    __table_args__ = (
+        # 垃圾回收：查找无引用且超过保留期的文件
+        Index("ix_image_blobs_ref_count_updated_at", "ref_count", "updated_at"),
+    )
+
+    hash = Column(String(64), primary_key=True)  # 文件内容的 SHA-256
+    ext = Column(String(10), nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)  # 最近一次上传或引用数变化的时间
+
 # 聊天模型
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # 分页索引：按物品查询聊天记录并按 (created_at, id) 键集分页
+        Index("ix_chats_item_id_created_at_id", "item_id", "created_at", "id"),
+        # 按发送者/接收者查询会话
+        Index("ix_chats_sender_id", "sender_id"),
+        Index("ix_chats_receiver_id", "receiver_id"),
+        # 热门榜：统计最近的聊天活动
+        Index("ix_chats_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     item_id = Column(Integer, ForeignKey("items.id"))
@@ -115,12 +175,55 @@ class Chat(Base):
     # 关系：接收者
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
 
+# 聊天会话模型（由 chats 派生的冗余表，发送消息时在同一事务中更新）
+class Conversation(Base):
+    __tablename__ = "conversations"
+    __table_args__ = (
+        # 每个物品的买家、卖家之间只有一个会话
+        Index("ix_conversations_item_id_buyer_id_seller_id", "item_id", "buyer_id", "seller_id", unique=True),
+        # 会话列表：按买家/卖家查询并按 (last_message_at, id) 键集分页
+        Index("ix_conversations_buyer_id_last_message_at_id", "buyer_id", "last_message_at", "id"),
+        Index("ix_conversations_seller_id_last_message_at_id", "seller_id", "last_message_at", "id"),
+        # 未读角标：按用户汇总未读数（覆盖索引，不回表）
+        Index("ix_conversations_buyer_id_buyer_unread", "buyer_id", "buyer_unread"),
+        Index("ix_conversations_seller_id_seller_unread", "seller_id", "seller_unread"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    buyer_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 向物品所有者发起咨询的用户
+    seller_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 物品所有者
+    last_message_id = Column(Integer, ForeignKey("chats.id"), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    # 各参与者的未读消息数和已读到的消息ID
+    buyer_unread = Column(Integer, nullable=False, default=0, server_default="0")
+    seller_unread = Column(Integer, nullable=False, default=0, server_default="0")
+    buyer_last_read_id = Column(Integer, nullable=True)
+    seller_last_read_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 关系：会话所属物品
+    item = relationship("Item", back_populates="conversations")
+    # 关系：买家、卖家
+    buyer = relationship("User", foreign_keys=[buyer_id])
+    seller = relationship("User", foreign_keys=[seller_id])
+    # 关系：最后一条消息
+    last_message = relationship("Chat", foreign_keys=[last_message_id])
+
 # 交易模型
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # 分页索引：按买家/卖家查询交易并按 (created_at, id) 键集分页
+        Index("ix_transactions_buyer_id_created_at_id", "buyer_id", "created_at", "id"),
+        Index("ix_transactions_seller_id_created_at_id", "seller_id", "created_at", "id"),
+        # 按交易状态筛选后按时间倒序
+        Index("ix_transactions_buyer_id_status_created_at_id", "buyer_id", "status", "created_at", "id"),
+        Index("ix_transactions_seller_id_status_created_at_id", "seller_id", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("items.id"))
+    item_id = Column(Integer, ForeignKey("items.id"), index=True)
     buyer_id = Column(Integer, ForeignKey("users.id"))
     seller_id = Column(Integer, ForeignKey("users.id"))
     status = Column(Enum(TransactionStatus), default=TransactionStatus.pending)
@@ -142,9 +245,13 @@ class Transaction(Base):
 # 评价模型
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # 分页索引：按被评价者查询评价并按 (created_at, id) 键集分页
+        Index("ix_reviews_reviewee_id_created_at_id", "reviewee_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    transaction_id = Column(Integer, ForeignKey("transactions.id"))
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), index=True)
     reviewer_id = Column(Integer, ForeignKey("users.id"))
     reviewee_id = Column(Integer, ForeignKey("users.id"))
     rating = Column(Integer, nullable=False)  # 1-5星
@@ -160,6 +267,14 @@ class Review(Base):
 # 收藏模型
 class Favorite(Base):
     __tablename__ = "favorites"
+    __table_args__ = (
+        # 分页索引：按用户查询收藏并按 (created_at, id) 键集分页
+        Index("ix_favorites_user_id_created_at_id", "user_id", "created_at", "id"),
+        # 检查是否已收藏
+        Index("ix_favorites_user_id_item_id", "user_id", "item_id"),
+        # 热门榜：统计最近的收藏活动
+        Index("ix_favorites_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -169,4 +284,19 @@ class Favorite(Base):
     # 关系：收藏的用户
     user = relationship("User", back_populates="favorites")
     # 关系：被收藏的物品
-    item = relationship("Item", back_populates="favorites")
\ No newline at end of file
+    item = relationship("Item", back_populates="favorites")
+
+# 搜索倒排索引 - 词项记录（词项 -> 物品）
+class ItemSearchToken(Base):
+    __tablename__ = "item_search_tokens"
+
+    token = Column(String(32), primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True, index=True)
+    tf = Column(Integer, nullable=False)  # 加权词频（标题中的词项权重更高）
+
+# 搜索倒排索引 - 文档统计（用于BM25的文档长度归一化）
+class ItemSearchDoc(Base):
+    __tablename__ = "item_search_docs"
+
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True)
+    length = Column(Integer, nullable=False)
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, false, or_
+from sqlalchemy.orm import Query
+
+# 下一页游标通过响应头返回，保持列表接口的响应体不变
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any):
+    if isinstance(value, datetime):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _decode_value(value: Any):
+    if isinstance(value, dict):
+        if "d" in value:
+            return datetime.fromisoformat(value["d"])
+        if "n" in value:
+            return Decimal(value["n"])
+        raise ValueError("unknown cursor value")
+    return value
+
+
+# 生成不透明的分页游标
+def encode_cursor(*values) -> str:
+    """将排序键（如 created_at, id）编码为不透明的游标字符串"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+# 解析分页游标
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+        解析游标，返回排序键列表
+
+        异常：
+        - 400 Bad Request: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("cursor size mismatch")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+def _after(column, value, descending: bool, nullable: bool):
+    """单列“严格位于 value 之后”的条件（NULL 按 MySQL 的规则排序：升序在最前，倒序在最后）"""
+    if not nullable:
+        return column < value if descending else column > value
+    if value is None:
+        return false() if descending else column.isnot(None)
+    if descending:
+        return or_(column < value, column.is_(None))
+    return column > value
+
+
+def _equals(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+# 构造“位于游标之后”的过滤条件
+def keyset_after(columns: Sequence, values: Sequence, descending: bool = True, nullable: Sequence = ()):
+    """
+        生成按 columns 字典序严格位于 values 之后的条件，
+        例如 (created_at, id) 倒序时为：
+        created_at < :c OR (created_at = :c AND id < :id)
+
+        nullable 中的列可能为 NULL（如价格），比较时按 NULL 的排序位置展开
+    """
+    nullable = {id(column) for column in nullable}
+    clauses = []
+    for index, (column, value) in enumerate(zip(columns, values)):
+        compare = _after(column, value, descending, id(column) in nullable)
+        equals = [_equals(prev_column, prev_value) for prev_column, prev_value in zip(columns[:index], values[:index])]
+        clauses.append(and_(*equals, compare))
+    return or_(*clauses)
+
+
+# 分页查询（游标优先，否则兼容 skip/limit）
+def paginate(
+    query: Query,
+    columns: Sequence,
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    nullable: Sequence = (),
+    cursor_prefix: Sequence = ()
+):
+    """
+        按 columns 排序分页
+
+        - 传入 cursor 时使用键集分页（WHERE (created_at, id) < 游标值），
+          借助索引直接定位，翻页深度不影响查询代价
+        - 未传入 cursor 时保持原有的 skip/limit 行为
+        - cursor_prefix 为游标中排序键之前的固定标记（如排序方式），不一致时视为无效游标
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(cursor_prefix) + len(columns))
+        if list(cursor_prefix) != values[:len(cursor_prefix)]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的分页游标"
+            )
+        query = query.filter(keyset_after(columns, values[len(cursor_prefix):], descending, nullable))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if not cursor and skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+# 偏移量游标（用于相关度排序等无法使用键集分页的场景）
+def cursor_offset(skip: int = 0, cursor: Optional[str] = None) -> int:
+    """游标中保存的是偏移量，未传入游标时使用 skip"""
+    if not cursor:
+        return skip
+    offset = decode_cursor(cursor, 1)[0]
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+    return offset
+
+
+def next_offset_cursor(rows: list, limit: int, offset: int) -> Optional[str]:
+    """本页已取满时返回指向下一页偏移量的游标"""
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(offset + len(rows))
+
+
+# 根据本页结果生成下一页游标
+def next_cursor(rows: list, limit: int, key: Callable = lambda row: (row.created_at, row.id)) -> Optional[str]:
+    """本页已取满时返回下一页游标，否则返回 None"""
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(*key(rows[-1]))
+
+
+# 将下一页游标写入响应头
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
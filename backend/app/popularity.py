@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .crud import items as items_crud
+
+# 热门榜刷新间隔（秒）
+REFRESH_INTERVAL = 60
+# 榜单保留的物品数
+HOT_SIZE = 100
+# 只统计最近一段时间内的收藏和聊天
+HOT_WINDOW_DAYS = 14
+# 热度半衰期：活动的权重每隔半衰期减半
+HOT_HALF_LIFE_DAYS = 3
+
+# 各类活动的权重
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 5.0
+CHAT_WEIGHT = 3.0
+
+
+def _decay(created_at: Optional[datetime], now: datetime) -> float:
+    if created_at is None:
+        return 0.0
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    age_days = max((now - created_at).total_seconds(), 0) / 86400
+    return 0.5 ** (age_days / HOT_HALF_LIFE_DAYS)
+
+
+# 计算物品热度
+def compute_scores(db: Session, now: Optional[datetime] = None) -> Dict[int, float]:
+    """
+        热度 = 浏览数 × 物品发布时间衰减 + Σ 收藏 × 收藏时间衰减 + Σ 聊天消息 × 消息时间衰减
+
+        浏览数只有累计值（没有逐次记录时间），按物品发布时间衰减；
+        收藏和聊天按各自发生的时间衰减，只统计最近 HOT_WINDOW_DAYS 天内的记录。
+    """
+    now = now or datetime.now()
+    since = now - timedelta(days=HOT_WINDOW_DAYS)
+    scores: Dict[int, float] = {}
+
+    viewed = db.query(models.Item.id, models.Item.view_count, models.Item.created_at).filter(
+        models.Item.status == models.ItemStatus.available,
+        models.Item.created_at >= since,
+        models.Item.view_count > 0
+    )
+    for item_id, view_count, created_at in viewed:
+        scores[item_id] = scores.get(item_id, 0.0) + VIEW_WEIGHT * view_count * _decay(created_at, now)
+
+    activities = (
+        (models.Favorite, FAVORITE_WEIGHT),
+        (models.Chat, CHAT_WEIGHT),
+    )
+    for model, weight in activities:
+        rows = db.query(model.item_id, model.created_at).filter(model.created_at >= since)
+        for item_id, created_at in rows:
+            scores[item_id] = scores.get(item_id, 0.0) + weight * _decay(created_at, now)
+
+    return scores
+
+
+class HotLeaderboard:
+    """
+        预先计算的热门物品榜
+
+        定时任务计算热度并把榜单序列化为响应数据保存在内存中，
+        GET /api/items/hot 直接返回内存中的榜单，不访问数据库。
+    """
+
+    def __init__(self, size: int = HOT_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self.refreshed_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshed_at is not None
+
+    def refresh(self, db: Session) -> int:
+        """重新计算榜单，返回上榜物品数"""
+        scores = compute_scores(db)
+        # 多取一些候选，排除已售出或下架的物品后仍能填满榜单
+        ranked = sorted(scores, key=lambda item_id: (-scores[item_id], -item_id))[:self.size * 2]
+        entries = [
+            schemas.ItemBriefResponse.model_validate(item).model_dump(mode="json")
+            for item in items_crud.get_items_by_ids(db, ranked)
+            if item.status == models.ItemStatus.available
+        ][:self.size]
+
+        with self._lock:
+            self._entries = entries
+            self.refreshed_at = time.time()
+        return len(entries)
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._entries[:limit]
+
+
+hot_items = HotLeaderboard()
+
+
+# 定时任务：刷新热门榜
+def refresh_hot_items():
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        return hot_items.refresh(db)
+    finally:
+        db.close()
@@ -0,0 +1,258 @@
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+
+from . import models
+from .search import document_tokens
+
+logger = logging.getLogger(__name__)
+
+# 全量重建的间隔（秒）；两次重建之间新增、修改的物品增量写入索引
+REBUILD_INTERVAL = 3600
+# 重建时每批读取的物品数
+REBUILD_BATCH_SIZE = 1000
+# 各类特征的权重（文本、分类、价格段分别归一化后按权重拼接）
+TEXT_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+PRICE_WEIGHT = 0.3
+# 价格段边界：免费、<10、10-50、50-100、100-500、500-1000、1000+
+PRICE_BAND_BOUNDS = [10, 50, 100, 500, 1000]
+PRICE_BANDS = len(PRICE_BAND_BOUNDS) + 2
+
+
+def _price_band(price) -> int:
+    if not price:
+        return 0
+    return 1 + int(np.searchsorted(PRICE_BAND_BOUNDS, float(price), side="right"))
+
+
+def _item_fields(item) -> tuple:
+    return (item.id, item.title, item.description, item.category_id, item.price, item.status)
+
+
+class _IndexState:
+    """
+        一次全量构建得到的索引
+
+        - 词表、IDF、分类列在构建时确定，增量写入的物品沿用它们（新词不参与相似度，直到下次重建）
+        - 向量矩阵每行一个物品，按行 L2 归一化，余弦相似度即点积
+        - 增量写入的行先放在 pending 中，查询前合并进矩阵
+    """
+
+    def __init__(self, vocab: Dict[str, int], idf: np.ndarray, categories: Dict[int, int]):
+        self.vocab = vocab
+        self.idf = idf
+        self.categories = categories
+        self.dims = len(vocab) + len(categories) + PRICE_BANDS
+        self.matrix = sparse.csr_matrix((0, self.dims), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.rows: Dict[int, int] = {}
+        self.pending: List[sparse.csr_matrix] = []
+        self.pending_ids: List[int] = []
+        self.pending_active: List[bool] = []
+
+    def vectorize(self, title, description, category_id, price) -> sparse.csr_matrix:
+        columns = []
+        values = []
+        for token, tf in document_tokens(title, description).items():
+            column = self.vocab.get(token)
+            if column is not None:
+                columns.append(column)
+                values.append((1 + math.log(tf)) * self.idf[column])
+        text_norm = math.sqrt(sum(value * value for value in values))
+        if text_norm:
+            values = [value / text_norm * TEXT_WEIGHT for value in values]
+
+        offset = len(self.vocab)
+        category_column = self.categories.get(category_id)
+        if category_column is not None:
+            columns.append(offset + category_column)
+            values.append(CATEGORY_WEIGHT)
+        columns.append(offset + len(self.categories) + _price_band(price))
+        values.append(PRICE_WEIGHT)
+
+        values = np.asarray(values, dtype=np.float32)
+        values /= np.linalg.norm(values)
+        return sparse.csr_matrix(
+            (values, (np.zeros(len(columns), dtype=np.int32), columns)),
+            shape=(1, self.dims)
+        )
+
+    def upsert(self, fields: tuple):
+        item_id, title, description, category_id, price, status = fields
+        self.remove(item_id)
+        self.rows[item_id] = len(self.ids) + len(self.pending_ids)
+        self.pending.append(self.vectorize(title, description, category_id, price))
+        self.pending_ids.append(item_id)
+        self.pending_active.append(status == models.ItemStatus.available)
+
+    def remove(self, item_id: int):
+        row = self.rows.pop(item_id, None)
+        if row is not None:
+            self._set_active(row, False)
+
+    def set_status(self, item_id: int, status):
+        row = self.rows.get(item_id)
+        if row is not None:
+            self._set_active(row, status == models.ItemStatus.available)
+
+    def _set_active(self, row: int, active: bool):
+        if row < len(self.active):
+            self.active[row] = active
+        else:
+            self.pending_active[row - len(self.active)] = active
+
+    def compact(self):
+        if not self.pending:
+            return
+        self.matrix = sparse.vstack([self.matrix] + self.pending, format="csr")
+        self.ids = np.concatenate([self.ids, np.asarray(self.pending_ids, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.asarray(self.pending_active, dtype=bool)])
+        self.pending, self.pending_ids, self.pending_active = [], [], []
+
+
+def _build_state(db: Session, batch_size: int) -> _IndexState:
+    # 第一遍：读取物品并统计文档频率
+    records = []
+    document_frequency: Dict[str, int] = {}
+    category_ids = set()
+    last_id = 0
+    while True:
+        rows = db.query(
+            models.Item.id, models.Item.title, models.Item.description,
+            models.Item.category_id, models.Item.price, models.Item.status
+        ).filter(
+            models.Item.id > last_id
+        ).order_by(models.Item.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            records.append(tuple(row))
+            for token in document_tokens(row.title, row.description):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+            if row.category_id is not None:
+                category_ids.add(row.category_id)
+        last_id = rows[-1].id
+
+    # 平滑 IDF：log((1 + N) / (1 + df)) + 1
+    vocab = {token: column for column, token in enumerate(document_frequency)}
+    df = np.fromiter(document_frequency.values(), dtype=np.float64, count=len(document_frequency))
+    idf = np.log((1 + len(records)) / (1 + df)) + 1
+    categories = {category_id: column for column, category_id in enumerate(sorted(category_ids))}
+
+    # 第二遍：生成向量
+    state = _IndexState(vocab, idf, categories)
+    for fields in records:
+        state.upsert(fields)
+    state.compact()
+    return state
+
+
+class SimilarItemsIndex:
+    """
+        相似物品索引（TF-IDF + 分类 + 价格段特征的余弦相似度）
+
+        - 全量构建在后台线程中完成，构建期间的增量操作会记录下来，构建完成后重放到新索引上
+        - 新增、修改的物品增量写入；售出、交易中的物品只在掩码中标记为不可推荐，无需重建
+        - 查询为一次稀疏矩阵与向量的乘法，取前 k 个
+        - 索引只保存在当前进程中，其他进程写入的物品在下次全量重建后才会出现
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._state = _IndexState({}, np.zeros(0), {})
+        self._journal: Optional[list] = None
+        self.built_at: Optional[float] = None
+        self.rebuilds = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def _apply(self, operation: str, *args):
+        with self._lock:
+            getattr(self._state, operation)(*args)
+            if self._journal is not None:
+                self._journal.append((operation, args))
+
+    def upsert(self, item: models.Item):
+        """新增或内容变更（标题、描述、分类、价格）后调用"""
+        self._apply("upsert", _item_fields(item))
+
+    def set_status(self, item_id: int, status):
+        """状态变更后调用，非可交易状态的物品不再出现在推荐结果中"""
+        self._apply("set_status", item_id, status)
+
+    def remove(self, item_id: int):
+        self._apply("remove", item_id)
+
+    def rebuild(self, db: Session, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+        """全量重建索引，返回索引的物品数"""
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                state = _build_state(db, batch_size)
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                for operation, args in self._journal:
+                    getattr(state, operation)(*args)
+                self._journal = None
+                self._state = state
+                self.built_at = time.time()
+                self.rebuilds += 1
+            return len(state.rows)
+
+    def similar(self, item_id: int, limit: int) -> Optional[List[int]]:
+        """返回与物品最相似的可交易物品ID（按相似度降序），物品不在索引中时返回 None"""
+        with self._lock:
+            state = self._state
+            state.compact()
+            row = state.rows.get(item_id)
+            if row is None:
+                return None
+            matrix, ids = state.matrix, state.ids
+            active = state.active.copy()
+
+        scores = (matrix @ matrix[row].T).toarray().ravel()
+        active[row] = False
+        scores[~active] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return ids[candidates].tolist()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._state.rows),
+                "vocabulary": len(self._state.vocab),
+                "built_at": self.built_at,
+                "rebuilds": self.rebuilds
+            }
+
+
+similar_items = SimilarItemsIndex()
+
+
+# 定时任务：全量重建相似物品索引
+def rebuild_similar_items():
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        return similar_items.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 规格名 -> (宽, 高, 是否裁剪为固定尺寸)
+# thumb：列表卡片使用的固定尺寸缩略图（居中裁剪）；medium：详情页使用，按比例缩放到最长边不超过限制
+RENDITIONS = {
+    "thumb": (320, 320, True),
+    "medium": (960, 960, False),
+}
+# 原图扩展名 -> Pillow 格式名（生成 WebP 之外，再按原图格式生成一份）
+ORIGINAL_FORMATS = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "gif": "GIF",
+    "webp": "WEBP",
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+# 处理图片的进程数
+RENDITION_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# 超过该像素数的图片拒绝处理（防止解压炸弹）
+MAX_IMAGE_PIXELS = 40_000_000
+
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+# 缩放图的文件名：item_xxx.jpg -> item_xxx.thumb.webp / item_xxx.thumb.jpg
+def rendition_name(file_name: str, size: str, ext: Optional[str] = None) -> str:
+    stem, _, original_ext = file_name.rpartition(".")
+    return f"{stem}.{size}.{ext or original_ext}"
+
+
+def rendition_url(image_url: str, size: str, ext: Optional[str] = None) -> str:
+    """根据原图URL得到缩放图URL（缩放图与原图在同一目录）"""
+    base, _, file_name = image_url.rpartition("/")
+    return f"{base}/{rendition_name(file_name, size, ext)}"
+
+
+def is_rendition(file_name: str) -> bool:
+    return file_name.count(".") >= 2 and file_name.split(".")[-2] in RENDITIONS
+
+
+def rendition_files(file_name: str) -> List[str]:
+    ext = file_name.rpartition(".")[2]
+    names = []
+    for size in RENDITIONS:
+        names.append(rendition_name(file_name, size, "webp"))
+        if ext != "webp":
+            names.append(rendition_name(file_name, size))
+    return names
+
+
+def _save(image: Image.Image, path: Path, image_format: str):
+    # 先写临时文件再重命名，不会读到写了一半的缩放图
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+    options = {}
+    if image_format == "WEBP":
+        options = {"quality": WEBP_QUALITY, "method": 4}
+    elif image_format == "JPEG":
+        options = {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}
+    elif image_format == "PNG":
+        options = {"optimize": True}
+    try:
+        image.save(temp_path, image_format, **options)
+        os.replace(temp_path, path)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+
+# 生成一张图片的全部缩放图（在子进程中执行）
+def render(path: str) -> List[str]:
+    """
+        为原图生成各规格的 WebP 及原格式缩放图，返回生成的文件名
+
+        异常：
+        - 图片无法解析或像素数过大时抛出 PIL 的异常
+    """
+    source = Path(path)
+    ext = source.suffix.lstrip(".").lower()
+    original_format = ORIGINAL_FORMATS.get(ext, "PNG")
+
+    with Image.open(source) as image:
+        # 按 EXIF 方向旋转；GIF 只取第一帧
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        written = []
+        for size, (width, height, crop) in RENDITIONS.items():
+            if crop:
+                resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+
+            webp_name = rendition_name(source.name, size, "webp")
+            _save(resized, source.with_name(webp_name), "WEBP")
+            written.append(webp_name)
+
+            if original_format != "WEBP":
+                original = resized
+                if original_format == "JPEG" and original.mode != "RGB":
+                    original = original.convert("RGB")
+                elif original_format == "GIF":
+                    original = original.convert("P", palette=Image.ADAPTIVE)
+                name = rendition_name(source.name, size)
+                _save(original, source.with_name(name), original_format)
+                written.append(name)
+        return written
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDITION_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+# 在进程池中生成缩放图（不占用事件循环和请求线程）
+async def render_async(path: Path) -> List[str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), render, str(path))
+
+
+def missing_renditions(directory: Path, file_name: str) -> bool:
+    return any(not (directory / name).exists() for name in rendition_files(file_name))
+
+
+def is_original(file_name: str) -> bool:
+    return (
+        not file_name.startswith(".")
+        and file_name.rpartition(".")[2].lower() in ORIGINAL_FORMATS
+        and not is_rendition(file_name)
+    )
+
+
+# 为目录（含分片子目录）中已有的原图补生成缩放图
+def backfill(directory: Path, force: bool = False, workers: int = RENDITION_WORKERS) -> Dict[str, int]:
+    """返回统计：processed（已生成）、skipped（已存在）、failed（无法解析）"""
+    originals = sorted(
+        os.path.relpath(os.path.join(root, file_name), directory)
+        for root, _, file_names in os.walk(directory)
+        for file_name in file_names
+        if is_original(file_name)
+    )
+    pending = [name for name in originals if force or missing_renditions(directory, name)]
+    stats = {"processed": 0, "skipped": len(originals) - len(pending), "failed": 0}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(render, str(directory / name)) for name in pending}
+        for name, future in futures.items():
+            try:
+                future.result()
+                stats["processed"] += 1
+            except Exception:
+                logger.exception("生成缩放图失败：%s", name)
+                stats["failed"] += 1
+    return stats
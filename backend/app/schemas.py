@@ -1,8 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Union
+from pydantic import BaseModel, EmailStr, Field, validator, computed_field, field_validator
+from typing import Optional, List, Union, Dict
 from datetime import datetime
 from enum import Enum
 
+from .renditions import rendition_url
+from .static_images import rebase_image_url
+
 # 物品状态枚举
 class ItemStatus(str, Enum):
     available = "available"
@@ -16,6 +19,14 @@ class TransactionStatus(str, Enum):
     completed = "completed"
     cancelled = "cancelled"
 
+# 物品列表排序方式
+class ItemSort(str, Enum):
+    newest = "newest"                  # 最新发布
+    price_asc = "price_asc"            # 价格从低到高（免费在最前）
+    price_desc = "price_desc"          # 价格从高到低（免费在最后）
+    most_favorited = "most_favorited"  # 收藏最多
+    relevance = "relevance"            # 相关度（需要搜索关键词）
+
 # 用户模型 - 基础
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -40,6 +51,8 @@ class UserResponse(UserBase):
     credit_score: int
     created_at: datetime
 
+    _rebase_avatar = field_validator("avatar", mode="before")(rebase_image_url)
+
     class Config:
         from_attributes = True  # 兼容SQLAlchemy模型
 
@@ -71,6 +84,38 @@ class ItemImageCreate(ItemImageBase):
 class ItemImageResponse(ItemImageBase):
     id: int
     item_id: int
+    position: int = 0
+
+    # 按当前配置的图片地址前缀返回URL
+    _rebase_image_url = field_validator("image_url", mode="before")(rebase_image_url)
+
+    # 是否已生成缩放图（读取图片记录中保存的标记，不检查磁盘；不在响应中输出）
+    has_renditions: bool = Field(default=False, exclude=True)
+
+    def _rendition(self, size: str, ext: Optional[str] = None) -> Optional[str]:
+        return rendition_url(self.image_url, size, ext) if self.has_renditions else None
+
+    # 缩放图（上传时生成，与原图在同一目录）：thumb 为列表卡片的固定尺寸缩略图，medium 为详情页中图；
+    # 外部图片或尚未生成缩放图的旧图片为 null，客户端使用 image_url
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return self._rendition("thumb")
+
+    @computed_field
+    @property
+    def thumbnail_webp_url(self) -> Optional[str]:
+        return self._rendition("thumb", "webp")
+
+    @computed_field
+    @property
+    def medium_url(self) -> Optional[str]:
+        return self._rendition("medium")
+
+    @computed_field
+    @property
+    def medium_webp_url(self) -> Optional[str]:
+        return self._rendition("medium", "webp")
 
     class Config:
         from_attributes = True
@@ -112,10 +157,56 @@ class ItemBriefResponse(ItemBase):
 # 物品模型 - 响应（详细）
 class ItemDetailResponse(ItemBriefResponse):
     category: Optional[CategoryResponse] = None
+    view_count: int = 0
+    favorite_count: int = 0
 
     class Config:
         from_attributes = True
 
+# 物品模型 - 批量创建的单条结果
+class ItemBulkResult(BaseModel):
+    index: int  # 在请求列表中的位置
+    success: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+# 物品模型 - 批量创建响应
+class ItemBulkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[ItemBulkResult] = []
+
+# 物品模型 - 批量获取响应
+class ItemBatchResponse(BaseModel):
+    items: List[ItemDetailResponse] = []
+    missing: List[int] = []  # 不存在的物品ID
+
+# 搜索联想 - 候选
+class SuggestionResponse(BaseModel):
+    text: str
+    kind: str  # item：物品标题，category：分类名
+    category_id: Optional[int] = None  # kind 为 category 时的分类ID
+
+# 物品分面统计 - 分类计数
+class CategoryFacet(BaseModel):
+    category_id: Optional[int] = None
+    name: Optional[str] = None
+    count: int
+
+# 物品分面统计 - 价格区间计数
+class PriceBucketFacet(BaseModel):
+    key: str
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    count: int
+
+# 物品分面统计 - 响应
+class ItemFacetsResponse(BaseModel):
+    total: int
+    categories: List[CategoryFacet] = []
+    statuses: Dict[str, int] = {}
+    price_buckets: List[PriceBucketFacet] = []
+
 # 聊天模型 - 基础
 class ChatBase(BaseModel):
     message: str
@@ -137,6 +228,31 @@ class ChatResponse(ChatBase):
     class Config:
         from_attributes = True
 
+# 聊天消息（不含发送者信息）
+class ChatMessageResponse(ChatBase):
+    id: int
+    item_id: int
+    sender_id: int
+    receiver_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# 聊天会话模型 - 响应
+class ConversationResponse(BaseModel):
+    id: int
+    item: ItemBriefResponse
+    last_message: Optional[ChatMessageResponse] = None
+    last_message_at: Optional[datetime] = None
+    other_user: UserResponse
+    unread_count: int = 0  # 当前用户的未读消息数
+    last_read_message_id: Optional[int] = None  # 当前用户已读到的消息ID
+
+# 未读消息数模型 - 响应
+class UnreadCountResponse(BaseModel):
+    unread_count: int
+
 # 交易模型 - 基础
 class TransactionBase(BaseModel):
     meeting_time: Optional[datetime] = None
@@ -193,6 +309,13 @@ class TransactionResponse(TransactionBase):
     class Config:
         from_attributes = True
 
+# 交易模型 - 我的交易汇总响应（买入、卖出列表及各状态数量）
+class MyTransactionsResponse(BaseModel):
+    buy: List[TransactionResponse] = []
+    sell: List[TransactionResponse] = []
+    buy_status_counts: Dict[str, int] = {}
+    sell_status_counts: Dict[str, int] = {}
+
 # 收藏模型 - 基础
 class FavoriteBase(BaseModel):
     item_id: int
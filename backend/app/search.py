@@ -0,0 +1,385 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# 词项最大长度（与 item_search_tokens.token 列宽一致）
+MAX_TOKEN_LEN = 32
+# 标题中的词项权重（标题命中比描述命中更相关）
+TITLE_WEIGHT = 2
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 时间衰减：新发布的物品额外加权，权重每 RECENCY_HALF_LIFE_DAYS 天减半
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE_DAYS = 30.0
+# 语料统计（文档总数、平均长度）的缓存时间（秒）
+CORPUS_STATS_TTL = 300
+# 重建索引时每批处理的物品数
+REBUILD_BATCH_SIZE = 500
+# 前缀匹配的最短长度，更短的末尾单词按完整单词匹配（单个字母会展开为大量词项）
+MIN_PREFIX_LEN = 2
+# 前缀最多展开的词项数（取文档频率最高的）
+MAX_PREFIX_EXPANSION = 50
+# 参与打分的候选物品数上限（常见单字等高频词项的倒排记录接近全部物品，只对最新的一部分打分）
+MAX_CANDIDATES = 5000
+# 物品列表搜索最多返回的匹配数（按相关度取前若干条，再在其中按价格、收藏数等排序或翻页）
+MAX_SEARCH_RESULTS = 1000
+
+# 中日韩汉字连续片段 或 英文/数字单词
+_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+
+def _normalize(text: str) -> str:
+    # 全角转半角、统一小写
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+        将文本切分为索引词项
+
+        - 英文/数字：按单词切分
+        - 中文：同时输出单字和相邻二元组（bigram），单字保证单字查询可召回，
+          二元组保证多字查询的精度
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for run in _TOKEN_RE.findall(_normalize(text)):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run[:MAX_TOKEN_LEN])
+    return tokens
+
+
+def query_terms(text: Optional[str]) -> Tuple[List[str], Optional[str]]:
+    """
+        将搜索关键词切分为查询词项
+
+        返回：
+        - 精确匹配的词项列表（中文片段取二元组，单字片段取单字）
+        - 需要前缀匹配的末尾英文单词（边输入边搜索时单词往往尚未输入完整），
+          短于 MIN_PREFIX_LEN 时按完整单词匹配
+    """
+    if not text:
+        return [], None
+
+    normalized = _normalize(text)
+    runs = _TOKEN_RE.findall(normalized)
+    terms = []
+    prefix = None
+    for index, run in enumerate(runs):
+        if _is_cjk(run):
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif index == len(runs) - 1 and not normalized[-1].isspace() and len(run) >= MIN_PREFIX_LEN:
+            prefix = run[:MAX_TOKEN_LEN]
+        else:
+            terms.append(run[:MAX_TOKEN_LEN])
+
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms)), prefix
+
+
+# 物品标题、描述的词频（标题词项加权）
+def document_tokens(title: Optional[str], description: Optional[str]) -> Counter:
+    counts = Counter()
+    for token in tokenize(title):
+        counts[token] += TITLE_WEIGHT
+    for token in tokenize(description):
+        counts[token] += 1
+    return counts
+
+
+# 更新物品的索引（新增或更新物品时调用，由调用方提交事务）
+def index_item(db: Session, item: models.Item):
+    """为物品建立（或重建）倒排索引"""
+    remove_item(db, item.id)
+    index_new_items(db, [item])
+
+
+# 批量为新物品建立索引（由调用方提交事务）
+def index_new_items(db: Session, items: List[models.Item]):
+    """为尚未建立索引的物品批量写入倒排索引，所有词项一次批量插入"""
+    tokens = []
+    docs = []
+    for item in items:
+        counts = document_tokens(item.title, item.description)
+        tokens.extend(
+            {"token": token, "item_id": item.id, "tf": tf}
+            for token, tf in counts.items()
+        )
+        docs.append({"item_id": item.id, "length": sum(counts.values())})
+
+    if tokens:
+        db.bulk_insert_mappings(models.ItemSearchToken, tokens)
+    if docs:
+        db.bulk_insert_mappings(models.ItemSearchDoc, docs)
+
+
+# 从索引中移除物品（删除物品时调用，由调用方提交事务）
+def remove_item(db: Session, item_id: int):
+    """删除物品的倒排索引记录"""
+    db.query(models.ItemSearchToken).filter(
+        models.ItemSearchToken.item_id == item_id
+    ).delete(synchronize_session=False)
+    db.query(models.ItemSearchDoc).filter(
+        models.ItemSearchDoc.item_id == item_id
+    ).delete(synchronize_session=False)
+
+
+# 根据 items 表重建整个索引
+def rebuild_index(db: Session, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """清空并重建倒排索引，返回已索引的物品数量"""
+    db.query(models.ItemSearchToken).delete(synchronize_session=False)
+    db.query(models.ItemSearchDoc).delete(synchronize_session=False)
+    db.commit()
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.query(
+            models.Item.id, models.Item.title, models.Item.description
+        ).filter(
+            models.Item.id > last_id
+        ).order_by(models.Item.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        tokens = []
+        docs = []
+        for item_id, title, description in rows:
+            counts = document_tokens(title, description)
+            tokens.extend(
+                {"token": token, "item_id": item_id, "tf": tf}
+                for token, tf in counts.items()
+            )
+            docs.append({"item_id": item_id, "length": sum(counts.values())})
+
+        if tokens:
+            db.bulk_insert_mappings(models.ItemSearchToken, tokens)
+        db.bulk_insert_mappings(models.ItemSearchDoc, docs)
+        db.commit()
+
+        total += len(rows)
+        last_id = rows[-1][0]
+
+    _corpus_stats.invalidate()
+    return total
+
+
+class _CorpusStats:
+    """缓存语料统计（文档总数、平均文档长度），避免每次搜索都做全表聚合"""
+
+    def __init__(self, ttl: int = CORPUS_STATS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value: Optional[Tuple[int, float]] = None
+        self._expires_at = 0.0
+
+    def get(self, db: Session) -> Tuple[int, float]:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+
+        count, avg_length = db.query(
+            func.count(models.ItemSearchDoc.item_id),
+            func.avg(models.ItemSearchDoc.length)
+        ).one()
+        value = (count or 0, float(avg_length or 0) or 1.0)
+
+        with self._lock:
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+_corpus_stats = _CorpusStats()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _recency_boost(created_at: Optional[datetime]) -> float:
+    if created_at is None:
+        return 1.0
+    age_days = max((datetime.now(created_at.tzinfo) - created_at).total_seconds(), 0) / 86400
+    return 1 + RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+
+
+def _expand_query(db: Session, terms: List[str], prefix: Optional[str]) -> Optional[Tuple[Dict[str, int], List[List[str]]]]:
+    """
+        查询词项的文档频率，以及物品需命中的词项组（每个查询词一组，前缀词为展开后的词项）
+
+        某个查询词没有任何物品命中时返回 None
+    """
+    token = models.ItemSearchToken.token
+
+    # 文档频率（只扫描 token 主键索引）
+    df: Dict[str, int] = {}
+    if terms:
+        df.update(
+            db.query(token, func.count()).filter(token.in_(terms)).group_by(token).all()
+        )
+        if any(term not in df for term in terms):
+            return None
+    groups = [[term] for term in terms]
+    if prefix:
+        expansion = (
+            db.query(token, func.count())
+            .filter(token.like(_escape_like(prefix) + "%", escape="\\"))
+            .group_by(token)
+            .order_by(func.count().desc(), token)
+            .limit(MAX_PREFIX_EXPANSION)
+            .all()
+        )
+        if not expansion:
+            return None
+        df.update(expansion)
+        groups.append([prefix_token for prefix_token, _ in expansion])
+    return df, groups
+
+
+# 匹配搜索关键词的物品（SQL 条件）
+def match_condition(db: Session, text: str):
+    """
+        返回作用于 models.Item 的过滤条件：命中全部查询词项
+
+        与 search_item_ids 的匹配语义相同，但不限制候选物品数、不打分，
+        用于分面统计、导出等需要完整匹配集合的场景（每组词项一个 IN 子查询，由 token 主键索引驱动）
+
+        返回：
+        - 过滤条件；关键词中没有可检索的字词、或某个查询词没有任何物品命中时返回 None（匹配集合为空）
+    """
+    terms, prefix = query_terms(text)
+    if not terms and not prefix:
+        return None
+    expanded = _expand_query(db, terms, prefix)
+    if expanded is None:
+        return None
+    _, groups = expanded
+    return and_(*(
+        models.Item.id.in_(
+            select(models.ItemSearchToken.item_id).where(models.ItemSearchToken.token.in_(group))
+        )
+        for group in groups
+    ))
+
+
+# 搜索物品，返回按相关度排序的物品ID列表
+def search_item_ids(db: Session, text: str, filters: Optional[list] = None, limit: Optional[int] = None) -> List[int]:
+    """
+        在倒排索引中检索物品
+
+        参数：
+        - text: 搜索关键词
+        - filters: 作用于 models.Item 的额外过滤条件（分类、价格、状态等）
+        - limit: 最多返回的物品数（只保留相关度最高的部分），为空时返回全部匹配
+
+        返回：
+        - 匹配全部查询词项的物品ID，按 BM25 相关度与发布时间综合得分降序排列
+        - 关键词中没有可检索的字词（如只有标点符号）时返回空列表，不再退回子串匹配
+
+        每次查询的代价有上限：前缀最多展开 MAX_PREFIX_EXPANSION 个词项；
+        由文档频率最低的查询词确定候选物品，最多 MAX_CANDIDATES 个（优先最新发布的），只对候选物品打分，
+        因此高频查询词只返回最新的一部分匹配；需要完整匹配集合时使用 match_condition
+    """
+    terms, prefix = query_terms(text)
+    if not terms and not prefix:
+        return []
+
+    expanded = _expand_query(db, terms, prefix)
+    if expanded is None:
+        return []
+    df, groups = expanded
+    prefix_tokens = groups[-1] if prefix else []
+    token = models.ItemSearchToken.token
+
+    doc_count, avg_length = _corpus_stats.get(db)
+    doc_count = max(doc_count, 1)
+
+    # 物品需命中每一组词项
+    group_df = [min(sum(df[group_token] for group_token in group), doc_count) for group in groups]
+
+    def filtered(query):
+        query = query.join(models.Item, models.Item.id == models.ItemSearchToken.item_id)
+        for condition in filters or []:
+            query = query.filter(condition)
+        return query
+
+    # 候选物品：文档频率最低的一组的倒排记录（全部命中的物品一定在其中）
+    driver = groups[group_df.index(min(group_df))]
+    candidates = [
+        item_id for (item_id,) in filtered(
+            db.query(models.ItemSearchToken.item_id).filter(token.in_(driver))
+        ).distinct().order_by(models.ItemSearchToken.item_id.desc()).limit(MAX_CANDIDATES)
+    ]
+    if not candidates:
+        return []
+
+    # 候选物品的倒排记录
+    all_tokens = [group_token for group in groups for group_token in group]
+    query = db.query(
+        models.ItemSearchToken.item_id,
+        token,
+        models.ItemSearchToken.tf,
+        models.ItemSearchDoc.length,
+        models.Item.created_at
+    ).join(
+        models.ItemSearchDoc, models.ItemSearchDoc.item_id == models.ItemSearchToken.item_id
+    ).join(
+        models.Item, models.Item.id == models.ItemSearchToken.item_id
+    ).filter(token.in_(all_tokens), models.ItemSearchToken.item_id.in_(candidates))
+
+    def idf(term_df: int) -> float:
+        return math.log(1 + (doc_count - term_df + 0.5) / (term_df + 0.5))
+
+    term_set = set(terms)
+    prefix_set = set(prefix_tokens)
+    prefix_df = group_df[-1] if prefix else 0
+    scores: Dict[int, float] = defaultdict(float)
+    matched: Dict[int, set] = defaultdict(set)
+    created: Dict[int, Optional[datetime]] = {}
+    for item_id, item_token, tf, length, created_at in query:
+        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        if item_token in term_set:
+            scores[item_id] += idf(df[item_token]) * tf * (BM25_K1 + 1) / norm
+            matched[item_id].add(item_token)
+        if item_token in prefix_set:
+            scores[item_id] += idf(prefix_df) * tf * (BM25_K1 + 1) / norm
+            matched[item_id].add(None)
+        created[item_id] = created_at
+
+    # 必须命中全部查询词项（与原先的子串匹配语义一致）
+    required = len(groups)
+    ranked = [
+        (score * _recency_boost(created[item_id]), item_id)
+        for item_id, score in scores.items()
+        if len(matched[item_id]) == required
+    ]
+    ranked.sort(key=lambda pair: (-pair[0], -pair[1]))
+    return [item_id for _, item_id in ranked[:limit]]
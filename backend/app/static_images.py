@@ -0,0 +1,187 @@
+import os
+import re
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from . import renditions, storage
+from .dependencies import IMAGE_BASE_URL, IMAGE_DIR
+
+# 按内容寻址的图片（及其缩放图）内容永不改变，允许浏览器、CDN 长期缓存且无需再验证
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 旧的非去重图片：缓存一天，过期后用 ETag 再验证
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# 数据库中保存的图片URL里，图片目录之后的部分是文件的相对路径
+_IMAGE_PATH_MARKER = "/static/images/"
+
+
+# 图片文件的公开URL
+def image_url(file_name: str) -> str:
+    return f"{IMAGE_BASE_URL}/{file_name}"
+
+
+# 提交的图片可以是上传返回的文件名，也可以是物品详情中返回的完整URL，统一为文件的相对路径
+def image_file_name(url: str) -> str:
+    if url.startswith(IMAGE_BASE_URL + "/"):
+        return url[len(IMAGE_BASE_URL) + 1:]
+    if _IMAGE_PATH_MARKER in url:
+        return url.split(_IMAGE_PATH_MARKER, 1)[1]
+    return url
+
+
+# 把已保存的图片URL换成当前配置的地址前缀（更换域名或接入 CDN 后旧数据无需改写）
+def rebase_image_url(url: Optional[str]) -> Optional[str]:
+    if not url or _IMAGE_PATH_MARKER not in url:
+        return url
+    return image_url(image_file_name(url))
+
+
+# 图片是否有可用的缩放图（写入图片记录时判断一次，结果保存在 item_images.has_renditions）：
+# 外部图片没有；按内容寻址的图片在上传、导入时已生成；旧的本地图片只有执行过 generate-renditions 后才有
+def has_renditions(url: Optional[str]) -> bool:
+    if not url or not url.startswith(IMAGE_BASE_URL + "/"):
+        return False
+    file_name = image_file_name(url)
+    if storage.parse_blob_hash(file_name) is not None:
+        return True
+    path = IMAGE_DIR / file_name
+    return not renditions.missing_renditions(path.parent, path.name)
+
+
+# 解析 Range 请求头，返回 [start, end]（含两端）；不支持的格式返回 None（按完整文件响应）
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+        只支持单个区间（bytes=a-b、bytes=a-、bytes=-n），多区间请求按完整文件响应
+
+        异常：
+        - 416 Range Not Satisfiable: 区间超出文件大小
+    """
+    match = _RANGE_RE.match(header.replace(" ", ""))
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # 最后 n 个字节
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or size == 0:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # 弱比较：忽略 W/ 前缀
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class _RangeFileResponse(FileResponse):
+    """返回文件中的一段（206 Partial Content）"""
+
+    def __init__(self, path, start: int, end: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{self.stat_result.st_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # 文件在发送过程中被截断
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class ImageStaticFiles(StaticFiles):
+    """
+        图片静态文件服务
+
+        - 按内容寻址的图片及其缩放图：ETag 为内容哈希，Cache-Control 为 immutable
+        - 其他图片：ETag 由修改时间和大小生成，缓存一天后再验证
+        - 条件请求（If-None-Match / If-Modified-Since）命中时返回 304
+        - 支持单区间的 Range 请求（206），配合 If-Range 使用
+        - 缩放图在上传时预先生成，这里只读取文件，不做实时缩放
+        - 不提供以 . 开头的文件（上传中的临时文件）
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        file_name = os.path.basename(full_path)
+        headers = {"accept-ranges": "bytes"}
+
+        # 缩放图（<hash>.thumb.webp）按所属原图解析哈希
+        original_name = file_name.rsplit(".", 2)[0] + ".x" if renditions.is_rendition(file_name) else file_name
+        relative_path = os.path.relpath(os.path.join(os.path.dirname(full_path), original_name), self.directory)
+        blob_hash = storage.parse_blob_hash(relative_path.replace(os.sep, "/"))
+        if blob_hash is not None:
+            headers["etag"] = f'"{blob_hash[:32]}{file_name[len(blob_hash):]}"'
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            headers["cache-control"] = DEFAULT_CACHE_CONTROL
+
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, method=scope["method"], headers=headers
+        )
+        # Starlette 生成的 ETag 不带引号，补上引号以符合规范
+        if not response.headers["etag"].startswith('"'):
+            response.headers["etag"] = f'"{response.headers["etag"]}"'
+        headers["etag"] = etag = response.headers["etag"]
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if range_header and status_code == 200 and self._if_range_matches(request_headers, etag, stat_result):
+            byte_range = parse_range(range_header, stat_result.st_size)
+            if byte_range is not None:
+                return _RangeFileResponse(
+                    full_path, *byte_range, stat_result=stat_result, method=scope["method"], headers=headers
+                )
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # 有 If-None-Match 时忽略 If-Modified-Since（RFC 9110）
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, response_headers["etag"])
+        return super().is_not_modified(response_headers, request_headers)
+
+    @staticmethod
+    def _if_range_matches(request_headers: Headers, etag: str, stat_result: os.stat_result) -> bool:
+        # If-Range 不匹配说明客户端缓存的片段已过期，返回完整文件
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"'):
+            return if_range == etag
+        return formatdate(stat_result.st_mtime, usegmt=True) == if_range
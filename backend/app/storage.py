@@ -0,0 +1,310 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, renditions
+from .dependencies import IMAGE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 无引用的图片文件保留多久后才回收（上传后尚未提交物品、或物品换图后短时间内重新使用）
+GC_GRACE_PERIOD = timedelta(hours=24)
+# 垃圾回收的执行间隔（秒）
+GC_INTERVAL = 3600
+# 每批回收的文件数
+GC_BATCH_SIZE = 500
+
+# 文件名：两级分片目录 + SHA-256 + 扩展名，如 3f/a2/3fa2...e1.jpg
+_BLOB_NAME_RE = re.compile(r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.([a-z0-9]+)$")
+
+
+# 图片文件相对于图片目录的路径
+def blob_name(blob_hash: str, ext: str) -> str:
+    """按哈希前两级分片，每个目录下的文件数保持在可控范围内"""
+    return f"{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}.{ext}"
+
+
+def blob_path(blob_hash: str, ext: str) -> Path:
+    return IMAGE_DIR / blob_name(blob_hash, ext)
+
+
+# 从图片文件名或URL中解析内容哈希（旧的非去重存储的图片返回 None）
+def parse_blob_hash(image_url: str) -> Optional[str]:
+    match = _BLOB_NAME_RE.search(image_url)
+    if match and match.group(3).startswith(match.group(1) + match.group(2)):
+        return match.group(3)
+    return None
+
+
+# 记录上传的图片文件（使用独立的数据库会话）
+def register_blob(blob_hash: str, ext: str, size: int):
+    """新文件插入记录；已存在的文件刷新更新时间，重新计算回收保留期"""
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        now = datetime.now()
+        touched = db.query(models.ImageBlob).filter(models.ImageBlob.hash == blob_hash).update(
+            {models.ImageBlob.updated_at: now}, synchronize_session=False
+        )
+        if not touched:
+            db.add(models.ImageBlob(hash=blob_hash, ext=ext, size=size, ref_count=0, created_at=now, updated_at=now))
+        try:
+            db.commit()
+        except IntegrityError:
+            # 相同内容的图片被同时上传
+            db.rollback()
+    finally:
+        db.close()
+
+
+def _adjust_refs(db: Session, deltas: Counter):
+    rows = [{"b_hash": blob_hash, "b_delta": delta} for blob_hash, delta in deltas.items() if delta]
+    if not rows:
+        return
+    blobs = models.ImageBlob.__table__
+    db.connection().execute(
+        update(blobs)
+        .where(blobs.c.hash == bindparam("b_hash"))
+        .values(ref_count=blobs.c.ref_count + bindparam("b_delta"), updated_at=datetime.now()),
+        rows
+    )
+
+
+# 物品引用图片（在物品的事务中调用，随物品一起提交）
+def acquire(db: Session, blob_hashes: Iterable[Optional[str]]):
+    """
+        增加图片文件的引用数
+
+        异常：
+        - 400 Bad Request: 图片文件不存在（未上传或已被回收）
+    """
+    deltas = Counter(blob_hash for blob_hash in blob_hashes if blob_hash)
+    if not deltas:
+        return
+    _adjust_refs(db, deltas)
+
+    # UPDATE 已锁定存在的记录；记录不存在说明文件已被回收
+    existing = {
+        blob_hash for (blob_hash,) in
+        db.query(models.ImageBlob.hash).filter(models.ImageBlob.hash.in_(deltas))
+    }
+    if len(existing) != len(deltas):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="图片不存在或已过期，请重新上传"
+        )
+
+
+# 锁定仍存在的图片文件（在物品的事务中调用，批量发布时逐条检查）
+def lock_existing(db: Session, blob_hashes: Iterable[Optional[str]]) -> Set[str]:
+    """
+        返回仍存在的图片文件哈希，记录锁定到事务结束，期间不会被回收
+
+        调用方跳过引用了不存在文件的数据，只对其余数据调用 acquire
+    """
+    hashes = {blob_hash for blob_hash in blob_hashes if blob_hash}
+    if not hashes:
+        return set()
+    return {
+        blob_hash for (blob_hash,) in
+        db.query(models.ImageBlob.hash).filter(models.ImageBlob.hash.in_(hashes)).with_for_update()
+    }
+
+
+# 物品不再引用图片（在物品的事务中调用）
+def release(db: Session, blob_hashes: Iterable[Optional[str]]):
+    deltas = Counter()
+    for blob_hash in blob_hashes:
+        if blob_hash:
+            deltas[blob_hash] -= 1
+    _adjust_refs(db, deltas)
+
+
+def _remove_files(name: str):
+    for file_name in [name] + renditions.rendition_files(name):
+        try:
+            os.unlink(IMAGE_DIR / file_name)
+        except FileNotFoundError:
+            pass
+
+
+def _discard_blob_files(db: Session, blob_hash: str, name: str) -> bool:
+    """
+        删除已回收记录的图片文件及其缩放图，返回是否删除
+
+        先把文件重命名为临时名（上传接口不再能看到），再确认记录仍不存在：
+        记录删除后同一内容被重新上传时，上传接口先登记记录、再检查文件，
+        此时要么在这里看到新记录并恢复文件，要么在那里发现文件已不存在并重新写入。
+    """
+    moved = []
+    for file_name in [name] + renditions.rendition_files(name):
+        path = IMAGE_DIR / file_name
+        tombstone = path.with_name(f".gc_{uuid.uuid4().hex}_{path.name}")
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            continue
+        moved.append((path, tombstone))
+
+    reused = db.query(models.ImageBlob.hash).filter(models.ImageBlob.hash == blob_hash).first() is not None
+    db.rollback()
+    for path, tombstone in moved:
+        if reused:
+            os.replace(tombstone, path)
+        else:
+            os.unlink(tombstone)
+    return not reused
+
+
+def _remove_stale_uploads(cutoff: float) -> int:
+    # 进程异常退出时遗留的上传临时文件、回收过程中的临时文件
+    removed = 0
+    for entry in os.scandir(IMAGE_DIR):
+        if entry.is_file() and entry.name.startswith((".upload_", ".gc_")) and entry.stat().st_mtime < cutoff:
+            os.unlink(entry.path)
+            removed += 1
+    return removed
+
+
+# 回收无引用的图片文件
+def collect_garbage(db: Session, grace_period: timedelta = GC_GRACE_PERIOD, batch_size: int = GC_BATCH_SIZE) -> Dict[str, int]:
+    """
+        删除引用数为 0 且超过保留期的图片文件及其缩放图
+
+        先按条件删除数据库记录并提交，删除成功的再删除磁盘文件：
+        与此同时引用该文件的物品事务要么先增加了引用数（删除条件不再满足），
+        要么在记录删除后找不到记录而失败，不会留下指向已删除文件的图片；
+        同时重新上传的相同内容见 _discard_blob_files。
+    """
+    cutoff = datetime.now() - grace_period
+    blobs = models.ImageBlob
+    removed = 0
+    while True:
+        candidates = db.query(blobs.hash, blobs.ext).filter(
+            blobs.ref_count <= 0,
+            blobs.updated_at < cutoff
+        ).limit(batch_size).all()
+        if not candidates:
+            break
+
+        deleted = []
+        for blob_hash, ext in candidates:
+            count = db.query(blobs).filter(
+                blobs.hash == blob_hash,
+                blobs.ref_count <= 0,
+                blobs.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            if count:
+                deleted.append((blob_hash, blob_name(blob_hash, ext)))
+        db.commit()
+
+        for blob_hash, name in deleted:
+            if _discard_blob_files(db, blob_hash, name):
+                removed += 1
+        if len(candidates) < batch_size:
+            break
+
+    stale = _remove_stale_uploads(time.time() - grace_period.total_seconds())
+    return {"blobs": removed, "stale_uploads": stale}
+
+
+# 定时任务：回收无引用的图片文件
+def run_garbage_collection():
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        return collect_garbage(db)
+    finally:
+        db.close()
+
+
+# 重新统计引用数（修复异常情况下不一致的计数）
+def recount_refs(db: Session) -> int:
+    """按 item_images 重新计算每个文件的引用数，返回修正的文件数"""
+    actual = dict(
+        db.query(models.ItemImage.blob_hash, func.count(models.ItemImage.id))
+        .filter(models.ItemImage.blob_hash.isnot(None))
+        .group_by(models.ItemImage.blob_hash)
+        .all()
+    )
+    fixed = 0
+    now = datetime.now()
+    for blob in db.query(models.ImageBlob).yield_per(1000):
+        count = actual.get(blob.hash, 0)
+        if blob.ref_count != count:
+            blob.ref_count = count
+            blob.updated_at = now
+            fixed += 1
+    db.commit()
+    return fixed
+
+
+# 将旧的图片文件（图片目录根下的 item_<uuid>.<ext>）导入去重存储
+def import_legacy_images(db: Session) -> Dict[str, int]:
+    """
+        逐个计算旧图片的哈希，移动到分片目录，并改写引用它们的 item_images 记录
+
+        返回：imported（导入的文件数）、deduplicated（内容重复、直接删除的文件数）、rows（改写的图片记录数）
+    """
+    stats = {"imported": 0, "deduplicated": 0, "rows": 0}
+    names = sorted(
+        entry.name for entry in os.scandir(IMAGE_DIR)
+        if entry.is_file() and renditions.is_original(entry.name)
+    )
+    for name in names:
+        source = IMAGE_DIR / name
+        hasher = hashlib.sha256()
+        with open(source, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        blob_hash = hasher.hexdigest()
+        ext = name.rpartition(".")[2].lower().replace("jpeg", "jpg")
+        target = blob_path(blob_hash, ext)
+
+        if target.exists():
+            stats["deduplicated"] += 1
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source, target)
+            stats["imported"] += 1
+        if renditions.missing_renditions(target.parent, target.name):
+            renditions.render(str(target))
+
+        # 改写引用旧文件名的图片记录
+        new_name = blob_name(blob_hash, ext)
+        rows = db.query(models.ItemImage).filter(models.ItemImage.image_url.like(f"%/{name}")).all()
+        for row in rows:
+            row.image_url = row.image_url[:-len(name)] + new_name
+            row.blob_hash = blob_hash
+            row.has_renditions = True
+
+        now = datetime.now()
+        blob = db.get(models.ImageBlob, blob_hash)
+        if blob is None:
+            blob = models.ImageBlob(
+                hash=blob_hash, ext=ext, size=target.stat().st_size, ref_count=0, created_at=now, updated_at=now
+            )
+            db.add(blob)
+        blob.ref_count += len(rows)
+        blob.updated_at = now
+        db.commit()
+        stats["rows"] += len(rows)
+
+        # 数据库提交后再删除旧文件（内容重复时）及其缩放图
+        _remove_files(name)
+    return stats
@@ -0,0 +1,247 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+# 全量重建的间隔（秒），用于刷新浏览数、收藏数带来的权重变化
+REBUILD_INTERVAL = 600
+# 每个前缀节点保留的候选数（多保留一些，删除候选后仍能填满结果）
+TOP_K = 20
+# 建立前缀的最大长度，更长的输入在候选中再做一次过滤
+MAX_KEY_LEN = 12
+# 每个短语最多从几个单词开头建立前缀（如“二手 高等数学”可以用“高等”匹配）
+MAX_KEY_STARTS = 6
+# 权重：物品标题 = 1 + 浏览数 × VIEW_WEIGHT + 收藏数 × FAVORITE_WEIGHT，相同标题累加
+VIEW_WEIGHT = 0.1
+FAVORITE_WEIGHT = 1.0
+# 分类名的基础权重（另加该分类下可交易物品的数量）
+CATEGORY_WEIGHT = 50.0
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: Optional[str]) -> str:
+    # 全角转半角、统一小写、合并空白
+    return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+def _keys(text: str) -> List[str]:
+    starts = [match.start() for match in _WORD_RE.finditer(text)][:MAX_KEY_STARTS]
+    return list(dict.fromkeys(text[start:start + MAX_KEY_LEN] for start in starts))
+
+
+def item_weight(view_count: Optional[int], favorite_count: Optional[int]) -> float:
+    return 1 + (view_count or 0) * VIEW_WEIGHT + (favorite_count or 0) * FAVORITE_WEIGHT
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # (-权重, 候选键) 升序，即权重降序
+        self.top: List[Tuple[float, tuple]] = []
+
+
+class _Entry:
+    __slots__ = ("text", "normalized", "kind", "category_id", "weight")
+
+    def __init__(self, text: str, normalized: str, kind: str, category_id: Optional[int] = None):
+        self.text = text
+        self.normalized = normalized
+        self.kind = kind
+        self.category_id = category_id
+        self.weight = 0.0
+
+
+class _SuggestState:
+    """
+        前缀树：每个节点保存经过该节点的权重最高的 TOP_K 个候选，查询只需沿输入走到对应节点
+
+        - 候选为物品标题（相同标题合并，权重累加）和分类名
+        - 权重下降或候选删除后，节点中空出的位置要等下次全量重建才会补上
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.entries: Dict[tuple, _Entry] = {}
+        self.items: Dict[int, Tuple[tuple, float]] = {}
+        self.categories: Dict[int, tuple] = {}
+
+    def _set_weight(self, key: tuple, weight: float):
+        # 避免浮点累加误差留下权重接近 0 的候选
+        weight = round(weight, 6)
+        entry = self.entries[key]
+        old = (-entry.weight, key)
+        entry.weight = weight
+        new = (-weight, key)
+        for prefix in _keys(entry.normalized):
+            node = self.root
+            for char in prefix:
+                node = node.children.setdefault(char, _Node())
+                top = node.top
+                index = bisect.bisect_left(top, old)
+                if index < len(top) and top[index] == old:
+                    del top[index]
+                if weight > 0:
+                    bisect.insort(top, new)
+                    del top[TOP_K:]
+        if weight <= 0:
+            del self.entries[key]
+
+    def _add_weight(self, key: tuple, text: str, kind: str, delta: float, category_id: Optional[int] = None):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = _Entry(text, key[1], kind, category_id)
+        self._set_weight(key, entry.weight + delta)
+
+    def add_item(self, item_id: int, title: str, weight: float):
+        self.remove_item(item_id)
+        normalized = normalize(title)
+        if not normalized:
+            return
+        key = ("item", normalized)
+        self._add_weight(key, title.strip(), "item", weight)
+        self.items[item_id] = (key, weight)
+
+    def remove_item(self, item_id: int):
+        previous = self.items.pop(item_id, None)
+        if previous is not None and previous[0] in self.entries:
+            key, weight = previous
+            self._set_weight(key, self.entries[key].weight - weight)
+
+    def set_category(self, category_id: int, name: str, weight: float):
+        self.remove_category(category_id)
+        normalized = normalize(name)
+        if normalized:
+            key = ("category", normalized, category_id)
+            self._add_weight(key, name.strip(), "category", weight, category_id)
+            self.categories[category_id] = key
+
+    def remove_category(self, category_id: int):
+        key = self.categories.pop(category_id, None)
+        if key is not None and key in self.entries:
+            self._set_weight(key, 0)
+
+    def lookup(self, query: str, limit: int) -> List[dict]:
+        node = self.root
+        for char in query[:MAX_KEY_LEN]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        results = []
+        for _, key in node.top:
+            entry = self.entries[key]
+            # 超过前缀长度的部分逐个比较
+            if len(query) > MAX_KEY_LEN and query not in entry.normalized:
+                continue
+            results.append({"text": entry.text, "kind": entry.kind, "category_id": entry.category_id})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def _build_state(db: Session) -> _SuggestState:
+    state = _SuggestState()
+    items = db.query(
+        models.Item.id, models.Item.title, models.Item.view_count, models.Item.favorite_count
+    ).filter(models.Item.status == models.ItemStatus.available)
+    for item_id, title, view_count, favorite_count in items:
+        state.add_item(item_id, title, item_weight(view_count, favorite_count))
+
+    counts = dict(db.query(models.Item.category_id, func.count(models.Item.id)).filter(
+        models.Item.status == models.ItemStatus.available
+    ).group_by(models.Item.category_id).all())
+    for category_id, name in db.query(models.Category.id, models.Category.name):
+        state.set_category(category_id, name, CATEGORY_WEIGHT + counts.get(category_id, 0))
+    return state
+
+
+class SuggestIndex:
+    """
+        搜索联想索引
+
+        - 全量构建在后台线程中完成，构建期间的增量操作记录下来，构建完成后重放到新索引上
+        - 物品、分类的增删改由 CRUD 函数增量写入
+        - 只收录可交易的物品，物品售出或进入交易后从联想中移除
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._state = _SuggestState()
+        self._journal: Optional[list] = None
+        self.built_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def _apply(self, operation: str, *args):
+        with self._lock:
+            getattr(self._state, operation)(*args)
+            if self._journal is not None:
+                self._journal.append((operation, args))
+
+    def index_item(self, item: models.Item):
+        """物品新增、标题或状态变化后调用"""
+        if item.status == models.ItemStatus.available:
+            self._apply("add_item", item.id, item.title, item_weight(item.view_count, item.favorite_count))
+        else:
+            self._apply("remove_item", item.id)
+
+    def remove_item(self, item_id: int):
+        self._apply("remove_item", item_id)
+
+    def index_category(self, category: models.Category):
+        self._apply("set_category", category.id, category.name, CATEGORY_WEIGHT)
+
+    def remove_category(self, category_id: int):
+        self._apply("remove_category", category_id)
+
+    def rebuild(self, db: Session) -> int:
+        """全量重建，返回候选数"""
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                state = _build_state(db)
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                for operation, args in self._journal:
+                    getattr(state, operation)(*args)
+                self._journal = None
+                self._state = state
+                self.built_at = time.time()
+            return len(state.entries)
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        query = normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            return self._state.lookup(query, limit)
+
+
+suggestions = SuggestIndex()
+
+
+# 定时任务：全量重建搜索联想索引
+def rebuild_suggestions():
+    from .database import SessionLoacl
+
+    db = SessionLoacl()
+    try:
+        return suggestions.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,23 @@
+"""
+    性能基准脚本
+
+    在 backend 目录下以模块方式运行，例如：
+    python -m benchmarks.bench_bulk_create
+    未设置 DATABASE_URL 时使用临时的 SQLite 数据库。
+"""
+import os
+import tempfile
+
+
+def setup_database():
+    """未指定 DATABASE_URL 时使用临时 SQLite 文件，并执行迁移；需在导入 app 之前调用"""
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="campus_bench_"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    run_migrations(engine)
+    return engine
@@ -0,0 +1,67 @@
+"""
+    批量发布物品与逐个发布物品的吞吐量对比
+
+    用法（在 backend 目录下执行）：
+    python -m benchmarks.bench_bulk_create --count 500 --images 3
+"""
+import argparse
+import time
+
+from . import setup_database
+
+
+def _rows(count: int, images: int, prefix: str):
+    return [
+        {
+            "title": f"{prefix} 二手教材 {index}",
+            "description": "九成新，课程结束后转让，可小刀",
+            "price": 10 + index % 90,
+            "location": "图书馆",
+            "images": [{"image_url": f"{prefix}_{index}_{n}.jpg"} for n in range(images)],
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量发布物品吞吐量基准")
+    parser.add_argument("--count", type=int, default=500, help="每轮发布的物品数")
+    parser.add_argument("--images", type=int, default=3, help="每个物品的图片数")
+    args = parser.parse_args()
+
+    setup_database()
+
+    from app import models, schemas
+    from app.database import SessionLoacl
+    from app.crud import items as items_crud
+
+    db = SessionLoacl()
+    try:
+        user = models.User(username="bench", email="bench@example.com", password="x")
+        db.add(user)
+        db.commit()
+
+        # 逐个发布：每个物品单独提交
+        rows = _rows(args.count, args.images, "single")
+        start = time.perf_counter()
+        for row in rows:
+            items_crud.create_item(db, item=schemas.ItemCreate.model_validate(row), user_id=user.id)
+        single = time.perf_counter() - start
+
+        # 批量发布：一个事务
+        rows = _rows(args.count, args.images, "bulk")
+        start = time.perf_counter()
+        results = items_crud.create_items_bulk(db, rows=rows, user_id=user.id)
+        bulk = time.perf_counter() - start
+        assert all(result["success"] for result in results)
+    finally:
+        db.close()
+
+    print(f"物品数：{args.count}，每个物品图片数：{args.images}")
+    print(f"逐个发布：{single:.3f}s（{args.count / single:.0f} 个/秒）")
+    print(f"批量发布：{bulk:.3f}s（{args.count / bulk:.0f} 个/秒）")
+    print(f"加速比：{single / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
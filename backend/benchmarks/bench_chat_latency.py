@@ -0,0 +1,139 @@
+"""
+    并发发送聊天消息时的事件循环延迟
+
+    事件循环中的探测任务每隔固定时间醒来一次，醒来时间比预期晚的部分即为事件循环被阻塞的时长，
+    它直接决定了同一 worker 中其他请求和 WebSocket 推送的等待时间。对比三种写入方式：
+    - 事件循环中直接调用同步的 crud（改为线程池之前 async 接口的做法）
+    - 发送消息接口（数据库操作在线程池中执行）
+    - WebSocket 使用的批量写入器
+
+    用法（在 backend 目录下执行）：
+    python -m benchmarks.bench_chat_latency --messages 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+
+from . import setup_database
+
+# 探测任务的唤醒间隔（秒）
+PROBE_INTERVAL = 0.001
+
+
+def _percentile(samples, percent):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+async def _probe(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def _measure(send, messages: int, concurrency: int):
+    """并发执行 messages 次 send，返回 (耗时, 事件循环延迟样本)"""
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    counter = iter(range(messages))
+
+    async def worker():
+        for index in counter:
+            await send(index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return elapsed, lags
+
+
+def _report(name: str, messages: int, elapsed: float, lags: list):
+    print(
+        f"{name}：{messages / elapsed:.0f} 条/秒，事件循环延迟 "
+        f"p50 {_percentile(lags, 50) * 1000:.2f}ms，p99 {_percentile(lags, 99) * 1000:.2f}ms，"
+        f"最大 {max(lags) * 1000:.2f}ms"
+    )
+
+
+async def _run(args, item_id: int, seller_id: int, buyer_id: int, token: str):
+    import httpx
+
+    from app import schemas
+    from app.chat_writer import chat_writer
+    from app.crud import chats as chats_crud
+    from app.database import SessionLoacl
+    from app.main import app
+
+    def chat(index):
+        return schemas.ChatCreate(item_id=item_id, receiver_id=seller_id, message=f"还在吗 {index}")
+
+    # 事件循环中直接执行同步的数据库操作
+    async def send_blocking(index):
+        db = SessionLoacl()
+        try:
+            chats_crud.create_chat(db, chat=chat(index), sender_id=buyer_id)
+        finally:
+            db.close()
+
+    elapsed, lags = await _measure(send_blocking, args.messages, args.concurrency)
+    _report("事件循环中直接调用", args.messages, elapsed, lags)
+
+    # 发送消息接口
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def send_http(index):
+            response = await client.post("/api/chats/", json=chat(index).model_dump(), headers=headers)
+            response.raise_for_status()
+
+        elapsed, lags = await _measure(send_http, args.messages, args.concurrency)
+        _report("发送消息接口（线程池）", args.messages, elapsed, lags)
+
+    # WebSocket 的批量写入器
+    async def send_batched(index):
+        await chat_writer.submit(buyer_id, chat(index))
+
+    elapsed, lags = await _measure(send_batched, args.messages, args.concurrency)
+    await chat_writer.stop()
+    _report("批量写入器", args.messages, elapsed, lags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发发送聊天消息时的事件循环延迟基准")
+    parser.add_argument("--messages", type=int, default=500, help="每种方式发送的消息数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发发送的客户端数")
+    args = parser.parse_args()
+
+    setup_database()
+
+    from app import models
+    from app.database import SessionLoacl
+    from app.utils import create_access_token
+
+    db = SessionLoacl()
+    try:
+        seller = models.User(username="bench_seller", email="seller@example.com", password="x")
+        buyer = models.User(username="bench_buyer", email="buyer@example.com", password="x")
+        db.add_all([seller, buyer])
+        db.flush()
+        item = models.Item(title="二手台灯", user_id=seller.id)
+        db.add(item)
+        db.commit()
+        item_id, seller_id, buyer_id = item.id, seller.id, buyer.id
+    finally:
+        db.close()
+
+    token = create_access_token(data={"sub": str(buyer_id)})
+    print(f"消息数：{args.messages}，并发数：{args.concurrency}")
+    asyncio.run(_run(args, item_id, seller_id, buyer_id, token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+    搜索联想查询延迟
+
+    用法（在 backend 目录下执行）：
+    python -m benchmarks.bench_suggest --items 20000 --queries 20000
+"""
+import argparse
+import random
+import time
+
+from . import setup_database
+
+WORDS = ["二手", "九成新", "高等数学", "线性代数", "教材", "台灯", "自行车", "键盘", "机械", "显示器",
+         "iphone", "ipad", "kindle", "耳机", "小米", "吹风机", "电饭煲", "羽毛球拍", "篮球", "吉他"]
+
+
+def _percentile(samples, percent):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索联想查询延迟基准")
+    parser.add_argument("--items", type=int, default=20000, help="物品数")
+    parser.add_argument("--queries", type=int, default=20000, help="查询次数")
+    args = parser.parse_args()
+
+    setup_database()
+
+    from app import models
+    from app.database import SessionLoacl
+    from app.crud import items as items_crud
+    from app.suggest import suggestions
+
+    random.seed(0)
+    db = SessionLoacl()
+    try:
+        user = models.User(username="bench", email="bench@example.com", password="x")
+        db.add(user)
+        db.commit()
+        rows = [
+            {"title": " ".join(random.sample(WORDS, 3)) + f" {index % 500}"}
+            for index in range(args.items)
+        ]
+        for start in range(0, len(rows), items_crud.MAX_BULK_ITEMS):
+            items_crud.create_items_bulk(db, rows=rows[start:start + items_crud.MAX_BULK_ITEMS], user_id=user.id)
+
+        start = time.perf_counter()
+        entries = suggestions.rebuild(db)
+        build = time.perf_counter() - start
+    finally:
+        db.close()
+
+    queries = []
+    for _ in range(args.queries):
+        word = random.choice(WORDS)
+        queries.append(word[:random.randint(1, len(word))])
+
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        suggestions.suggest(query, 10)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    print(f"物品数：{args.items}，候选数：{entries}，全量构建：{build:.2f}s")
+    print(f"查询 {args.queries} 次：p50={_percentile(samples, 50):.4f}ms p99={_percentile(samples, 99):.4f}ms max={max(samples):.4f}ms")
+
+
+if __name__ == "__main__":
+    main()
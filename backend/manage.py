@@ -0,0 +1,289 @@
+"""
+    后台管理命令
+
+    用法（在 backend 目录下执行）：
+    - python manage.py migrate                 执行数据库迁移
+    - python manage.py rebuild-search-index    根据 items 表重建搜索倒排索引
+    - python manage.py explain-check           检查 CRUD 查询的执行计划，存在全表扫描时返回非零退出码
+    - python manage.py generate-renditions     为已有的物品图片补生成缩放图
+    - python manage.py import-legacy-images    将旧的图片文件导入按内容去重的存储
+    - python manage.py gc-images               回收无引用的图片文件
+    - python manage.py recount-favorites       按收藏记录重新统计物品的收藏数
+"""
+import argparse
+import sys
+
+from app.database import SessionLoacl, engine
+
+
+# 执行数据库迁移
+def migrate(args):
+    from app.migrations import run_migrations
+
+    applied = run_migrations(engine)
+    if applied:
+        print(f"已执行迁移：{', '.join(applied)}")
+    else:
+        print("数据库已是最新版本")
+
+
+# 重建搜索索引
+def rebuild_search_index(args):
+    from app import search
+
+    db = SessionLoacl()
+    try:
+        total = search.rebuild_index(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"搜索索引重建完成，共索引 {total} 个物品")
+
+
+# 补生成缩放图
+def generate_renditions(args):
+    from app import renditions
+    from app.dependencies import IMAGE_DIR
+
+    from app.crud import items
+
+    stats = renditions.backfill(IMAGE_DIR, force=args.force, workers=args.workers or renditions.RENDITION_WORKERS)
+    print(f"缩放图生成完成：处理 {stats['processed']} 张，跳过 {stats['skipped']} 张，失败 {stats['failed']} 张")
+
+    # 在图片记录中标记缩放图已生成
+    db = SessionLoacl()
+    try:
+        marked = items.mark_image_renditions(db)
+    finally:
+        db.close()
+    print(f"标记已有缩放图的图片记录 {marked} 条")
+    if stats["failed"]:
+        sys.exit(1)
+
+
+# 导入旧图片
+def import_legacy_images(args):
+    from app import storage
+
+    db = SessionLoacl()
+    try:
+        stats = storage.import_legacy_images(db)
+    finally:
+        db.close()
+    print(f"旧图片导入完成：导入 {stats['imported']} 张，重复 {stats['deduplicated']} 张，改写图片记录 {stats['rows']} 条")
+
+
+# 回收无引用的图片文件
+def gc_images(args):
+    from datetime import timedelta
+
+    from app import storage
+
+    db = SessionLoacl()
+    try:
+        if args.recount:
+            fixed = storage.recount_refs(db)
+            print(f"已修正 {fixed} 个图片文件的引用数")
+        stats = storage.collect_garbage(db, grace_period=timedelta(hours=args.grace_hours))
+    finally:
+        db.close()
+    print(f"图片回收完成：删除 {stats['blobs']} 个文件，清理 {stats['stale_uploads']} 个上传临时文件")
+
+
+# 重新统计收藏数
+def recount_favorites(args):
+    from app.crud import favorites
+
+    db = SessionLoacl()
+    try:
+        fixed = favorites.recount_favorite_counts(db)
+    finally:
+        db.close()
+    print(f"已修正 {fixed} 个物品的收藏数")
+
+
+# 允许全表扫描的数据表
+EXPLAIN_ALLOWED_FULL_SCANS = {
+    "categories": "分类是小型字典表，获取分类列表本身就需要读取全表",
+    "item_search_docs": "语料统计（文档总数、平均长度）需要全表聚合，结果在进程内缓存",
+}
+
+
+def _explain_plan(conn, statement, parameters):
+    """返回 (执行计划描述列表, 全表扫描的数据表列表)"""
+    dialect = engine.dialect.name
+    if dialect == "mysql":
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+        plan = [f"{row['table']}: type={row['type']} key={row['key']}" for row in rows]
+        scans = [row["table"] for row in rows if row["type"] == "ALL"]
+    elif dialect == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        plan = [row[3] for row in rows]
+        # SCAN CONSTANT ROW 是不带 FROM 的外层查询（如两个标量子查询相加），不读取数据表；
+        # 扫描 CO-ROUTINE / MATERIALIZE 的子查询（派生表）读取的是子查询已限定的结果
+        derived = {row[3].split()[1] for row in rows if row[3].startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+        scans = [
+            row[3].split()[1] for row in rows
+            if row[3].startswith("SCAN ") and " USING " not in row[3] and row[3] != "SCAN CONSTANT ROW"
+            and row[3].split()[1] not in derived
+        ]
+    else:
+        raise SystemExit(f"不支持的数据库类型：{dialect}")
+
+    # 派生表、临时表不是真实数据表
+    scans = [table for table in scans if table and not table.startswith("<") and table not in EXPLAIN_ALLOWED_FULL_SCANS]
+    return plan, scans
+
+
+# 检查 CRUD 查询的执行计划
+# 注意：MySQL 在数据量很小的表上可能直接选择全表扫描，应在接近生产规模的数据上运行
+def explain_check(args):
+    from datetime import datetime
+    from fastapi import HTTPException
+    from sqlalchemy import event
+
+    from app import cache, models, pagination, popularity, schemas
+    from app.crud import items, chats, transactions, favorites, reviews, categories, users
+
+    db = SessionLoacl()
+
+    # 用库中已有的数据作为查询参数（空库时使用 1）
+    def first_id(column):
+        value = db.query(column).order_by(column).limit(1).scalar()
+        return value if value is not None else 1
+
+    user_id = first_id(models.User.id)
+    item_id = first_id(models.Item.id)
+    category_id = first_id(models.Category.id)
+    transaction_id = first_id(models.Transaction.id)
+    item_owner_id = db.query(models.Item.user_id).filter(models.Item.id == item_id).scalar() or user_id
+    username = db.query(models.User.username).filter(models.User.id == user_id).scalar() or ""
+    available = schemas.ItemStatus.available
+    pending = schemas.TransactionStatus.pending
+    item_cursor = pagination.encode_cursor(datetime.now(), item_id)
+
+    calls = [
+        ("items.get_items", lambda: items.get_items(db)),
+        ("items.get_items(cursor)", lambda: items.get_items(db, cursor=item_cursor)),
+        ("items.get_items(category_id)", lambda: items.get_items(db, category_id=category_id)),
+        ("items.get_items(status)", lambda: items.get_items(db, status=available)),
+        ("items.get_items(category_id, status)", lambda: items.get_items(db, category_id=category_id, status=available)),
+        ("items.get_items(search)", lambda: items.get_items(db, search="教材")),
+        ("items.get_items(search, sort)", lambda: items.get_items(db, search="教材", sort=schemas.ItemSort.price_asc)),
+        ("items.get_user_items", lambda: items.get_user_items(db, user_id=user_id)),
+        ("items.get_user_items(cursor)", lambda: items.get_user_items(db, user_id=user_id, cursor=item_cursor)),
+        ("items.get_item", lambda: items.get_item(db, item_id=item_id)),
+        ("items.get_item_images", lambda: items.get_item_images(db, item_id=item_id)),
+        ("chats.get_item_chats", lambda: chats.get_item_chats(db, item_id=item_id, user_id=item_owner_id)),
+        ("chats.get_user_chats", lambda: chats.get_user_chats(db, user_id=user_id)),
+        ("chats.get_user_chats(cursor)", lambda: chats.get_user_chats(db, user_id=user_id, cursor=item_cursor)),
+        ("chats.get_unread_count", lambda: chats.get_unread_count(db, user_id=user_id)),
+        ("transactions.get_user_transactions(buyer)", lambda: transactions.get_user_transactions(db, user_id=user_id)),
+        ("transactions.get_user_transactions(seller)", lambda: transactions.get_user_transactions(db, user_id=user_id, is_buyer=False)),
+        ("transactions.get_user_transactions(buyer, status)", lambda: transactions.get_user_transactions(db, user_id=user_id, status=pending)),
+        ("transactions.get_user_transactions(seller, status)", lambda: transactions.get_user_transactions(db, user_id=user_id, is_buyer=False, status=pending)),
+        ("transactions.get_transaction", lambda: transactions.get_transaction(db, transaction_id=transaction_id)),
+        ("transactions.count_user_transactions_by_status", lambda: transactions.count_user_transactions_by_status(db, user_id=user_id)),
+        ("favorites.get_user_favorites", lambda: favorites.get_user_favorites(db, user_id=user_id)),
+        ("favorites.is_item_favorited", lambda: favorites.is_item_favorited(db, item_id=item_id, user_id=user_id)),
+        ("reviews.get_user_reviews", lambda: reviews.get_user_reviews(db, user_id=user_id)),
+        ("reviews.get_transaction_review", lambda: reviews.get_transaction_review(db, transaction_id=transaction_id)),
+        ("popularity.compute_scores", lambda: popularity.compute_scores(db)),
+        ("categories.get_categories", lambda: categories.get_categories(db)),
+        ("categories.get_category", lambda: categories.get_category(db, category_id=category_id)),
+        ("users.get_user", lambda: users.get_user(db, user_id=user_id)),
+        ("users.get_user_by_username", lambda: users.get_user_by_username(db, username=username)),
+    ]
+
+    # 各排序方式与筛选条件的组合（含翻页）
+    for sort in (schemas.ItemSort.price_asc, schemas.ItemSort.price_desc, schemas.ItemSort.most_favorited):
+        sort_cursor = pagination.encode_cursor(sort.value, 1, item_id)
+        calls += [
+            (f"items.get_items(sort={sort.value})", lambda sort=sort: items.get_items(db, sort=sort)),
+            (f"items.get_items(sort={sort.value}, cursor)", lambda sort=sort, sort_cursor=sort_cursor: items.get_items(db, sort=sort, cursor=sort_cursor)),
+            (f"items.get_items(sort={sort.value}, status)", lambda sort=sort: items.get_items(db, sort=sort, status=available)),
+            (f"items.get_items(sort={sort.value}, category_id)", lambda sort=sort: items.get_items(db, sort=sort, category_id=category_id)),
+            (f"items.get_items(sort={sort.value}, category_id, status)", lambda sort=sort: items.get_items(db, sort=sort, category_id=category_id, status=available)),
+        ]
+
+    # 记录每个 CRUD 调用实际发出的 SELECT 语句
+    captured = []
+    current = {"label": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((current["label"], statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for label, call in calls:
+            current["label"] = label
+            for listing_cache in cache.CACHES:
+                listing_cache.clear()
+            try:
+                call()
+            except HTTPException:
+                pass
+            db.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    failures = 0
+    checked = set()
+    with engine.connect() as conn:
+        for label, statement, parameters in captured:
+            if (label, statement) in checked:
+                continue
+            checked.add((label, statement))
+
+            plan, scans = _explain_plan(conn, statement, parameters)
+            result = f"全表扫描：{', '.join(scans)}" if scans else "OK"
+            print(f"[{result}] {label}")
+            if args.verbose or scans:
+                print("    " + " ".join(statement.split()))
+                for line in plan:
+                    print(f"    -> {line}")
+            failures += bool(scans)
+
+    db.close()
+    print(f"共检查 {len(checked)} 条查询，{failures} 条存在全表扫描")
+    if failures:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="校园闲置物品共享与置换平台管理命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="执行数据库迁移")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild_parser = subparsers.add_parser("rebuild-search-index", help="根据 items 表重建搜索倒排索引")
+    rebuild_parser.add_argument("--batch-size", type=int, default=500, help="每批处理的物品数")
+    rebuild_parser.set_defaults(func=rebuild_search_index)
+
+    explain_parser = subparsers.add_parser("explain-check", help="检查 CRUD 查询的执行计划")
+    explain_parser.add_argument("--verbose", action="store_true", help="输出每条查询的执行计划")
+    explain_parser.set_defaults(func=explain_check)
+
+    renditions_parser = subparsers.add_parser("generate-renditions", help="为已有的物品图片补生成缩放图")
+    renditions_parser.add_argument("--force", action="store_true", help="重新生成已存在的缩放图")
+    renditions_parser.add_argument("--workers", type=int, default=None, help="处理图片的进程数")
+    renditions_parser.set_defaults(func=generate_renditions)
+
+    import_parser = subparsers.add_parser("import-legacy-images", help="将旧的图片文件导入按内容去重的存储")
+    import_parser.set_defaults(func=import_legacy_images)
+
+    gc_parser = subparsers.add_parser("gc-images", help="回收无引用的图片文件")
+    gc_parser.add_argument("--grace-hours", type=float, default=24, help="无引用的文件保留多少小时后回收")
+    gc_parser.add_argument("--recount", action="store_true", help="回收前按图片记录重新统计引用数")
+    gc_parser.set_defaults(func=gc_images)
+
+    recount_parser = subparsers.add_parser("recount-favorites", help="按收藏记录重新统计物品的收藏数")
+    recount_parser.set_defaults(func=recount_favorites)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+# 测试使用临时 SQLite 数据库，需在导入 app 之前设置
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="campus_test_"), "test.db")
+os.environ.setdefault("SECRET_KEY", "test")
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # 不进入 with 块：不启动定时任务和消息代理
+    return TestClient(app)
+
+
+@pytest.fixture
+def register(client):
+    """注册并登录一个新用户，返回 (用户ID, 认证请求头)"""
+
+    def register_user():
+        name = f"u{uuid.uuid4().hex[:10]}"
+        response = client.post("/api/users/register", json={"username": name, "email": f"{name}@example.com", "password": "secret1"})
+        assert response.status_code == 201, response.text
+        response = client.post("/api/users/login", data={"username": name, "password": "secret1"})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+    return register_user
@@ -0,0 +1,21 @@
+"""
+    聊天 WebSocket 连接
+"""
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.chats import CLOSE_SUPERSEDED, manager
+
+
+def test_new_connection_closes_superseded(client, register):
+    user_id, headers = register()
+    token = headers["Authorization"].split(" ", 1)[1]
+    url = f"/api/chats/ws/{user_id}?token={token}"
+    with client.websocket_connect(url) as first:
+        with client.websocket_connect(url):
+            # 旧连接被关闭，而不是留下一个没有发送任务的连接
+            with pytest.raises(WebSocketDisconnect) as closed:
+                first.receive_text()
+            assert closed.value.code == CLOSE_SUPERSEDED
+            assert user_id in manager.active_connections
+    assert user_id not in manager.active_connections
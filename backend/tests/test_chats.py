@@ -0,0 +1,92 @@
+"""
+    聊天会话的排序与未读消息数
+
+    SQLite 的时间精度为秒，相邻两条需要排序的消息之间等待一秒以上。
+"""
+import time
+import uuid
+
+import pytest
+
+from .test_query_counts import count_queries
+
+# 相邻两条消息之间的等待时间（秒）
+MESSAGE_INTERVAL = 1.1
+
+
+@pytest.fixture
+def items(client, register):
+    """卖家发布两件物品，返回 (卖家, 买家, 物品ID列表)"""
+    seller = register()
+    buyer = register()
+    category_id = client.post("/api/categories/", json={"name": f"c{uuid.uuid4().hex[:10]}"}, headers=seller[1]).json()["id"]
+    ids = []
+    for index in range(2):
+        response = client.post("/api/items/", json={"title": f"二手台灯 {index}", "price": 20, "category_id": category_id}, headers=seller[1])
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return seller, buyer, ids
+
+
+def _send(client, headers, item_id, receiver_id, message):
+    response = client.post("/api/chats/", json={"item_id": item_id, "receiver_id": receiver_id, "message": message}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _conversations(client, headers):
+    response = client.get("/api/chats/conversations", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _unread_count(client, headers):
+    return client.get("/api/chats/unread-count", headers=headers).json()["unread_count"]
+
+
+def test_conversation_order_and_unread(client, items):
+    (seller_id, seller), (buyer_id, buyer), (first, second) = items
+
+    _send(client, buyer, first, seller_id, "台灯还在吗")
+    time.sleep(MESSAGE_INTERVAL)
+    _send(client, buyer, second, seller_id, "另一盏也想要")
+    assert [c["item"]["id"] for c in _conversations(client, seller)] == [second, first]
+    assert _unread_count(client, seller) == 2
+
+    # 较早的会话收到新消息后排到最前，最后一条消息和时间同时更新
+    time.sleep(MESSAGE_INTERVAL)
+    reply = _send(client, seller, first, buyer_id, "还在")
+    conversations = _conversations(client, buyer)
+    assert [c["item"]["id"] for c in conversations] == [first, second]
+    assert conversations[0]["last_message"]["id"] == reply["id"]
+    assert conversations[0]["last_message_at"] == reply["created_at"]
+    assert conversations[0]["unread_count"] == 1
+
+    # 回复即视为已读，卖家只剩另一个会话的未读
+    conversations = _conversations(client, seller)
+    assert [c["item"]["id"] for c in conversations] == [first, second]
+    assert [c["unread_count"] for c in conversations] == [0, 1]
+    assert _unread_count(client, seller) == 1
+
+    response = client.post(f"/api/chats/conversations/{conversations[1]['id']}/read", headers=seller)
+    assert response.status_code == 200, response.text
+    assert response.json()["unread_count"] == 0
+    assert _unread_count(client, seller) == 0
+    assert _unread_count(client, buyer) == 1
+
+    # 游标分页按同样的顺序返回
+    response = client.get("/api/chats/conversations", params={"limit": 1}, headers=buyer)
+    assert [c["item"]["id"] for c in response.json()] == [first]
+    response = client.get("/api/chats/conversations", params={"limit": 1, "cursor": response.headers["X-Next-Cursor"]}, headers=buyer)
+    assert [c["item"]["id"] for c in response.json()] == [second]
+
+
+def test_last_message_at_assigned_first(client, items):
+    # MySQL 按书写顺序执行 SET，last_message_at 需要在 last_message_id 更新之前判断
+    (seller_id, seller), (buyer_id, buyer), (first, _) = items
+    _send(client, buyer, first, seller_id, "台灯还在吗")
+    with count_queries() as statements:
+        _send(client, seller, first, buyer_id, "还在")
+    updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE CONVERSATIONS")]
+    assert updates
+    assert updates[0].index("last_message_at") < updates[0].index("last_message_id")
@@ -0,0 +1,43 @@
+"""
+    导出超出上限时明确告知客户端导出不完整
+"""
+import json
+
+import pytest
+
+from app.api import exports
+
+ROWS = 3
+
+
+@pytest.fixture
+def headers(client, register):
+    _, headers = register()
+    for index in range(ROWS):
+        response = client.post("/api/items/", json={"title": f"二手教材 {index}", "price": 10}, headers=headers)
+        assert response.status_code == 201, response.text
+    return headers
+
+
+def test_ndjson_ends_with_truncated_record(client, headers, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_ROWS", ROWS - 1)
+    response = client.get("/api/exports/items", headers=headers)
+    assert response.status_code == 200, response.text
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == ROWS
+    assert records[-1]["error"] == "export_truncated"
+    assert records[-1]["exported_rows"] == ROWS - 1
+
+
+def test_csv_aborts_when_truncated(client, headers, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_ROWS", ROWS - 1)
+    with pytest.raises(exports.ExportTruncated):
+        client.get("/api/exports/items", params={"format": "csv"}, headers=headers)
+
+
+def test_unlimited_export_is_not_truncated(client, headers, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_ROWS", 0)
+    response = client.get("/api/exports/items", headers=headers)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) >= ROWS
+    assert all("error" not in record for record in records)
@@ -0,0 +1,59 @@
+"""
+    物品列表缓存：收藏、用户资料变化后失效相关的列表页
+"""
+import uuid
+
+import pytest
+
+from app import cache
+
+
+@pytest.fixture
+def listing(client, register):
+    """卖家在新分类下发布两件物品，返回 (卖家请求头, 分类ID, 物品ID列表)"""
+    _, headers = register()
+    category_id = client.post("/api/categories/", json={"name": f"c{uuid.uuid4().hex[:10]}"}, headers=headers).json()["id"]
+    ids = []
+    for index in range(2):
+        response = client.post("/api/items/", json={"title": f"二手台灯 {index}", "price": 20, "category_id": category_id}, headers=headers)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    for instance in cache.CACHES:
+        instance.clear()
+    return headers, category_id, ids
+
+
+def _page(client, category_id, sort="newest"):
+    response = client.get("/api/items/", params={"category_id": category_id, "sort": sort})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_favorite_reorders_cached_most_favorited(client, register, listing):
+    _, category_id, (first, second) = listing
+    # 收藏数相同时按 ID 倒序
+    assert [item["id"] for item in _page(client, category_id, "most_favorited")] == [second, first]
+
+    _, buyer = register()
+    response = client.post("/api/favorites/", json={"item_id": first}, headers=buyer)
+    assert response.status_code == 201, response.text
+    assert [item["id"] for item in _page(client, category_id, "most_favorited")] == [first, second]
+
+    client.delete(f"/api/favorites/item/{first}", headers=buyer)
+    assert [item["id"] for item in _page(client, category_id, "most_favorited")] == [second, first]
+
+
+def test_owner_update_invalidates_cached_page(client, listing):
+    headers, category_id, _ = listing
+    _page(client, category_id)
+
+    avatar = f"https://img.example.com/{uuid.uuid4().hex}.jpg"
+    response = client.put("/api/users/me", json={"avatar": avatar}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert {item["owner"]["avatar"] for item in _page(client, category_id)} == {avatar}
+
+
+def test_cache_stats_requires_login(client, register):
+    assert client.get("/api/cache/stats").status_code == 401
+    _, headers = register()
+    assert client.get("/api/cache/stats", headers=headers).status_code == 200
@@ -0,0 +1,47 @@
+"""
+    批量发布物品：逐条处理失败的数据
+"""
+import hashlib
+import uuid
+from datetime import datetime
+
+from app import models, storage
+from app.database import SessionLoacl
+
+
+def _blob_url(blob_hash):
+    return storage.blob_name(blob_hash, "jpg")
+
+
+def _new_hash():
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+
+def test_missing_blob_fails_only_its_row(client, register):
+    _, headers = register()
+    existing, missing = _new_hash(), _new_hash()
+    db = SessionLoacl()
+    try:
+        now = datetime.now()
+        db.add(models.ImageBlob(hash=existing, ext="jpg", size=1, ref_count=0, created_at=now, updated_at=now))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.post("/api/items/bulk", json=[
+        {"title": "二手台灯", "price": 20, "images": [{"image_url": _blob_url(existing)}]},
+        {"title": "二手书架", "price": 50, "images": [{"image_url": _blob_url(existing)}, {"image_url": _blob_url(missing)}]},
+        {"title": "二手椅子", "price": 30},
+    ], headers=headers)
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [result["success"] for result in body["results"]] == [True, False, True]
+    assert "图片" in body["results"][1]["error"]
+
+    # 只为成功的物品增加引用数
+    db = SessionLoacl()
+    try:
+        assert db.get(models.ImageBlob, existing).ref_count == 1
+    finally:
+        db.close()
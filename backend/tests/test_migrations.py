@@ -0,0 +1,42 @@
+"""
+    数据库迁移：在空数据库上依次执行全部迁移，得到的表结构与模型定义一致
+"""
+from sqlalchemy import create_engine, inspect
+
+from app import models
+from app.migrations import MIGRATIONS, run_migrations
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    schema = {}
+    for table_name in inspector.get_table_names():
+        if table_name == "schema_migrations":
+            continue
+        schema[table_name] = {
+            "columns": sorted(
+                (column["name"], str(column["type"]), column["nullable"], str(column["default"]))
+                for column in inspector.get_columns(table_name)
+            ),
+            "indexes": sorted(
+                (index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                for index in inspector.get_indexes(table_name)
+            ),
+            "primary_key": inspector.get_pk_constraint(table_name)["constrained_columns"],
+            "foreign_keys": sorted(
+                (tuple(key["constrained_columns"]), key["referred_table"], tuple(key["referred_columns"]))
+                for key in inspector.get_foreign_keys(table_name)
+            ),
+        }
+    return schema
+
+
+def test_migrations_match_models(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    assert run_migrations(migrated) == [migration.VERSION for migration in MIGRATIONS]
+    # 再次执行不做任何事
+    assert run_migrations(migrated) == []
+
+    created = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    models.Base.metadata.create_all(created)
+    assert _schema(migrated) == _schema(created)
@@ -0,0 +1,97 @@
+"""
+    列表、详情接口的 SQL 语句数
+
+    每个接口在返回 1 条和多条记录时执行的语句数应相同，出现 N+1 查询时测试失败。
+"""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import cache
+
+# 每个物品的图片数
+IMAGES_PER_ITEM = 2
+# 多条记录的场景
+MANY = 5
+
+
+@contextmanager
+def count_queries():
+    from app.database import engine
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _create_items(client, headers, count):
+    category_id = client.post("/api/categories/", json={"name": f"c{uuid.uuid4().hex[:10]}"}, headers=headers).json()["id"]
+    ids = []
+    for index in range(count):
+        response = client.post("/api/items/", json={
+            "title": f"二手教材 {index}",
+            "price": 10 + index,
+            "category_id": category_id,
+            "images": [{"image_url": f"https://img.example.com/{uuid.uuid4().hex}.jpg"} for _ in range(IMAGES_PER_ITEM)],
+        }, headers=headers)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return category_id, ids
+
+
+@pytest.fixture
+def seller(register):
+    return register()[1]
+
+
+def _query_count(client, url, headers=None):
+    # 清空缓存，统计的是实际查询数据库时的语句数
+    for instance in cache.CACHES:
+        instance.clear()
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+
+@pytest.mark.parametrize("count", [1, MANY])
+def test_item_list(client, seller, count):
+    category_id, _ = _create_items(client, seller, count)
+    queries, items = _query_count(client, f"/api/items/?category_id={category_id}")
+    assert len(items) == count
+    assert queries == 2
+
+
+@pytest.mark.parametrize("count", [1, MANY])
+def test_my_items(client, seller, count):
+    _create_items(client, seller, count)
+    queries, items = _query_count(client, "/api/items/my-items", seller)
+    assert len(items) == count
+    assert queries == 3
+
+
+def test_item_detail(client, seller):
+    _, (item_id,) = _create_items(client, seller, 1)
+    queries, item = _query_count(client, f"/api/items/{item_id}")
+    assert len(item["images"]) == IMAGES_PER_ITEM
+    assert queries == 2
+
+
+@pytest.mark.parametrize("count", [1, MANY])
+def test_favorites(client, seller, register, count):
+    _, ids = _create_items(client, seller, count)
+    buyer = register()[1]
+    for item_id in ids:
+        assert client.post("/api/favorites/", json={"item_id": item_id}, headers=buyer).status_code == 201
+    queries, favorites = _query_count(client, "/api/favorites/", buyer)
+    assert len(favorites) == count
+    assert queries == 4
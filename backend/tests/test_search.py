@@ -0,0 +1,45 @@
+"""
+    搜索：分面统计、导出使用完整的匹配集合
+"""
+import uuid
+
+import pytest
+
+from app import cache, search
+
+ROWS = 3
+
+
+@pytest.fixture
+def keyword(client, register):
+    """发布 ROWS 件标题含同一个新词的物品，返回该词"""
+    _, headers = register()
+    word = "kw" + uuid.uuid4().hex[:8]
+    for index in range(ROWS):
+        response = client.post("/api/items/", json={"title": f"{word} 台灯 {index}", "price": 20}, headers=headers)
+        assert response.status_code == 201, response.text
+    for instance in cache.CACHES:
+        instance.clear()
+    return word, headers
+
+
+def test_facets_and_export_not_capped_by_candidates(client, keyword, monkeypatch):
+    word, headers = keyword
+    # 打分的候选数上限只影响搜索结果列表
+    monkeypatch.setattr(search, "MAX_CANDIDATES", 1)
+    assert len(client.get("/api/items/", params={"search": word}).json()) == 1
+
+    assert client.get("/api/items/facets", params={"search": word}).json()["total"] == ROWS
+
+    response = client.get("/api/exports/items", params={"search": word}, headers=headers)
+    assert len(response.text.splitlines()) == ROWS
+
+
+def test_facets_without_matches(client, keyword):
+    word, headers = keyword
+    for text in (word + "x", "!!!"):
+        facets = client.get("/api/items/facets", params={"search": text}).json()
+        assert facets["total"] == 0
+        assert facets["categories"] == []
+        response = client.get("/api/exports/items", params={"search": text}, headers=headers)
+        assert response.text == ""